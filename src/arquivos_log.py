@@ -0,0 +1,316 @@
+import os
+import re
+import sys
+import gzip
+import zlib
+import time
+import struct
+import bisect
+import logging
+import logging.handlers
+import threading
+from datetime import datetime, timedelta
+
+# Índice de um arquivo comprimido: assinatura, quantidade de blocos, primeiro e último
+# timestamp do arquivo, seguidos de (primeiro timestamp, offset comprimido) de cada bloco
+_CABECALHO = struct.Struct('<8sQdd')
+_ASSINATURA = b'LOGIDX01'
+_BLOCO = struct.Struct('<dQ')
+
+# Bytes de log (sem compressão) por membro gzip independente
+TAMANHO_BLOCO = 256 * 1024
+
+_FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+
+def _arquivos_do_servico(diretorio, servico):
+    """[(data, seq, nome)] dos logs do serviço, do mais antigo ao mais novo
+
+    São o arquivo atual <servico>_<AAAAMMDD>.log (seq None, o último da data) e os
+    rotacionados <servico>_<AAAAMMDD>.<seq>.log, comprimidos ou não.
+    """
+    padrao = re.compile(rf'^{re.escape(servico)}_(\d{{8}})(?:\.(\d{{3}}))?\.log(?:\.gz)?$')
+    arquivos = []
+    for nome in os.listdir(diretorio):
+        m = padrao.match(nome)
+        if m:
+            arquivos.append((m.group(1), int(m.group(2)) if m.group(2) else None, nome))
+    arquivos.sort(key=lambda arquivo: (arquivo[0], arquivo[1] is None, arquivo[1] or 0))
+    return arquivos
+
+
+class _LeitorInstante:
+    """Extrai o timestamp de uma linha de log (texto ou JSON); None em linhas de continuação"""
+
+    def __init__(self):
+        self._prefixo = None
+        self._instante = None
+
+    def __call__(self, linha):
+        if linha.startswith(b'{"ts":'):
+            fim = linha.find(b',', 6)
+            try:
+                return float(linha[6:fim])
+            except ValueError:
+                return None
+        prefixo = linha[:19]
+        # Linhas do mesmo segundo têm o mesmo prefixo: converte só uma vez
+        if prefixo != self._prefixo:
+            try:
+                self._instante = datetime.strptime(prefixo.decode('ascii'), _FORMATO_DATA).timestamp()
+            except (UnicodeDecodeError, ValueError):
+                return None
+            self._prefixo = prefixo
+        return self._instante
+
+
+def comprimir(caminho, remover=True):
+    """Comprime um log rotacionado em <caminho>.gz, com o índice <caminho>.gz.idx
+
+    O arquivo é gravado como uma sequência de membros gzip independentes de cerca de
+    TAMANHO_BLOCO bytes cada (continua legível por zcat/gunzip), e o índice guarda o
+    primeiro timestamp e o offset de cada membro, para ler um intervalo de tempo sem
+    descomprimir o arquivo inteiro.
+    """
+    destino = caminho + '.gz'
+    instante_de = _LeitorInstante()
+    blocos = []
+    primeiro = ultimo = None
+
+    with open(caminho, 'rb') as entrada, open(destino + '.tmp', 'wb') as saida:
+        linhas = []
+        tamanho = 0
+        inicio_bloco = None
+
+        def gravar_bloco():
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            blocos.append((inicio_bloco if inicio_bloco is not None else ultimo or 0.0, saida.tell()))
+            saida.write(compressor.compress(b''.join(linhas)) + compressor.flush())
+
+        for linha in entrada:
+            instante = instante_de(linha)
+            if instante is not None:
+                primeiro = instante if primeiro is None else primeiro
+                ultimo = instante
+                # Um bloco só começa numa linha com timestamp
+                if tamanho >= TAMANHO_BLOCO:
+                    gravar_bloco()
+                    linhas, tamanho = [], 0
+                if not linhas:
+                    inicio_bloco = instante
+            linhas.append(linha)
+            tamanho += len(linha)
+        if linhas:
+            gravar_bloco()
+
+    with open(destino + '.idx.tmp', 'wb') as indice:
+        indice.write(_CABECALHO.pack(_ASSINATURA, len(blocos), primeiro or 0.0, ultimo or 0.0))
+        for bloco in blocos:
+            indice.write(_BLOCO.pack(*bloco))
+    os.replace(destino + '.tmp', destino)
+    os.replace(destino + '.idx.tmp', destino + '.idx')
+    if remover:
+        os.remove(caminho)
+    return destino
+
+
+def aplicar_retencao(diretorio, servico, dias=None, max_bytes=None):
+    """Apaga os arquivos comprimidos mais antigos que `dias` ou além de `max_bytes` no total"""
+    arquivos = []
+    for _, _, nome in _arquivos_do_servico(diretorio, servico):
+        if not nome.endswith('.gz'):
+            continue
+        caminho = os.path.join(diretorio, nome)
+        try:
+            estado = os.stat(caminho)
+        except FileNotFoundError:
+            # Removido por outra thread de compressão (e retenção) depois da listagem
+            continue
+        arquivos.append((caminho, estado.st_mtime, estado.st_size))
+
+    removidos = []
+    if dias:
+        limite = time.time() - dias * 86400
+        removidos = [caminho for caminho, modificado, _ in arquivos if modificado < limite]
+        arquivos = [arquivo for arquivo in arquivos if arquivo[1] >= limite]
+    if max_bytes:
+        total = sum(tamanho for _, _, tamanho in arquivos)
+        while arquivos and total > max_bytes:
+            caminho, _, tamanho = arquivos.pop(0)
+            total -= tamanho
+            removidos.append(caminho)
+
+    for caminho in removidos:
+        for arquivo in (caminho, caminho + '.idx'):
+            try:
+                os.remove(arquivo)
+            except FileNotFoundError:
+                pass
+    return removidos
+
+
+class ArquivoRotativo(logging.handlers.BaseRotatingHandler):
+    """Handler de arquivo de logs/<servico>_<AAAAMMDD>.log com rotação por tamanho e por dia
+
+    Quando o arquivo passa de max_bytes ou o dia muda, ele é renomeado para
+    <servico>_<AAAAMMDD>.<seq>.log e comprimido por uma thread em segundo plano (veja
+    comprimir()), que em seguida aplica a retenção. Arquivos rotacionados que ficaram sem
+    comprimir (processo encerrado no meio) são comprimidos na próxima inicialização.
+    """
+
+    def __init__(self, diretorio, servico, max_bytes=0, retencao_dias=None, retencao_bytes=None,
+                 encoding='utf-8'):
+        self.diretorio = diretorio
+        self.servico = servico
+        self.max_bytes = max_bytes
+        self.retencao_dias = retencao_dias
+        self.retencao_bytes = retencao_bytes
+        self._compressoes = []
+        self._data = datetime.now().strftime('%Y%m%d')
+        self._proxima_virada = self._virada()
+        super().__init__(self._caminho_atual(), 'a', encoding=encoding)
+
+        pendentes = [os.path.join(diretorio, nome) for _, seq, nome in _arquivos_do_servico(diretorio, servico)
+                     if seq is not None and nome.endswith('.log')]
+        if pendentes:
+            self._comprimir_em_fundo(pendentes)
+
+    def _caminho_atual(self):
+        return os.path.join(self.diretorio, f'{self.servico}_{self._data}.log')
+
+    @staticmethod
+    def _virada():
+        amanha = datetime.now().date() + timedelta(days=1)
+        return datetime.combine(amanha, datetime.min.time()).timestamp()
+
+    def shouldRollover(self, record):
+        if record.created >= self._proxima_virada:
+            return True
+        if self.max_bytes and self.stream is not None:
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+    def doRollover(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            sequencias = [seq for data, seq, _ in _arquivos_do_servico(self.diretorio, self.servico)
+                          if data == self._data and seq is not None]
+            rotacionado = os.path.join(
+                self.diretorio, f'{self.servico}_{self._data}.{max(sequencias, default=0) + 1:03d}.log')
+            os.rename(self.baseFilename, rotacionado)
+            self._comprimir_em_fundo([rotacionado])
+
+        self._data = datetime.now().strftime('%Y%m%d')
+        self._proxima_virada = self._virada()
+        self.baseFilename = self._caminho_atual()
+        self.stream = self._open()
+
+    def _comprimir_em_fundo(self, caminhos):
+        def executar():
+            for caminho in caminhos:
+                try:
+                    comprimir(caminho)
+                except OSError as e:
+                    sys.stderr.write(f"Erro ao comprimir {caminho}: {e}\n")
+            aplicar_retencao(self.diretorio, self.servico, self.retencao_dias, self.retencao_bytes)
+
+        # Não é daemon: uma compressão em andamento termina antes de o processo sair
+        thread = threading.Thread(target=executar, name=f'compressao-{self.servico}')
+        self._compressoes = [t for t in self._compressoes if t.is_alive()] + [thread]
+        thread.start()
+
+    def aguardar_compressoes(self):
+        for thread in self._compressoes:
+            thread.join()
+
+
+#*****************************************************************************#
+# Leitura de um intervalo de tempo
+
+def _ler_comprimido(caminho, inicio, fim):
+    try:
+        with open(caminho + '.idx', 'rb') as f:
+            dados = f.read()
+        assinatura, quantidade, primeiro, ultimo = _CABECALHO.unpack_from(dados)
+    except (FileNotFoundError, struct.error):
+        assinatura = None
+    if assinatura != _ASSINATURA:
+        # Sem índice (ex.: comprimido por outra ferramenta): descomprime tudo
+        with gzip.open(caminho, 'rb') as arquivo:
+            yield from arquivo
+        return
+    if ultimo < inicio or primeiro > fim:
+        return
+
+    blocos = [_BLOCO.unpack_from(dados, _CABECALHO.size + i * _BLOCO.size) for i in range(quantidade)]
+    # Último bloco que começa até `inicio`: as linhas anteriores a ele ficam de fora
+    i = max(0, bisect.bisect_right([b[0] for b in blocos], inicio) - 1)
+    with open(caminho, 'rb') as arquivo:
+        for j in range(i, quantidade):
+            primeiro_bloco, offset = blocos[j]
+            if primeiro_bloco > fim:
+                return
+            fim_bloco = blocos[j + 1][1] if j + 1 < quantidade else None
+            arquivo.seek(offset)
+            compactado = arquivo.read(fim_bloco - offset if fim_bloco is not None else -1)
+            yield from zlib.decompress(compactado, 31).splitlines(keepends=True)
+
+
+def ler_intervalo(diretorio, servico, inicio, fim):
+    """Percorre, em ordem, as linhas (bytes) do serviço com timestamp entre inicio e fim
+
+    Lê os arquivos comprimidos pelo índice, descomprimindo só os blocos do intervalo, e
+    os arquivos ainda não comprimidos (inclusive o atual) por inteiro. Linhas sem
+    timestamp (continuações, como tracebacks) acompanham a linha anterior.
+    """
+    dia_inicio = datetime.fromtimestamp(inicio).strftime('%Y%m%d')
+    dia_fim = datetime.fromtimestamp(fim).strftime('%Y%m%d')
+    instante_de = _LeitorInstante()
+    for data, _, nome in _arquivos_do_servico(diretorio, servico):
+        if not dia_inicio <= data <= dia_fim:
+            continue
+        caminho = os.path.join(diretorio, nome)
+        if nome.endswith('.gz'):
+            linhas = _ler_comprimido(caminho, inicio, fim)
+        else:
+            try:
+                linhas = open(caminho, 'rb')
+            except FileNotFoundError:
+                # Comprimido enquanto a lista era montada
+                continue
+        dentro = False
+        try:
+            for linha in linhas:
+                instante = instante_de(linha)
+                if instante is not None:
+                    if instante > fim:
+                        break
+                    dentro = instante >= inicio
+                if dentro:
+                    yield linha
+        finally:
+            linhas.close()
+
+
+def _instante(texto):
+    return datetime.fromisoformat(texto).timestamp()
+
+
+# Consulta os logs de um serviço, inclusive os arquivos comprimidos:
+#   python arquivos_log.py ler ms_lance 2025-10-01T14:00 2025-10-01T14:05
+#   python arquivos_log.py comprimir ../logs/ms_lance_20251001.001.log
+if __name__ == '__main__':
+    diretorio_logs = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs'))
+    if len(sys.argv) == 5 and sys.argv[1] == 'ler':
+        saida = sys.stdout.buffer
+        for linha in ler_intervalo(diretorio_logs, sys.argv[2], _instante(sys.argv[3]), _instante(sys.argv[4])):
+            saida.write(linha)
+    elif len(sys.argv) == 3 and sys.argv[1] == 'comprimir':
+        print(f"Comprimido em {comprimir(sys.argv[2])}")
+    else:
+        print("Uso: python arquivos_log.py ler <servico> <inicio ISO> <fim ISO>")
+        print("     python arquivos_log.py comprimir <arquivo.log>")
+        sys.exit(1)
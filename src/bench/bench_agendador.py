@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from array import array
+
+# importa os módulos dos serviços
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
+from agendador import Agendador
+
+
+def _por_operacao(inicio, quantidade):
+    return (time.perf_counter() - inicio) / quantidade * 1e6
+
+
+def operacoes(quantidade, semente=1):
+    """Custo (µs) de agendar, cancelar e disparar com `quantidade` leilões no heap"""
+    sorteio = random.Random(semente)
+    agora = [0.0]
+    agendador = Agendador(relogio=lambda: agora[0])
+    instantes = [sorteio.uniform(0, 3600) for _ in range(quantidade)]
+
+    inicio = time.perf_counter()
+    eventos = [agendador.agendar(instante, lambda: None) for instante in instantes]
+    agendar = _por_operacao(inicio, quantidade)
+
+    # Agendar e cancelar mais 10% com o heap cheio (reagendamentos e cancelamentos)
+    extras = quantidade // 10
+    inicio = time.perf_counter()
+    for instante in instantes[:extras]:
+        agendador.cancelar(agendador.agendar(instante + 1, lambda: None))
+    cancelar = _por_operacao(inicio, extras)
+
+    # Um tick do laço antigo: comparar todos os leilões com o horário atual
+    inicio = time.perf_counter()
+    sum(1 for instante in instantes if instante <= agora[0])
+    varredura = (time.perf_counter() - inicio) * 1000
+
+    agora[0] = 3601.0
+    inicio = time.perf_counter()
+    disparados = agendador.executar_vencidos()
+    disparar = _por_operacao(inicio, disparados)
+    assert disparados == len(eventos)
+    return agendar, cancelar, disparar, varredura
+
+
+async def _atrasos(quantidade, janela):
+    agendador = Agendador()
+    atrasos = array('d')
+    base = time.time() + 0.5
+
+    def disparar(instante):
+        atrasos.append((time.time() - instante) * 1000)
+
+    for i in range(quantidade):
+        instante = base + janela * i / quantidade
+        agendador.agendar(instante, disparar, instante)
+    laco = asyncio.ensure_future(agendador.executar())
+    while len(atrasos) < quantidade:
+        await asyncio.sleep(0.1)
+    laco.cancel()
+    return sorted(atrasos)
+
+
+def atrasos(quantidade, janela):
+    """Atraso (ms) de cada disparo em relação ao prazo, com o laço executar() real"""
+    return asyncio.run(_atrasos(quantidade, janela))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo e precisão do agendador de início/fim dos leilões")
+    parser.add_argument('--leiloes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="quantidades de eventos agendados medidas")
+    parser.add_argument('--janela', type=float, default=10.0,
+                        help="segundos em que os eventos da medida de precisão vencem")
+    opcoes = parser.parse_args()
+
+    print(f"{'eventos':>9} {'agendar':>10} {'cancelar':>10} {'disparar':>10} {'varredura':>12}")
+    for quantidade in opcoes.leiloes:
+        agendar, cancelar, disparar, varredura = operacoes(quantidade)
+        print(f"{quantidade:>9} {agendar:>7.2f} µs {cancelar:>7.2f} µs {disparar:>7.2f} µs "
+              f"{varredura:>9.2f} ms")
+
+    quantidade = max(opcoes.leiloes)
+    amostras = atrasos(quantidade, opcoes.janela)
+    print(f"\n{quantidade} eventos vencendo em {opcoes.janela:.0f}s, atraso do disparo: "
+          f"p50={amostras[len(amostras) // 2]:.2f}ms p99={amostras[int(len(amostras) * 0.99)]:.2f}ms "
+          f"max={amostras[-1]:.2f}ms")
+
+# Custo por operação do agendador do ms_leilao e atraso dos disparos:
+#   cd src/bench && python bench_agendador.py --leiloes 1000 10000 100000
+if __name__ == '__main__':
+    main()
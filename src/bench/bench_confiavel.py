@@ -0,0 +1,59 @@
+import os
+import re
+import sys
+import time
+import signal
+import argparse
+import subprocess
+
+DIRETORIO_SERVICOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'services')
+DIRETORIO_CLIENTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client')
+
+MODOS = {'rapido': '0', 'confiavel': '1'}
+
+
+def rodada(modo, opcoes):
+    """Sobe os serviços e roda o carga.py com LEILAO_CONFIAVEL do modo; retorna a saída da carga"""
+    ambiente = dict(os.environ, LEILAO_CONFIAVEL=MODOS[modo], MS_LEILAO_INICIAIS='0')
+    servicos = subprocess.Popen([sys.executable, 'servicos.py'], cwd=DIRETORIO_SERVICOS, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(opcoes.aquecimento)
+        carga = subprocess.run(
+            [sys.executable, 'carga.py', '--usuarios', str(opcoes.usuarios), '--taxa', str(opcoes.taxa),
+             '--duracao', str(opcoes.duracao), '--leiloes', str(opcoes.leiloes),
+             '--processos', str(opcoes.processos)],
+            cwd=DIRETORIO_CLIENTE, env=ambiente, capture_output=True, text=True, check=True)
+    finally:
+        # SIGTERM encerra o runtime de forma graciosa
+        servicos.send_signal(signal.SIGTERM)
+        servicos.wait(timeout=30)
+    return carga.stdout
+
+
+def resumo(saida, duracao):
+    enviados, notificados = map(int, re.search(r"Lances enviados: (\d+)\s+notificados: (\d+)", saida).groups())
+    latencia = re.search(r"Latência lance -> notificação \.lance: (.*)", saida).group(1)
+    return f"{notificados / duracao:8.0f} notificados/s  ({enviados} enviados)  {latencia}"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Vazão e latência do carga.py com e sem o modo confiável (requer RabbitMQ em localhost)")
+    parser.add_argument('--modos', nargs='+', choices=list(MODOS), default=list(MODOS))
+    parser.add_argument('--usuarios', type=int, default=200, help="usuários simulados")
+    parser.add_argument('--taxa', type=float, default=2000.0, help="lances por segundo oferecidos")
+    parser.add_argument('--duracao', type=float, default=30.0, help="duração de cada rodada em segundos")
+    parser.add_argument('--leiloes', type=int, default=100, help="leilões criados em cada rodada")
+    parser.add_argument('--processos', type=int, default=2, help="processos geradores do carga.py")
+    parser.add_argument('--aquecimento', type=float, default=3.0,
+                        help="segundos entre subir os serviços e iniciar a carga")
+    opcoes = parser.parse_args()
+
+    for modo in opcoes.modos:
+        print(f"{modo:>9}: {resumo(rodada(modo, opcoes), opcoes.duracao)}", flush=True)
+
+# Modo rápido (LEILAO_CONFIAVEL=0) contra o confiável (=1), com RabbitMQ em localhost:
+#   cd src/bench && python bench_confiavel.py --taxa 2000 --duracao 30
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+# importa os módulos dos serviços
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
+from diario_lances import DiarioLances
+
+
+def gravar(diretorio, lances, leiloes, lances_por_snapshot, semente=1):
+    """Aplica `lances` lances aceitos como o ms_lance; retorna o custo por lance (µs)"""
+    diario = DiarioLances(diretorio, lances_por_snapshot=lances_por_snapshot)
+    estado = diario.recuperar()
+    sorteio = random.Random(semente)
+    ids = [f"leilao_{i:05d}" for i in range(leiloes)]
+    inicio = time.perf_counter()
+    for i in range(lances):
+        id_leilao = sorteio.choice(ids)
+        estado[id_leilao] = {'valor_do_lance': 100.0 + i, 'id_usuario': f"u{i % 1000}"}
+        diario.registrar_lance(id_leilao, f"u{i % 1000}", 100.0 + i)
+        if diario.precisa_snapshot():
+            diario.snapshot(estado)
+    decorrido = time.perf_counter() - inicio
+    diario.fechar()
+    return decorrido / lances * 1e6
+
+
+def sem_diario(lances, leiloes, semente=1):
+    """Custo por lance (µs) só da atualização em memória, sem diário"""
+    estado = {}
+    sorteio = random.Random(semente)
+    ids = [f"leilao_{i:05d}" for i in range(leiloes)]
+    inicio = time.perf_counter()
+    for i in range(lances):
+        id_leilao = sorteio.choice(ids)
+        estado[id_leilao] = {'valor_do_lance': 100.0 + i, 'id_usuario': f"u{i % 1000}"}
+    return (time.perf_counter() - inicio) / lances * 1e6
+
+
+def recuperar(diretorio):
+    """Tempo (ms) de reconstrução do estado e quantidade de leilões recuperados"""
+    diario = DiarioLances(diretorio)
+    inicio = time.perf_counter()
+    estado = diario.recuperar()
+    decorrido = (time.perf_counter() - inicio) * 1000
+    diario.fechar()
+    return decorrido, len(estado)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo de escrita e tempo de recuperação do diário de lances")
+    parser.add_argument('--lances', type=int, nargs='+', default=[105000, 1005000],
+                        help="históricos de lances medidos")
+    parser.add_argument('--leiloes', type=int, default=1000, help="leilões abertos")
+    parser.add_argument('--snapshot', type=int, default=10000, help="lances entre dois snapshots")
+    opcoes = parser.parse_args()
+
+    print(f"{opcoes.leiloes} leilões abertos, snapshot a cada {opcoes.snapshot} lances")
+    for lances in opcoes.lances:
+        diretorio = tempfile.mkdtemp(prefix='bench_diario_')
+        try:
+            custo = gravar(diretorio, lances, opcoes.leiloes, opcoes.snapshot)
+            base = sem_diario(lances, opcoes.leiloes)
+            tempo, recuperados = recuperar(diretorio)
+            print(f"  {lances:>9} lances: escrita {custo:6.2f} µs/lance (sem diário {base:.2f}), "
+                  f"recuperação {tempo:7.1f} ms ({recuperados} leilões)")
+        finally:
+            shutil.rmtree(diretorio)
+
+# Custo do diário por lance aceito e tempo de reinício do ms_lance:
+#   cd src/bench && python bench_diario.py --lances 105000 1005000 --leiloes 1000
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import argparse
+
+# importa os módulos do cliente e os compartilhados
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'client'))
+from shards import fila_do_leilao
+from protocolo import codificar
+from lances import EmissorLances
+
+ASSINATURA = bytes(range(256))
+LEILOES = [f"leilao_{i:02d}" for i in range(1, 11)]
+
+
+class PublicadorNulo:
+    """Interface do PublicadorConfirmado sem broker: só conta as mensagens"""
+
+    def __init__(self):
+        self.filas = set()
+        self.publicadas = 0
+
+    def declarar_fila(self, fila):
+        self.filas.add(fila)
+
+    def publicar(self, exchange, routing_key, body, properties=None):
+        self.publicadas += 1
+
+
+def antigo(lances, formato):
+    """Caminho do dar_lance antes do EmissorLances: cotação lida do texto exibido e o
+    lance inteiro serializado a cada envio"""
+    publicador = PublicadorNulo()
+    cotacoes_exibidas = {id_leilao: "R$ 100,00" for id_leilao in LEILOES}
+    inicio = time.perf_counter()
+    for i in range(lances):
+        id_leilao = LEILOES[i % len(LEILOES)]
+        valor = 101.0 + i
+        cotacao_atual = float(cotacoes_exibidas[id_leilao].replace('R$ ', '').replace(',', '.'))
+        if valor <= cotacao_atual:
+            continue
+        fila = fila_do_leilao('lance_realizado', id_leilao)
+        publicador.declarar_fila(fila)
+        body, propriedades = codificar('lance', {
+            "id_usuario": 'cliente_01', "id_leilao": id_leilao,
+            "valor_do_lance": valor, "assinatura": ASSINATURA}, formato)
+        publicador.publicar('', fila, body, propriedades)
+    return lances / (time.perf_counter() - inicio)
+
+
+def emissor(lances, formato):
+    """Caminho atual: cotação numérica e lance pré-serializado do EmissorLances"""
+    publicador = PublicadorNulo()
+    lances_cliente = EmissorLances('cliente_01', ASSINATURA, publicador, formato)
+    for id_leilao in LEILOES:
+        lances_cliente.atualizar_cotacao(id_leilao, 100.0)
+    inicio = time.perf_counter()
+    for i in range(lances):
+        id_leilao = LEILOES[i % len(LEILOES)]
+        valor = 101.0 + i
+        if valor <= lances_cliente.cotacao(id_leilao):
+            continue
+        lances_cliente.enviar(id_leilao, valor)
+    return lances / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lances por segundo no caminho de envio do cliente")
+    parser.add_argument('--lances', type=int, default=200000, help="lances enviados em cada medida")
+    opcoes = parser.parse_args()
+
+    print(f"{opcoes.lances} lances em {len(LEILOES)} leilões, publicador sem broker")
+    for formato in ('json', 'binario'):
+        anterior = antigo(opcoes.lances, formato)
+        atual = emissor(opcoes.lances, formato)
+        print(f"  {formato:>7}: antes {anterior:9.0f} lances/s ({1e6 / anterior:.2f} µs)  "
+              f"EmissorLances {atual:9.0f} lances/s ({1e6 / atual:.2f} µs)")
+
+# Vazão do dar_lance sem a interface e sem o broker:
+#   cd src/bench && python bench_lances.py --lances 200000
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+
+# importa os módulos dos serviços
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
+
+MODOS = (('síncrono', '0'), ('assíncrono', '1'))
+
+
+class RuntimeNulo:
+    """Runtime sem broker: o ms_lance publica os lances validados aqui"""
+
+    def publicar(self, exchange, routing_key, body, properties=None):
+        pass
+
+    def ao_iniciar(self, preparar):
+        pass
+
+    def ao_encerrar(self, finalizar):
+        pass
+
+
+def medir(lances):
+    """Lances por segundo do ms_lance.callback_lance com o log configurado no ambiente
+
+    Retorna a vazão de quem registra e a vazão contando a gravação dos registros ainda
+    na fila (no modo assíncrono). A verificação de assinatura é trocada por uma que
+    sempre aceita, para que a medida seja do caminho do lance com o log.
+    """
+    import ms_lance
+    from protocolo import codificar
+
+    ms_lance.verificador.verificar = lambda id_usuario, assinatura: None
+    ms_lance.registrar(RuntimeNulo())
+    mensagens = [codificar('lance', {'id_leilao': f"leilao_{i % 100:02d}", 'id_usuario': 'cliente_01',
+                                     'valor_do_lance': 100.0 + i, 'assinatura': b'assinatura'})
+                 for i in range(lances)]
+
+    async def executar():
+        for body, propriedades in mensagens:
+            await ms_lance.callback_lance(None, None, propriedades, body)
+
+    inicio = time.perf_counter()
+    asyncio.run(executar())
+    decorrido = time.perf_counter() - inicio
+    ms_lance.logger.fechar()
+    return lances / decorrido, lances / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão do callback_lance com o log síncrono e assíncrono")
+    parser.add_argument('--lances', type=int, default=50000, help="lances tratados em cada medida")
+    parser.add_argument('--formatos', nargs='+', choices=('texto', 'json'), default=['texto', 'json'])
+    parser.add_argument('--interno', action='store_true', help=argparse.SUPPRESS)
+    opcoes = parser.parse_args()
+
+    if opcoes.interno:
+        print(*medir(opcoes.lances))
+        return
+
+    # Cada modo roda num processo novo: o modo e o formato são lidos na importação do logger.
+    # Os logs vão para o diretório de logs; o console é descartado.
+    print(f"{opcoes.lances} lances aceitos pelo callback_lance, log em disco")
+    for formato in opcoes.formatos:
+        for nome, assincrono in MODOS:
+            ambiente = dict(os.environ, LEILAO_LOG_ASSINCRONO=assincrono, LEILAO_LOG_FORMATO=formato)
+            saida = subprocess.run([sys.executable, __file__, '--interno', '--lances', str(opcoes.lances)],
+                                   env=ambiente, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   text=True, check=True).stdout
+            vazao, com_escrita = map(float, saida.split())
+            print(f"  {nome:>10}, {formato:>5}: {vazao:7.0f} lances/s ({1e6 / vazao:5.1f} µs/lance), "
+                  f"{com_escrita:7.0f} lances/s até o último registro gravado")
+
+# Log síncrono contra o assíncrono (LEILAO_LOG_ASSINCRONO) no caminho do lance:
+#   cd src/bench && python bench_log.py --lances 50000
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import argparse
+
+# importa o módulo de métricas compartilhado pelos serviços
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from metricas import Contador, Medidor, Histograma
+
+
+def _por_amostra(registrar, amostras):
+    # Desconta o custo do próprio laço, medido com uma função vazia
+    def vazio():
+        pass
+
+    inicio = time.perf_counter()
+    for _ in range(amostras):
+        vazio()
+    laco = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for _ in range(amostras):
+        registrar()
+    return max(0.0, time.perf_counter() - inicio - laco) / amostras * 1e9
+
+
+def medir(amostras):
+    """Custo (ns) de cada tipo de amostra, como registradas nos caminhos quentes"""
+    contador = Contador('bench_total', 'Contador')
+    rotulado = Contador('bench_motivo_total', 'Contador com rótulo', ('motivo',)).rotulos('valor_insuficiente')
+    medidor = Medidor('bench_medidor', 'Medidor')
+    histograma = Histograma('bench_segundos', 'Histograma')
+
+    def medicao_completa():
+        # Como o tempo de verificação no ms_lance: dois perf_counter e uma observação
+        inicio = time.perf_counter()
+        histograma.observar(time.perf_counter() - inicio)
+
+    return {
+        'Contador.inc': _por_amostra(contador.inc, amostras),
+        'Contador.inc (rótulo guardado)': _por_amostra(rotulado.inc, amostras),
+        'Medidor.definir': _por_amostra(lambda: medidor.definir(42), amostras),
+        'Histograma.observar': _por_amostra(lambda: histograma.observar(0.0042), amostras),
+        'medição completa': _por_amostra(medicao_completa, amostras),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Custo por amostra das métricas (meta: menos de 1 µs)")
+    parser.add_argument('--amostras', type=int, default=1000000, help="amostras registradas em cada medida")
+    opcoes = parser.parse_args()
+
+    print(f"{opcoes.amostras} amostras, sem o custo do laço")
+    for nome, custo in medir(opcoes.amostras).items():
+        print(f"  {nome:>30}: {custo:6.0f} ns")
+
+# Custo de registrar uma amostra nas métricas dos serviços:
+#   cd src/bench && python bench_metricas.py --amostras 1000000
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import argparse
+
+# importa o protocolo compartilhado pelos serviços e pelo cliente
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from protocolo import codificar, decodificar
+
+# Uma mensagem de cada salto: cliente -> ms_lance -> ms_notificacao -> cliente, e o resultado
+MENSAGENS = {
+    'lance': {'id_leilao': 'leilao_01', 'id_usuario': 'cliente_01', 'valor_do_lance': 1234.56,
+              'assinatura': bytes(range(256))},
+    'lance_validado': {'id_leilao': 'leilao_01', 'id_usuario': 'cliente_01', 'valor_do_lance': 1234.56},
+    'vencedor': {'id_leilao': 'leilao_01', 'id_usuario': 'cliente_01', 'valor_do_lance': 1234.56},
+    'fim': {'id_leilao': 'leilao_01', 'id_vencedor': 'cliente_01', 'valor_negociado': 1234.56},
+}
+
+
+def medir(tipo, formato, repeticoes):
+    """Tamanho (bytes) e custo (µs) de codificar e decodificar uma mensagem do tipo"""
+    mensagem = MENSAGENS[tipo]
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        body, propriedades = codificar(tipo, mensagem, formato)
+    codificacao = (time.perf_counter() - inicio) / repeticoes * 1e6
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        decodificar(tipo, propriedades, body)
+    decodificacao = (time.perf_counter() - inicio) / repeticoes * 1e6
+    return len(body), codificacao, decodificacao
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamanho e custo de codificação das mensagens em JSON e binário")
+    parser.add_argument('--repeticoes', type=int, default=100000, help="codificações por medida")
+    opcoes = parser.parse_args()
+
+    print(f"{'mensagem':>15} {'formato':>8} {'bytes':>6} {'codificar':>12} {'decodificar':>12}")
+    for tipo in MENSAGENS:
+        for formato in ('json', 'binario'):
+            tamanho, codificacao, decodificacao = medir(tipo, formato, opcoes.repeticoes)
+            print(f"{tipo:>15} {formato:>8} {tamanho:>6} {codificacao:>9.2f} µs {decodificacao:>9.2f} µs")
+
+# Formato JSON contra o binário (LEILAO_FORMATO) em cada salto de um lance:
+#   cd src/bench && python bench_protocolo.py --repeticoes 100000
+if __name__ == '__main__':
+    main()
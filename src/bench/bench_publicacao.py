@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from array import array
+import pika
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from mensageria import PublicadorConfirmado, MODO_CONFIAVEL
+
+FILA = 'bench_publicacao'
+CORPO = b'x' * 440  # tamanho de um lance JSON assinado
+
+
+def percentis(amostras):
+    ordenadas = sorted(amostras)
+    def percentil(p):
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+    return f"p50={percentil(0.5):7.2f}ms p99={percentil(0.99):7.2f}ms max={ordenadas[-1]:7.2f}ms"
+
+
+def por_lance(host, lances, intervalo):
+    """Como o cliente antigo: uma BlockingConnection aberta e fechada em cada lance"""
+    clique = array('d')
+    for _ in range(lances):
+        inicio = time.perf_counter()
+        conexao = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+        canal = conexao.channel()
+        if MODO_CONFIAVEL:
+            # basic_publish passa a esperar a confirmação do broker
+            canal.confirm_delivery()
+        canal.queue_declare(queue=FILA)
+        canal.basic_publish(exchange='', routing_key=FILA, body=CORPO)
+        conexao.close()
+        clique.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(intervalo)
+    return clique, clique
+
+
+def persistente(host, lances, intervalo):
+    """Como o cliente atual: PublicadorConfirmado com a conexão aberta durante toda a sessão
+
+    Retorna o tempo até publicar() retornar (o que o clique espera) e até a confirmação
+    do broker chegar.
+    """
+    clique, confirmacao = array('d'), array('d')
+    confirmados = threading.Semaphore(0)
+    publicador = PublicadorConfirmado(host)
+    publicador.declarar_fila(FILA)
+
+    def ao_confirmar(inicio, sucesso):
+        confirmacao.append((time.perf_counter() - inicio) * 1000)
+        confirmados.release()
+
+    for _ in range(lances):
+        inicio = time.perf_counter()
+        publicador.publicar('', FILA, CORPO, ao_confirmar=lambda sucesso, inicio=inicio: ao_confirmar(inicio, sucesso))
+        clique.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(intervalo)
+    for _ in range(lances):
+        confirmados.acquire()
+    publicador.fechar()
+    return clique, confirmacao
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Latência do clique até a publicação de um lance (requer RabbitMQ)")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--lances', type=int, default=1000, help="lances publicados por modo")
+    parser.add_argument('--intervalo', type=float, default=10.0, help="milissegundos entre dois cliques")
+    opcoes = parser.parse_args()
+
+    for nome, medir in (('por lance', por_lance), ('persistente', persistente)):
+        clique, confirmacao = medir(opcoes.host, opcoes.lances, opcoes.intervalo / 1000)
+        print(f"{nome:>11}: clique {percentis(clique)}  confirmação {percentis(confirmacao)}", flush=True)
+
+    conexao = pika.BlockingConnection(pika.ConnectionParameters(host=opcoes.host))
+    conexao.channel().queue_delete(queue=FILA)
+    conexao.close()
+
+# Conexão por lance (cliente antigo) contra o PublicadorConfirmado, com RabbitMQ em localhost:
+#   cd src/bench && python bench_publicacao.py --lances 1000 --intervalo 10
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import random
+import argparse
+
+# importa os módulos dos serviços e do gerador de carga
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'client'))
+from verificacao import VerificadorAssinaturas
+from carga import preparar_chaves, DIRETORIO_CHAVES
+
+
+def medir(usuarios, lances, capacidade_verificacoes, semente=1):
+    """Lances verificados por segundo pelo VerificadorAssinaturas do ms_lance"""
+    verificador = VerificadorAssinaturas(DIRETORIO_CHAVES, capacidade_verificacoes=capacidade_verificacoes)
+    # As chaves públicas são carregadas antes: só a verificação entra na medida
+    for id_usuario, _ in usuarios:
+        verificador.cache_chaves.obter(id_usuario)
+
+    sorteio = random.Random(semente)
+    sequencia = [sorteio.choice(usuarios) for _ in range(lances)]
+    inicio = time.perf_counter()
+    for id_usuario, assinatura in sequencia:
+        verificador.verificar(id_usuario, assinatura)
+    return lances / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lances verificados por segundo com e sem o cache de verificações")
+    parser.add_argument('--usuarios', type=int, default=100, help="usuários (chaves) distintos")
+    parser.add_argument('--lances', type=int, default=20000, help="lances verificados em cada medida")
+    opcoes = parser.parse_args()
+
+    usuarios = preparar_chaves(opcoes.usuarios)
+    sem_cache = medir(usuarios, opcoes.lances, 0)
+    com_cache = medir(usuarios, opcoes.lances, 65536)
+    print(f"{opcoes.lances} lances de {opcoes.usuarios} usuários")
+    print(f"  sem cache: {sem_cache:10.0f} lances/s")
+    print(f"  com cache: {com_cache:10.0f} lances/s  ({com_cache / sem_cache:.0f}x)")
+
+# Verificações por segundo do ms_lance com e sem o cache de resultados:
+#   cd src/bench && python bench_verificacao.py --usuarios 100 --lances 20000
+if __name__ == '__main__':
+    main()
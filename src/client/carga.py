@@ -0,0 +1,371 @@
+import os
+import sys
+import json
+import time
+import random
+import bisect
+import asyncio
+import argparse
+import itertools
+import collections
+import multiprocessing
+from array import array
+import pika
+from Crypto.PublicKey import RSA
+from Crypto.Signature import pkcs1_15
+from Crypto.Hash import SHA256
+
+# importa o logger e os módulos compartilhados com os serviços
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'services'))
+from logger import create_logger
+from runtime import RuntimeServicos, RuntimeLocal
+from shards import filas_dos_shards
+from protocolo import decodificar
+from verificacao import MENSAGEM_DESAFIO
+from lances import EmissorLances
+from servicos import registrar_todos
+import rastreamento
+
+DIRETORIO_CHAVES = '../keys'
+
+# Limites (ms) das faixas do histograma de latência
+FAIXAS_LATENCIA = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Lances sem notificação (recusados ou perdidos) são esquecidos após este tempo (s)
+VALIDADE_LANCE = 30.0
+
+#*****************************************************************************#
+# Pool de chaves dos usuários simulados
+
+def _gerar_chave(argumentos):
+    id_usuario, diretorio = argumentos
+    key = RSA.generate(2048)
+    with open(os.path.join(diretorio, f"private_{id_usuario}.pem"), "wb") as f:
+        f.write(key.export_key())
+    with open(os.path.join(diretorio, f"public_{id_usuario}.pem"), "wb") as f:
+        f.write(key.publickey().export_key())
+    return id_usuario
+
+def preparar_chaves(quantidade, diretorio=DIRETORIO_CHAVES, prefixo='carga'):
+    """Retorna [(id_usuario, assinatura)] dos usuários simulados, gerando só as chaves que faltam
+
+    As chaves ficam em `diretorio` como as do cliente, então o ms_lance verifica os lances
+    simulados normalmente e as execuções seguintes reaproveitam o mesmo pool.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    ids = [f"{prefixo}_{i:05d}" for i in range(quantidade)]
+    faltando = [id_usuario for id_usuario in ids
+                if not os.path.exists(os.path.join(diretorio, f"private_{id_usuario}.pem"))]
+    if faltando:
+        print(f"Gerando {len(faltando)} chave(s) RSA em {diretorio}...")
+        with multiprocessing.Pool() as pool:
+            pool.map(_gerar_chave, [(id_usuario, diretorio) for id_usuario in faltando])
+
+    usuarios = []
+    for id_usuario in ids:
+        with open(os.path.join(diretorio, f"private_{id_usuario}.pem")) as f:
+            key = RSA.import_key(f.read())
+        usuarios.append((id_usuario, pkcs1_15.new(key).sign(SHA256.new(MENSAGEM_DESAFIO))))
+    return usuarios
+
+#*****************************************************************************#
+
+class Latencias:
+    """Amostras de latência (ms) com percentis e histograma por faixas"""
+
+    def __init__(self, amostras=None):
+        self.amostras = array('d', amostras or [])
+
+    def registrar(self, ms):
+        self.amostras.append(ms)
+
+    def juntar(self, outras):
+        self.amostras.extend(outras.amostras)
+
+    def resumo(self):
+        if not self.amostras:
+            return "sem amostras"
+        ordenadas = sorted(self.amostras)
+        def percentil(p):
+            return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+        return (f"n={len(ordenadas)} p50={percentil(0.5):.1f}ms p90={percentil(0.9):.1f}ms "
+                f"p99={percentil(0.99):.1f}ms max={ordenadas[-1]:.1f}ms")
+
+    def histograma(self):
+        contagens = [0] * (len(FAIXAS_LATENCIA) + 1)
+        for ms in self.amostras:
+            contagens[bisect.bisect_left(FAIXAS_LATENCIA, ms)] += 1
+        linhas = []
+        anterior = 0
+        for limite, contagem in zip(FAIXAS_LATENCIA + (None,), contagens):
+            faixa = f"{anterior}-{limite} ms" if limite else f">{anterior} ms"
+            proporcao = contagem / len(self.amostras) if self.amostras else 0
+            linhas.append(f"  {faixa:>14} {contagem:8d} {'#' * round(proporcao * 50)}")
+            anterior = limite
+        return '\n'.join(linhas)
+
+
+class _PublicadorRuntime:
+    # Adapta o runtime à interface do EmissorLances (as filas são declaradas em preparar)
+    def __init__(self, runtime):
+        self.runtime = runtime
+
+    def declarar_fila(self, fila):
+        pass
+
+    def publicar(self, exchange, routing_key, body, properties=None):
+        self.runtime.publicar(exchange, routing_key, body, properties)
+
+
+class GeradorCarga:
+    """Licitantes simulados que dão lances e medem a latência até a notificação .lance
+
+    Os lances seguem um processo de Poisson com a taxa total configurada, em leilões
+    escolhidos com distribuição uniforme ou zipf (poucos leilões concentram os lances) e
+    por usuários sorteados do pool. Cada lance usa o EmissorLances do cliente e é
+    acompanhado por (leilão, usuário, valor) até chegar na notificação publicada pelo
+    ms_notificacao; lances recusados nunca são notificados e não entram no histograma.
+    """
+
+    def __init__(self, usuarios, taxa, duracao, distribuicao='uniforme', incremento=10.0,
+                 criar_leiloes=0, intervalo_relatorio=5.0, logger=None):
+        self.usuarios = usuarios
+        self.taxa = taxa
+        self.duracao = duracao
+        self.distribuicao = distribuicao
+        self.incremento = incremento
+        self.criar_leiloes = criar_leiloes
+        self.intervalo_relatorio = intervalo_relatorio
+        self.logger = logger
+        self.runtime = None
+        self.emissores = []
+
+        self.leiloes = []            # leilões ativos, na ordem em que foram conhecidos
+        self.pesos = []              # pesos acumulados para sortear os leilões
+        self.cotacoes = {}           # id_leilao -> maior valor notificado ou enviado
+        self.aguardando = collections.OrderedDict()  # (leilão, usuário, valor) -> instante do envio
+        self.latencias = Latencias()
+        self.enviados = 0
+        self.notificados = 0
+        self.recusados = 0
+
+    def registrar(self, rt):
+        self.runtime = rt
+        publicador = _PublicadorRuntime(rt)
+        self.emissores = [EmissorLances(id_usuario, assinatura, publicador, logger=self.logger)
+                          for id_usuario, assinatura in self.usuarios]
+        rt.ao_iniciar(self.preparar)
+        rt.tarefa(self.executar)
+        rt.tarefa(self.relatar)
+
+    async def preparar(self, rt):
+        for fila in filas_dos_shards('lance_realizado'):
+            await rt.declarar_fila(fila)
+
+        # Início dos leilões
+        await rt.declarar_exchange('leiloes', 'fanout')
+        fila_leiloes = await rt.declarar_fila('', exclusive=True)
+        await rt.vincular(fila_leiloes, 'leiloes')
+        await rt.consumir(fila_leiloes, self.callback_inicio_leilao)
+
+        # Lances e fins de todos os leilões
+        await rt.declarar_exchange('leilao', 'topic')
+        fila_notificacoes = await rt.declarar_fila('', exclusive=True)
+        await rt.vincular(fila_notificacoes, 'leilao', '*.lance')
+        await rt.vincular(fila_notificacoes, 'leilao', '*.fim')
+        await rt.consumir(fila_notificacoes, self.callback_notificacao)
+
+        # Pede ao ms_leilao os leilões já ativos e, se configurado, cria novos
+        await rt.declarar_fila('leilao_comandos')
+        fila_respostas = await rt.declarar_fila('', exclusive=True)
+        await rt.consumir(fila_respostas, self.callback_resposta)
+        propriedades = pika.BasicProperties(reply_to=fila_respostas, content_type='application/json')
+        rt.publicar('', 'leilao_comandos', json.dumps({
+            "comando": "listar", "status": "ativo", "limite": 100000}).encode('utf-8'), propriedades)
+        if self.criar_leiloes:
+            rt.publicar('', 'leilao_comandos', json.dumps({
+                "comando": "criar_lote",
+                "leiloes": [{"descricao": f"Carga {i}", "valor_minimo": 100.0, "inicio_em": 0,
+                             "duracao": self.duracao + 60} for i in range(self.criar_leiloes)]
+            }).encode('utf-8'), propriedades)
+
+    def adicionar_leilao(self, id_leilao, valor_minimo):
+        if id_leilao in self.cotacoes:
+            return
+        self.cotacoes[id_leilao] = valor_minimo
+        self.leiloes.append(id_leilao)
+        self._recalcular_pesos()
+
+    def remover_leilao(self, id_leilao):
+        if id_leilao in self.cotacoes:
+            del self.cotacoes[id_leilao]
+            self.leiloes.remove(id_leilao)
+            self._recalcular_pesos()
+
+    def _recalcular_pesos(self):
+        if self.distribuicao == 'zipf':
+            pesos = [1.0 / (posicao ** 1.1) for posicao in range(1, len(self.leiloes) + 1)]
+        else:
+            pesos = [1.0] * len(self.leiloes)
+        self.pesos = list(itertools.accumulate(pesos))
+
+    def callback_inicio_leilao(self, ch, method, properties, body):
+        data = json.loads(body)
+        self.adicionar_leilao(data['id_leilao'], data.get('valor_minimo', 100.0))
+
+    def callback_resposta(self, ch, method, properties, body):
+        resposta = json.loads(body)
+        if not resposta.get('ok'):
+            if self.logger:
+                self.logger.error(f"Comando recusado pelo ms_leilao: {resposta.get('erro')}")
+            return
+        for leilao in resposta.get('leiloes', []):
+            self.adicionar_leilao(leilao['id_leilao'], leilao['valor_minimo'])
+
+    def callback_notificacao(self, ch, method, properties, body):
+        agora = time.perf_counter()
+        id_leilao, evento = method.routing_key.rsplit('.', 1)
+        if evento == 'fim':
+            self.remover_leilao(id_leilao)
+            return
+
+        rastro = rastreamento.extrair(properties) if rastreamento.ATIVO else None
+        if rastro is not None and self.logger:
+            for trace_id in properties.headers.get('trace_ids') or [rastro[0]]:
+                self.logger.log_rastro(trace_id, 'cliente.notificado', time.time())
+
+        data = decodificar(('lance_validado', 'lote_lances'), properties, body)
+        for lance in data.get('lances') or [data]:
+            valor = lance['valor_do_lance']
+            if id_leilao in self.cotacoes and valor > self.cotacoes[id_leilao]:
+                self.cotacoes[id_leilao] = valor
+            enviado = self.aguardando.pop((id_leilao, lance['id_usuario'], valor), None)
+            if enviado is not None:
+                self.notificados += 1
+                self.latencias.registrar((agora - enviado) * 1000)
+
+    def dar_lance(self):
+        posicao = bisect.bisect_left(self.pesos, random.random() * self.pesos[-1])
+        id_leilao = self.leiloes[min(posicao, len(self.leiloes) - 1)]
+        emissor = random.choice(self.emissores)
+
+        # Sempre acima do maior valor conhecido, para o lance ser aceito
+        valor = round(self.cotacoes[id_leilao] + random.uniform(0.01, self.incremento), 2)
+        self.cotacoes[id_leilao] = valor
+        self.aguardando[(id_leilao, emissor.id_usuario, valor)] = time.perf_counter()
+        emissor.enviar(id_leilao, valor)
+        self.enviados += 1
+
+    async def executar(self, rt):
+        # Espera conhecer ao menos um leilão ativo
+        while not self.leiloes:
+            await asyncio.sleep(0.1)
+        print(f"Iniciando carga: {self.taxa:.0f} lances/s por {self.duracao:.0f}s "
+              f"em {len(self.leiloes)} leilão(ões) com {len(self.emissores)} usuário(s)")
+
+        inicio = time.perf_counter()
+        proximo = inicio
+        while time.perf_counter() - inicio < self.duracao:
+            agora = time.perf_counter()
+            # Envia todos os lances já vencidos e dorme até o próximo
+            while proximo <= agora and self.leiloes:
+                self.dar_lance()
+                proximo += random.expovariate(self.taxa)
+            if not self.leiloes:
+                proximo = agora
+            await asyncio.sleep(max(0.0, proximo - time.perf_counter()))
+
+        # Tempo para as últimas notificações chegarem
+        await asyncio.sleep(2.0)
+        rt.encerrar()
+
+    async def relatar(self, rt):
+        enviados = notificados = 0
+        while True:
+            await asyncio.sleep(self.intervalo_relatorio)
+            # Lances sem notificação há muito tempo foram recusados ou perdidos
+            limite = time.perf_counter() - VALIDADE_LANCE
+            while self.aguardando and next(iter(self.aguardando.values())) < limite:
+                self.aguardando.popitem(last=False)
+                self.recusados += 1
+            print(f"[{time.strftime('%H:%M:%S')}] enviados={self.enviados} "
+                  f"({(self.enviados - enviados) / self.intervalo_relatorio:.0f}/s) "
+                  f"notificados={self.notificados} "
+                  f"({(self.notificados - notificados) / self.intervalo_relatorio:.0f}/s) "
+                  f"aguardando={len(self.aguardando)} latência: {self.latencias.resumo()}")
+            enviados, notificados = self.enviados, self.notificados
+
+#*****************************************************************************#
+
+def executar_processo(argumentos):
+    """Executa um gerador de carga (um processo) e retorna os totais e as latências"""
+    opcoes, indice, usuarios, taxa, criar_leiloes = argumentos
+    # Um arquivo de log por processo: a rotação do ArquivoRotativo não é segura entre processos
+    logger = create_logger('carga' if opcoes.processos == 1 else f'carga_{indice}')
+    gerador = GeradorCarga(usuarios, taxa, opcoes.duracao, opcoes.distribuicao, opcoes.incremento,
+                           criar_leiloes, opcoes.intervalo, logger)
+
+    if opcoes.local:
+        # Serviços no mesmo processo, sobre o broker em memória (um ms_lance por shard)
+        rt = RuntimeLocal(logger)
+        registrar_todos(rt)
+    else:
+        rt = RuntimeServicos(logger)
+    gerador.registrar(rt)
+    rt.executar()
+    return gerador.enviados, gerador.notificados, gerador.latencias.amostras.tobytes()
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga sem interface gráfica")
+    parser.add_argument('--usuarios', type=int, default=100, help="usuários simulados (pool de chaves)")
+    parser.add_argument('--taxa', type=float, default=100.0, help="lances por segundo (total)")
+    parser.add_argument('--duracao', type=float, default=30.0, help="duração da carga em segundos")
+    parser.add_argument('--distribuicao', choices=('uniforme', 'zipf'), default='uniforme',
+                        help="distribuição dos lances entre os leilões")
+    parser.add_argument('--incremento', type=float, default=10.0, help="incremento máximo de cada lance")
+    parser.add_argument('--leiloes', type=int, default=0,
+                        help="leilões a criar pelo ms_leilao (0 usa os leilões ativos)")
+    parser.add_argument('--processos', type=int, default=1, help="processos geradores")
+    parser.add_argument('--intervalo', type=float, default=5.0, help="intervalo dos relatórios parciais")
+    parser.add_argument('--local', action='store_true',
+                        help="roda ms_leilao, ms_lance e ms_notificacao no processo, sem RabbitMQ")
+    opcoes = parser.parse_args()
+
+    if opcoes.local:
+        if opcoes.processos != 1:
+            parser.error("--local usa um único processo")
+        # Só os leilões criados pela carga
+        os.environ.setdefault('MS_LEILAO_INICIAIS', '0')
+        opcoes.leiloes = opcoes.leiloes or 10
+
+    usuarios = preparar_chaves(opcoes.usuarios)
+
+    # Cada processo recebe uma fatia dos usuários e da taxa; só o primeiro cria leilões
+    argumentos = [(opcoes, i, usuarios[i::opcoes.processos], opcoes.taxa / opcoes.processos,
+                   opcoes.leiloes if i == 0 else 0)
+                  for i in range(opcoes.processos)]
+    if opcoes.processos == 1:
+        resultados = [executar_processo(argumentos[0])]
+    else:
+        with multiprocessing.Pool(opcoes.processos) as pool:
+            resultados = pool.map(executar_processo, argumentos)
+
+    latencias = Latencias()
+    enviados = notificados = 0
+    for enviados_processo, notificados_processo, amostras in resultados:
+        enviados += enviados_processo
+        notificados += notificados_processo
+        latencias.juntar(Latencias(array('d', amostras)))
+
+    print()
+    print(f"Lances enviados: {enviados}  notificados: {notificados}  "
+          f"sem notificação: {enviados - notificados}")
+    print(f"Latência lance -> notificação .lance: {latencias.resumo()}")
+    print(latencias.histograma())
+
+# Gerador de carga:
+#   python carga.py --local --usuarios 50 --taxa 500 --duracao 20
+#   python carga.py --usuarios 1000 --taxa 2000 --processos 4 --leiloes 100 --distribuicao zipf
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,20 @@ import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import threading
 import queue
+import collections
+import time
 from datetime import datetime
 
+# Intervalo da verificação periódica da fila: de segurança quando a interface é acordada
+# por eventos, ou o intervalo de polling se o Tcl não aceitar eventos de outras threads
+INTERVALO_SEGURANCA_MS = 1000
+INTERVALO_POLLING_MS = 100
+# Tempo máximo processando mensagens antes de devolver o controle ao Tk
+ORCAMENTO_LOTE = 0.02
+
 class ClienteGUI:
-    def __init__(self, cliente_id, dar_lance_callback, leiloes_conhecidos, leiloes_interessados):
+    def __init__(self, cliente_id, dar_lance_callback, leiloes_conhecidos, leiloes_interessados, conflacao=False,
+                 max_linhas_log=1000, historico_log=None):
         self.cliente_id = cliente_id
         self.dar_lance_callback = dar_lance_callback
         self.leiloes_conhecidos = leiloes_conhecidos
@@ -16,8 +26,37 @@ class ClienteGUI:
         # Dicionário para armazenar valores mínimos dos leilões
         self.valores_minimos = {}
         
-        # Queue para comunicação thread-safe
+        # Queue para comunicação thread-safe; quem enfileira acorda a interface com o
+        # evento virtual <<NovasMensagens>> (um por lote, enquanto o anterior não é tratado)
         self.message_queue = queue.Queue()
+        self.aviso_pendente = False
+        self.aviso_lock = threading.Lock()
+        self.processando = False
+        self.continuacao_agendada = False
+        self.em_execucao = False
+        self.intervalo_verificacao = INTERVALO_SEGURANCA_MS
+
+        # Modo conflacionado: guarda só o último lance recebido de cada leilão até a
+        # próxima verificação, em vez de enfileirar todos
+        self.conflacao = conflacao
+        self.lances_pendentes = {}
+        self.lances_lock = threading.Lock()
+
+        # Linhas da lista de leilões por id (item do Treeview e valores exibidos) e
+        # leilões alterados desde a última repintura
+        self.linhas_leiloes = {}
+        self.leiloes_alterados = set()
+
+        # Log de atividades limitado a max_linhas_log linhas: as mensagens entram num buffer
+        # circular e são inseridas em bloco a cada verificação, e as linhas mais antigas do
+        # widget são removidas de uma vez. Com historico_log, todas as linhas também são
+        # gravadas nesse arquivo.
+        if not isinstance(max_linhas_log, int) or max_linhas_log < 1:
+            raise ValueError(f"max_linhas_log deve ser um inteiro maior ou igual a 1, não {max_linhas_log!r}")
+        self.max_linhas_log = max_linhas_log
+        self.log_pendente = collections.deque(maxlen=max_linhas_log)
+        self.log_lock = threading.Lock()
+        self.historico_log = open(historico_log, 'a', encoding='utf-8') if historico_log else None
         
         # Criar janela principal
         self.root = tk.Tk()
@@ -26,6 +65,7 @@ class ClienteGUI:
         self.root.configure(bg='#f0f0f0')
         
         self.setup_ui()
+        self.root.bind('<<NovasMensagens>>', self.ao_acordar)
         
         # Timer para verificar mensagens
         self.check_messages()
@@ -146,34 +186,87 @@ class ClienteGUI:
         try:
             self.dar_lance_callback(leilao_id, valor)
         except Exception as e:
-            self.message_queue.put(("error", f"Erro ao dar lance: {e}"))
+            self.enfileirar(("error", f"Erro ao dar lance: {e}"))
+        # O status do leilão pode ter passado para "Escutando"
+        self.enfileirar(("leilao_alterado", leilao_id))
             
     def atualizar_leiloes(self):
-        # Limpar lista atual
-        for item in self.leiloes_tree.get_children():
-            self.leiloes_tree.delete(item)
-            
-        # Adicionar leilões conhecidos
-        leiloes_list = []
-        for leilao_id, descricao in self.leiloes_conhecidos.items():
+        """Sincroniza a lista inteira com os leilões conhecidos (botão Atualizar Leilões)"""
+        self.leiloes_alterados.update(self.leiloes_conhecidos.keys())
+        self.leiloes_alterados.update(self.linhas_leiloes.keys())
+        self.repintar_leiloes()
+
+    def repintar_leiloes(self):
+        """Atualiza apenas as linhas dos leilões alterados desde a última repintura"""
+        if not self.leiloes_alterados:
+            return
+        alterados, self.leiloes_alterados = self.leiloes_alterados, set()
+        novos = False
+
+        for leilao_id in alterados:
+            linha = self.linhas_leiloes.get(leilao_id)
+            descricao = self.leiloes_conhecidos.get(leilao_id)
+            if descricao is None:
+                # Leilão que deixou de existir
+                if linha is not None:
+                    self.leiloes_tree.delete(linha[0])
+                    del self.linhas_leiloes[leilao_id]
+                    novos = True
+                continue
+
             status = "Escutando" if leilao_id in self.leiloes_interessados else "Ativo"
             cotacao = self.cotacoes_atuais.get(leilao_id, "R$ 0,00")
-            self.leiloes_tree.insert('', 'end', text=leilao_id, values=(descricao, cotacao, status))
-            leiloes_list.append(leilao_id)
-            
-        # Atualizar combobox
-        self.leilao_combo['values'] = leiloes_list
+            valores = (descricao, cotacao, status)
+            if linha is None:
+                item = self.leiloes_tree.insert('', 'end', text=leilao_id, values=valores)
+                self.linhas_leiloes[leilao_id] = (item, valores)
+                novos = True
+            elif linha[1] != valores:
+                self.leiloes_tree.item(linha[0], values=valores)
+                self.linhas_leiloes[leilao_id] = (linha[0], valores)
+
+        # Atualizar combobox apenas quando a lista de leilões muda
+        if novos:
+            self.leilao_combo['values'] = list(self.linhas_leiloes.keys())
         
     def log_message(self, message):
+        """Registra uma mensagem no log (pode ser chamado de qualquer thread)"""
         timestamp = datetime.now().strftime("%H:%M:%S")
         formatted_message = f"[{timestamp}] {message}\n"
-        
+
+        with self.log_lock:
+            if self.historico_log is not None:
+                self.historico_log.write(formatted_message)
+            # Com o buffer cheio, a linha mais antiga sai sem chegar ao widget
+            self.log_pendente.append(formatted_message)
+        # Durante o processamento das mensagens o log é descarregado no final
+        if not self.processando:
+            self.acordar()
+
+    def descarregar_log(self):
+        """Insere as mensagens pendentes no widget de uma vez e remove as linhas excedentes"""
+        with self.log_lock:
+            if not self.log_pendente:
+                return
+            mensagens = list(self.log_pendente)
+            self.log_pendente.clear()
+            if self.historico_log is not None:
+                self.historico_log.flush()
+
         self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, formatted_message)
+        self.log_text.insert(tk.END, ''.join(mensagens))
+        # As linhas são contadas pelo índice do widget, pois uma mensagem pode ter várias;
+        # como o texto termina em '\n', 'end-1c' fica no início de uma linha vazia
+        linhas = int(self.log_text.index('end-1c').split('.')[0]) - 1
+        excedente = linhas - self.max_linhas_log
+        if excedente > 0:
+            self.log_text.delete('1.0', f'{excedente + 1}.0')
         self.log_text.see(tk.END)
         self.log_text.config(state=tk.DISABLED)
         
     def limpar_log(self):
+        with self.log_lock:
+            self.log_pendente.clear()
         self.log_text.config(state=tk.NORMAL)
         self.log_text.delete(1.0, tk.END)
         self.log_text.config(state=tk.DISABLED)
@@ -184,7 +277,7 @@ class ClienteGUI:
             
     def novo_leilao(self, leilao_id, descricao, data_inicio, data_fim):
         """Método para ser chamado quando um novo leilão é detectado"""
-        self.message_queue.put(("novo_leilao", {
+        self.enfileirar(("novo_leilao", {
             'id': leilao_id,
             'descricao': descricao,
             'data_inicio': data_inicio,
@@ -193,7 +286,16 @@ class ClienteGUI:
         
     def lance_recebido(self, leilao_id, usuario, valor):
         """Método para ser chamado quando um lance é recebido"""
-        self.message_queue.put(("lance", {
+        if self.conflacao:
+            with self.lances_lock:
+                avisar = not self.lances_pendentes
+                self.lances_pendentes[leilao_id] = (usuario, valor)
+            # Um único aviso na fila para todos os lances pendentes
+            if avisar:
+                self.enfileirar(("lances_pendentes", None))
+            return
+
+        self.enfileirar(("lance", {
             'leilao_id': leilao_id,
             'usuario': usuario,
             'valor': valor
@@ -201,29 +303,78 @@ class ClienteGUI:
         
     def lance_rejeitado(self, leilao_id, valor_rejeitado, motivo, valor_atual=None):
         """Método para ser chamado quando um lance é rejeitado"""
-        self.message_queue.put(("lance_rejeitado", {
+        self.enfileirar(("lance_rejeitado", {
             'leilao_id': leilao_id,
             'valor_rejeitado': valor_rejeitado,
             'motivo': motivo,
             'valor_atual': valor_atual
         }))
         
-    def check_messages(self):
-        """Verifica mensagens na queue e atualiza a interface"""
+    def enfileirar(self, mensagem):
+        """Coloca uma mensagem na fila da interface (pode ser chamado de qualquer thread)"""
+        self.message_queue.put(mensagem)
+        self.acordar()
+
+    def acordar(self):
+        """Agenda o processamento das mensagens na thread da interface"""
+        with self.aviso_lock:
+            if self.aviso_pendente:
+                return
+            self.aviso_pendente = True
+        try:
+            self.root.event_generate('<<NovasMensagens>>', when='tail')
+        except (RuntimeError, tk.TclError):
+            # Laço do Tk ainda não iniciado ou Tcl sem suporte a threads: fica para a
+            # verificação periódica, que passa a ser o polling se o laço já está rodando
+            with self.aviso_lock:
+                self.aviso_pendente = False
+            if self.em_execucao:
+                self.intervalo_verificacao = INTERVALO_POLLING_MS
+
+    def ao_acordar(self, event=None):
+        with self.aviso_lock:
+            self.aviso_pendente = False
+        self.processar_mensagens()
+
+    def continuar_processamento(self):
+        self.continuacao_agendada = False
+        self.processar_mensagens()
+
+    def processar_mensagens(self):
+        """Processa as mensagens da fila em lotes limitados por tempo e atualiza a interface"""
+        self.processando = True
+        limite = time.monotonic() + ORCAMENTO_LOTE
         try:
             while True:
+                if time.monotonic() >= limite:
+                    # Carga alta: repinta e continua no próximo ciclo, sem travar a interface
+                    if not self.continuacao_agendada:
+                        self.continuacao_agendada = True
+                        self.root.after(1, self.continuar_processamento)
+                    break
                 msg_type, data = self.message_queue.get_nowait()
                 
                 if msg_type == "novo_leilao":
                     self.log_message(f"🆕 NOVO LEILÃO: {data['id']} - {data['descricao']}")
-                    self.atualizar_leiloes()
+                    self.leiloes_alterados.add(data['id'])
                     
                 elif msg_type == "lance":
                     # Atualizar cotação atual
                     self.cotacoes_atuais[data['leilao_id']] = f"R$ {data['valor']:.2f}"
                     self.log_message(f"💰 Lance: {data['usuario']} - R$ {data['valor']:.2f} ({data['leilao_id']})")
-                    # Atualizar interface para mostrar nova cotação
-                    self.atualizar_leiloes()
+                    # A nova cotação aparece na repintura ao fim desta verificação
+                    self.leiloes_alterados.add(data['leilao_id'])
+                    
+                elif msg_type == "lances_pendentes":
+                    with self.lances_lock:
+                        lances, self.lances_pendentes = self.lances_pendentes, {}
+                    for leilao_id, (usuario, valor) in lances.items():
+                        self.cotacoes_atuais[leilao_id] = f"R$ {valor:.2f}"
+                        self.log_message(f"💰 Lance: {usuario} - R$ {valor:.2f} ({leilao_id})")
+                        self.leiloes_alterados.add(leilao_id)
+                    
+                elif msg_type == "leilao_alterado":
+                    self.leiloes_alterados.add(data)
                     
                 elif msg_type == "lance_rejeitado":
                     if data['motivo'] == "Valor insuficiente" and data['valor_atual']:
@@ -237,10 +388,30 @@ class ClienteGUI:
                     
         except queue.Empty:
             pass
-            
-        # Reagendar verificação
-        self.root.after(100, self.check_messages)
+        finally:
+            self.processando = False
+
+        # Uma única repintura da lista e do log por lote
+        self.repintar_leiloes()
+        self.descarregar_log()
+
+    def check_messages(self):
+        """Verificação periódica da fila (segurança contra avisos perdidos, ou polling)"""
+        self.processar_mensagens()
+        self.root.after(self.intervalo_verificacao, self.check_messages)
         
+    def iniciar_execucao(self):
+        self.em_execucao = True
+        # Mensagens que chegaram antes do laço do Tk começar
+        self.acordar()
+
     def run(self):
         """Inicia a interface gráfica"""
-        self.root.mainloop()
\ No newline at end of file
+        self.root.after_idle(self.iniciar_execucao)
+        try:
+            self.root.mainloop()
+        finally:
+            if self.historico_log is not None:
+                with self.log_lock:
+                    self.historico_log.close()
+                    self.historico_log = None
\ No newline at end of file
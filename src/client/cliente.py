@@ -1,7 +1,7 @@
 import json
 import pika
 import threading
-import base64 
+import time
 import sys
 import os
 from Crypto.PublicKey import RSA
@@ -13,12 +13,18 @@ from client_window import ClienteGUI
 # importa o logger
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from logger import create_logger
+from mensageria import CanalServico, PublicadorConfirmado
+from protocolo import decodificar
+from lances import EmissorLances
+import metricas
+import rastreamento
 
 #conecta com o servidor rabbitmq
 connection = pika.BlockingConnection(
     pika.ConnectionParameters(host='localhost')
 )
 channel = connection.channel()
+canal = CanalServico(channel)
 
 #define o id do cliente
 if len(sys.argv) > 1:
@@ -56,6 +62,16 @@ channel.queue_bind(exchange='leiloes', queue=queue_name)
 # Variável global para a GUI
 gui = None
 
+# Métricas do cliente (exportadas com LEILAO_METRICAS_PORTA ou LEILAO_METRICAS_ARQUIVO)
+lances_enviados = metricas.contador('leilao_cliente_lances_enviados_total', 'Lances publicados pelo cliente')
+lances_recusados = metricas.contador(
+    'leilao_cliente_lances_recusados_total', 'Lances recusados pelo próprio cliente antes do envio', ('motivo',))
+notificacoes_recebidas = metricas.contador(
+    'leilao_cliente_notificacoes_total', 'Notificações de leilão recebidas', ('evento',))
+atraso_notificacoes = metricas.histograma(
+    'leilao_cliente_atraso_notificacao_segundos', 'Tempo entre a publicação da notificação e o seu tratamento')
+metricas.iniciar_exportacao(f'cliente_{CLIENTE_ID}')
+
 #comando de execução após receber a mensagem do ms_leilao
 def callback_inicio_leilao(ch, method, properties, body):
     global gui
@@ -66,10 +82,15 @@ def callback_inicio_leilao(ch, method, properties, body):
     descricao = data.get('descricao')
     valor_minimo = data.get('valor_minimo', 100.0)
     leiloes_conhecidos[id_leilao] = descricao
+    #a cotação numérica começa no valor mínimo
+    emissor_lances.atualizar_cotacao(id_leilao, valor_minimo)
     
     logger.info(f"NOVO LEILÃO INICIADO - ID: {id_leilao}, Descrição: {descricao}")
     logger.info(f"Valor mínimo: R$ {valor_minimo:.2f}")
     logger.info(f"Período: {data.get('data_inicio')} até {data.get('data_fim')}")
+    if data.get('tipo', 'ascendente') != 'ascendente':
+        #lances fechados: os lances dos outros não são divulgados, só o resultado
+        logger.info(f"Tipo: {data.get('tipo')} ({data.get('unidades', 1)} unidade(s))")
     
     # Notificar GUI se estiver disponível
     if gui:
@@ -79,16 +100,22 @@ def callback_inicio_leilao(ch, method, properties, body):
         gui.novo_leilao(id_leilao, descricao, data.get('data_inicio'), data.get('data_fim'))
 
 #consome as mensagens da fila temporária
-channel.basic_consume(queue=queue_name, on_message_callback=callback_inicio_leilao, auto_ack=True)
+canal.consumir(queue_name, callback_inicio_leilao)
 
 #*****************************************************************************#
 
+#publicador persistente dos lances, com reconexão automática e buffer de saída
+publicador_lances = PublicadorConfirmado('localhost', logger)
+
 #gera a assinatura digital
 message = b'AplicacaoLeilao.2025.2'
 key = RSA.import_key(open(f'../keys/private_{CLIENTE_ID}.pem').read())
 h = SHA256.new(message)
 signature = pkcs1_15.new(key).sign(h)
 
+#monta os lances com a assinatura e os campos fixos já serializados
+emissor_lances = EmissorLances(CLIENTE_ID, signature, publicador_lances, logger=logger)
+
 #*****************************************************************************#
 
 def dar_lance(id_leilao, valor):
@@ -110,43 +137,24 @@ def dar_lance(id_leilao, valor):
     #não aceita valores nulos ou negativos
     if valor <= 0:
         logger.error(f"Valor de lance inválido: {valor} (deve ser maior que zero)")
+        lances_recusados.rotulos('valor_invalido').inc()
         if gui:
             gui.log_message(f"❌ Valor de lance inválido: R$ {valor:.2f}")
         return
     
-    # Verificar se o valor é suficiente comparado à cotação atual
-    if gui and id_leilao in gui.cotacoes_atuais:
-        cotacao_str = gui.cotacoes_atuais[id_leilao]
-        # Extrair valor numérico da string "R$ X,XX"
-        cotacao_atual = float(cotacao_str.replace('R$ ', '').replace(',', '.'))
-        if valor <= cotacao_atual:
-            logger.error(f"Valor insuficiente: R$ {valor:.2f} <= R$ {cotacao_atual:.2f}")
-            gui.lance_rejeitado(id_leilao, valor, "Valor insuficiente", cotacao_str)
-            return
-    
-    #define a assinatura digital
-    assinatura_base64 = base64.b64encode(signature).decode('utf-8')
-
-    #define os dados do lance
-    dados_do_lance = {
-        "id_usuario": CLIENTE_ID,
-        "id_leilao": id_leilao,
-        "valor_do_lance": valor,
-        "assinatura": assinatura_base64 
-    }
+    # Verificar se o valor é suficiente comparado à cotação atual (tabela numérica)
+    cotacao_atual = emissor_lances.cotacao(id_leilao)
+    if cotacao_atual is not None and valor <= cotacao_atual:
+        logger.error(f"Valor insuficiente: R$ {valor:.2f} <= R$ {cotacao_atual:.2f}")
+        lances_recusados.rotulos('valor_insuficiente').inc()
+        if gui:
+            gui.lance_rejeitado(id_leilao, valor, "Valor insuficiente", f"R$ {cotacao_atual:.2f}")
+        return
     
     try:
-        #conecta ao broker
-        connection_envio = pika.BlockingConnection(
-            pika.ConnectionParameters(host='localhost')
-        )
-        canal_envio = connection_envio.channel()
-
-        #declara a fila de lance_realizado
-        canal_envio.queue_declare(queue='lance_realizado')
-        mensagem_json = json.dumps(dados_do_lance)
-        canal_envio.basic_publish(exchange='',routing_key='lance_realizado',body=mensagem_json.encode('utf-8')        )
-        connection_envio.close()
+        #publica na fila de lance_realizado do shard dono do leilão; só o valor é codificado
+        emissor_lances.enviar(id_leilao, valor)
+        lances_enviados.inc()
 
         logger.log_cliente_acao("LANCE_ENVIADO", f"R$ {valor} para leilão {id_leilao} ({leiloes_conhecidos[id_leilao]})")
         
@@ -160,77 +168,140 @@ def dar_lance(id_leilao, valor):
 
 #*****************************************************************************#
 
-#configura o canal para receber as mensagens de um leilão de interesse do cliente
+#configura o canal para receber as mensagens dos leilões de interesse do cliente
 channel.exchange_declare(exchange='leilao', exchange_type='topic')
 
-def escutar_leilao(id_leilao):
-    #função para notificar as mensagens de um leilão de interesse para o cliente
-    def callback_notificacao(ch, method, properties, body):
-        global gui
-        msg = body.decode('utf-8')
-        data = json.loads(msg)
+#fila temporária única para os eventos de todos os leilões acompanhados
+result = channel.queue_declare(queue='', exclusive=True)
+fila_notificacoes = result.method.queue
 
-        routing_key = method.routing_key
-        
-        #verifica se a mensagem é um lance
-        if routing_key.endswith('.lance'):
-            logger.log_lance_recebido(id_leilao, data.get('id_usuario'), data.get('valor_do_lance'))
+#função para notificar as mensagens de um leilão de interesse para o cliente
+def registrar_rastros(properties):
+    #uma notificação agrupada traz os ids de todos os lances da janela
+    rastro = rastreamento.extrair(properties)
+    if rastro is None:
+        return
+    instante = time.time()
+    for trace_id in properties.headers.get('trace_ids') or [rastro[0]]:
+        logger.log_rastro(trace_id, 'cliente.notificado', instante)
+
+def callback_notificacao(ch, method, properties, body):
+    global gui
+
+    #identifica o leilão e o evento pela routing key "<id_leilao>.<evento>"
+    routing_key = method.routing_key
+    id_leilao, evento = routing_key.rsplit('.', 1)
+    notificacoes_recebidas.rotulos(evento).inc()
+    atraso = metricas.atraso(properties)
+    if atraso is not None:
+        atraso_notificacoes.observar(atraso)
+    if rastreamento.ATIVO:
+        registrar_rastros(properties)
+    data = decodificar(('lance_validado', 'lote_lances') if evento == 'lance' else ('fim', 'fim_vencedores'),
+                       properties, body)
+    
+    #verifica se a mensagem é um lance
+    if evento == 'lance':
+        #uma notificação agrupada traz todos os lances da janela; a simples, só o último
+        for lance in data.get('lances') or [data]:
+            emissor_lances.atualizar_cotacao(id_leilao, lance.get('valor_do_lance'))
+            logger.log_lance_recebido(id_leilao, lance.get('id_usuario'), lance.get('valor_do_lance'))
             
             # Notificar GUI se estiver disponível
             if gui:
-                gui.lance_recebido(id_leilao, data.get('id_usuario'), data.get('valor_do_lance'))
+                gui.lance_recebido(id_leilao, lance.get('id_usuario'), lance.get('valor_do_lance'))
+    
+    #verifica se a mensagem é um fim de leilão
+    if evento == 'fim':
+        vencedor = data.get('id_vencedor')
+        valor_final = data.get('valor_negociado')
+        logger.log_leilao_finalizado(id_leilao, vencedor, str(valor_final))
+
+        #em leilões de várias unidades cada vencedor paga o próprio lance
+        vencedores = data.get('vencedores') or [{'id_usuario': vencedor, 'valor_do_lance': valor_final}]
+        lances_vencedores = {lance['id_usuario']: lance['valor_do_lance'] for lance in vencedores}
+        venceu = CLIENTE_ID in lances_vencedores
+        if venceu:
+            valor_final = lances_vencedores[CLIENTE_ID]
+            logger.log_cliente_acao("VITÓRIA", f"Venceu leilão {id_leilao} com R$ {valor_final}")
         
-        #verifica se a mensagem é um fim de leilão
-        if routing_key.endswith('.fim'):
-            vencedor = data.get('id_vencedor')
-            valor_final = data.get('valor_negociado')
-            logger.log_leilao_finalizado(id_leilao, vencedor, str(valor_final))
-            
-            if vencedor == CLIENTE_ID:
-                logger.log_cliente_acao("VITÓRIA", f"Venceu leilão {id_leilao} com R$ {valor_final}")
-            
-            # Notificar GUI sobre fim do leilão
-            if gui:
-                if data.get('id_vencedor') == CLIENTE_ID:
-                    gui.log_message(f"🏆 PARABÉNS! Você venceu o leilão {id_leilao} com R$ {data.get('valor_negociado'):.2f}!")
-                else:
-                    gui.log_message(f"🏁 Leilão {id_leilao} finalizado. Vencedor: {data.get('id_vencedor')} - R$ {data.get('valor_negociado'):.2f}")
+        # Notificar GUI sobre fim do leilão
+        if gui:
+            if venceu:
+                gui.log_message(f"🏆 PARABÉNS! Você venceu o leilão {id_leilao} com R$ {valor_final:.2f}!")
+            elif len(lances_vencedores) > 1:
+                gui.log_message(f"🏁 Leilão {id_leilao} finalizado com {len(lances_vencedores)} vencedores. "
+                                f"Maior lance: {data.get('id_vencedor')} - R$ {data.get('valor_negociado'):.2f}")
+            else:
+                gui.log_message(f"🏁 Leilão {id_leilao} finalizado. Vencedor: {data.get('id_vencedor')} - R$ {data.get('valor_negociado'):.2f}")
+
+        #leilão encerrado: não há mais eventos para receber
+        emissor_lances.esquecer(id_leilao)
+        parar_de_escutar(id_leilao)
+
+#consome os eventos de todos os leilões na mesma conexão do cliente
+canal.consumir(fila_notificacoes, callback_notificacao)
+
+#modo conflacionado: o cliente só precisa do lance mais recente de cada leilão. Os lances
+#vão para uma fila por leilão que guarda apenas a última mensagem (x-max-length=1 com
+#drop-head) e são consumidos um a um (prefetch 1), então um cliente lento não acumula
+#lances antigos nem no broker nem na memória. O .fim continua na fila de notificações.
+CONFLACAO = os.environ.get('LEILAO_CONFLACAO', '0') == '1'
+if CONFLACAO:
+    channel_conflacao = connection.channel()
+    channel_conflacao.basic_qos(prefetch_count=1)
+filas_conflacao = {}
+
+def callback_lance_conflacionado(ch, method, properties, body):
+    try:
+        callback_notificacao(ch, method, properties, body)
+    finally:
+        ch.basic_ack(delivery_tag=method.delivery_tag)
 
-    #função para escutar as mensagens de um leilão de interesse do cliente
-    def thread_listener():
+def escutar_leilao(id_leilao):
+    #associa a fila do cliente à exchange com as routing keys do leilão
+    def vincular():
         try:
-            #cria uma conexão com o broker
-            conn_local = pika.BlockingConnection(
-                pika.ConnectionParameters('localhost')
-            )
-            ch_local = conn_local.channel()
-
-            #cria uma fila temporária
-            result = ch_local.queue_declare(queue='', exclusive=True)
-            qname = result.method.queue
-            
-            #associa a fila à exchange com as routing keys do leilão
-            ch_local.queue_bind(exchange='leilao', queue=qname, routing_key=f"{id_leilao}.lance")
-            ch_local.queue_bind(exchange='leilao', queue=qname, routing_key=f"{id_leilao}.fim")
-            
-            #inicia a consumação de mensagens
-            ch_local.basic_consume(queue=qname, on_message_callback=callback_notificacao, auto_ack=True)
+            if CONFLACAO:
+                result = channel_conflacao.queue_declare(queue='', exclusive=True, auto_delete=True, arguments={
+                    'x-max-length': 1,
+                    'x-overflow': 'drop-head'
+                })
+                fila_lances = result.method.queue
+                channel_conflacao.queue_bind(exchange='leilao', queue=fila_lances, routing_key=f"{id_leilao}.lance")
+                filas_conflacao[id_leilao] = channel_conflacao.basic_consume(
+                    queue=fila_lances, on_message_callback=callback_lance_conflacionado)
+            else:
+                channel.queue_bind(exchange='leilao', queue=fila_notificacoes, routing_key=f"{id_leilao}.lance")
+            channel.queue_bind(exchange='leilao', queue=fila_notificacoes, routing_key=f"{id_leilao}.fim")
             logger.log_cliente_acao("ESCUTANDO_LEILAO", f"Monitorando eventos do leilão {id_leilao}")
-            
-            ch_local.start_consuming()
         except Exception as e:
             logger.error(f"Erro ao escutar leilão {id_leilao}: {e}")
 
-    #inicia a thread para escutar as mensagens
-    t = threading.Thread(target=thread_listener, daemon=True)
-    t.start()
+    #o canal pertence à thread do RabbitMQ, então o bind é executado nela
+    connection.add_callback_threadsafe(vincular)
+
+def parar_de_escutar(id_leilao):
+    #remove as routing keys do leilão da fila do cliente (executado na thread do RabbitMQ)
+    try:
+        consumer_tag = filas_conflacao.pop(id_leilao, None)
+        if consumer_tag is not None:
+            #a fila do leilão é auto_delete: o broker a apaga ao cancelar o consumo
+            channel_conflacao.basic_cancel(consumer_tag)
+        elif not CONFLACAO:
+            channel.queue_unbind(exchange='leilao', queue=fila_notificacoes, routing_key=f"{id_leilao}.lance")
+        channel.queue_unbind(exchange='leilao', queue=fila_notificacoes, routing_key=f"{id_leilao}.fim")
+    except Exception as e:
+        logger.error(f"Erro ao deixar de escutar leilão {id_leilao}: {e}")
 
 #*****************************************************************************#
 
 def iniciar_gui():
     """Inicia a interface gráfica"""
     global gui
-    gui = ClienteGUI(CLIENTE_ID, dar_lance, leiloes_conhecidos, leiloes_interessados)
+    gui = ClienteGUI(CLIENTE_ID, dar_lance, leiloes_conhecidos, leiloes_interessados, conflacao=CONFLACAO,
+                     max_linhas_log=int(os.environ.get('LEILAO_LOG_LINHAS', '1000')),
+                     historico_log=os.environ.get('LEILAO_LOG_HISTORICO'))
     gui.run()
 
 ###########################################################################
@@ -0,0 +1,66 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shards import fila_do_leilao
+from protocolo import ModeloLance
+import metricas
+import rastreamento
+
+
+class EmissorLances:
+    """Envia os lances de um usuário com a assinatura e os campos fixos pré-serializados
+
+    Para cada leilão, a fila do shard e o modelo do lance (ModeloLance) são montados no
+    primeiro lance; os seguintes só codificam o valor. Também mantém a cotação numérica
+    de cada leilão, atualizada pelas notificações, para recusar localmente lances que
+    não superam a cotação atual sem depender dos textos exibidos na interface.
+
+    `publicador` precisa de declarar_fila(fila) e publicar(exchange, routing_key, body,
+    properties), como o PublicadorConfirmado. Com o rastreamento ativo, cada lance recebe
+    um id de rastreamento e o envio é registrado em `logger`.
+    """
+
+    def __init__(self, id_usuario, assinatura, publicador, formato=None, logger=None):
+        self.id_usuario = id_usuario
+        self.assinatura = assinatura
+        self.publicador = publicador
+        self.formato = formato
+        self.logger = logger
+        self.cotacoes = {}
+        self._modelos = {}  # id_leilao -> (fila, ModeloLance)
+
+    def atualizar_cotacao(self, id_leilao, valor):
+        """Registra um lance validado (ou o valor mínimo) do leilão; mantém o maior valor"""
+        if valor > self.cotacoes.get(id_leilao, 0.0):
+            self.cotacoes[id_leilao] = valor
+
+    def cotacao(self, id_leilao):
+        """Cotação atual do leilão, ou None se ainda não for conhecida"""
+        return self.cotacoes.get(id_leilao)
+
+    def enviar(self, id_leilao, valor):
+        """Publica o lance na fila lance_realizado do shard dono do leilão
+
+        Retorna o id de rastreamento do lance, ou None com o rastreamento desligado.
+        """
+        modelo = self._modelos.get(id_leilao)
+        if modelo is None:
+            fila = fila_do_leilao('lance_realizado', id_leilao)
+            self.publicador.declarar_fila(fila)
+            modelo = self._modelos[id_leilao] = (
+                fila, ModeloLance(id_leilao, self.id_usuario, self.assinatura, self.formato))
+        fila, modelo = modelo
+        properties = metricas.carimbar(modelo.properties)
+        trace_id = None
+        if rastreamento.ATIVO:
+            trace_id = rastreamento.novo_id()
+            properties = rastreamento.propagar(properties, (trace_id, {}), 'cliente')
+            if self.logger is not None:
+                self.logger.log_rastro(trace_id, 'cliente.envio', properties.headers['saltos']['cliente'])
+        self.publicador.publicar('', fila, modelo.montar(valor), properties)
+        return trace_id
+
+    def esquecer(self, id_leilao):
+        """Descarta o modelo de um leilão encerrado (a cotação final continua disponível)"""
+        self._modelos.pop(id_leilao, None)
@@ -1,14 +1,97 @@
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import json
+import queue
+import atexit
+from arquivos_log import ArquivoRotativo
+
+# Com LEILAO_LOG_ASSINCRONO=1 os registros são gravados por uma thread em segundo plano,
+# e quem registra apenas enfileira o registro (sem formatar nem escrever em disco)
+LOG_ASSINCRONO = os.environ.get('LEILAO_LOG_ASSINCRONO', '0') == '1'
+
+# Formato das linhas: 'texto' (padrão) ou 'json' (um objeto JSON compacto por linha)
+LOG_FORMATO = os.environ.get('LEILAO_LOG_FORMATO', 'texto')
+if LOG_FORMATO not in ('texto', 'json'):
+    raise ValueError(f"LEILAO_LOG_FORMATO deve ser 'texto' ou 'json', não {LOG_FORMATO!r}")
+
+# Diretório dos arquivos de log (padrão: logs/ na raiz do projeto)
+LOG_DIR = os.environ.get('LEILAO_LOG_DIR') or os.path.join(os.path.dirname(__file__), '..', 'logs')
+
+# Rotação dos arquivos de log: tamanho máximo do arquivo atual e retenção dos comprimidos
+LOG_MAX_BYTES = int(float(os.environ.get('LEILAO_LOG_MAX_MB', '100')) * 1024 * 1024)
+LOG_RETENCAO_DIAS = float(os.environ.get('LEILAO_LOG_RETENCAO_DIAS', '30'))
+LOG_RETENCAO_BYTES = int(float(os.environ.get('LEILAO_LOG_RETENCAO_MB', '0')) * 1024 * 1024)
+
+
+class FormatadorJson(logging.Formatter):
+    """Formata cada registro como uma linha JSON compacta
+
+    Além de ts (timestamp em segundos), servico, nivel e msg, os registros dos métodos
+    log_* trazem o nome do evento e os seus campos (id_leilao, id_usuario, valor...).
+    """
+
+    def format(self, record):
+        linha = {
+            'ts': round(record.created, 6),
+            'servico': record.name,
+            'nivel': record.levelname,
+            'msg': record.getMessage(),
+        }
+        evento = getattr(record, 'evento', None)
+        if evento is not None:
+            linha['evento'] = evento
+            linha.update(record.campos)
+        if record.exc_info:
+            linha['exc'] = self.formatException(record.exc_info)
+        return json.dumps(linha, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class _HandlerFila(logging.handlers.QueueHandler):
+    # O QueueHandler padrão formata a mensagem antes de enfileirar; aqui o registro vai
+    # intacto e a formatação fica para a thread de escrita
+    def prepare(self, record):
+        return record
+
+
+class _SemFlush:
+    # No modo assíncrono o flush por registro é adiado: o listener descarrega os
+    # buffers de uma vez quando a fila esvazia
+    def flush(self):
+        pass
+
+    def descarregar(self):
+        super().flush()
+
+
+class _ArquivoLote(_SemFlush, ArquivoRotativo):
+    pass
+
+
+class _ConsoleLote(_SemFlush, logging.StreamHandler):
+    pass
+
+
+class _ListenerLote(logging.handlers.QueueListener):
+    def dequeue(self, block):
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.descarregar()
+            return self.queue.get(block)
+
 
 class SystemLogger:
-    def __init__(self, service_name, log_level=logging.INFO):
+    def __init__(self, service_name, log_level=logging.INFO, assincrono=None, formato=None):
         self.service_name = service_name
         self.log_level = log_level
+        self.assincrono = LOG_ASSINCRONO if assincrono is None else assincrono
+        self.formato = formato or LOG_FORMATO
+        self.listener = None
         
         # Criar diretório de logs se não existir
-        self.log_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs'))
+        self.log_dir = os.path.abspath(LOG_DIR)
         os.makedirs(self.log_dir, exist_ok=True)
         
         # Configurar logger
@@ -20,15 +103,14 @@ class SystemLogger:
             self._setup_handlers()
     
     def _setup_handlers(self):
-        # Handler para arquivo
-        log_filename = f"{self.service_name}_{datetime.now().strftime('%Y%m%d')}.log"
-        log_filepath = os.path.join(self.log_dir, log_filename)
-        
-        file_handler = logging.FileHandler(log_filepath, encoding='utf-8')
+        # Handler para arquivo (<servico>_<AAAAMMDD>.log, rotacionado por tamanho e por dia)
+        file_handler = (_ArquivoLote if self.assincrono else ArquivoRotativo)(
+            self.log_dir, self.service_name, max_bytes=LOG_MAX_BYTES,
+            retencao_dias=LOG_RETENCAO_DIAS, retencao_bytes=LOG_RETENCAO_BYTES)
         file_handler.setLevel(self.log_level)
         
         # Handler para console
-        console_handler = logging.StreamHandler()
+        console_handler = (_ConsoleLote if self.assincrono else logging.StreamHandler)()
         console_handler.setLevel(self.log_level)
         
         # Formato das mensagens
@@ -37,51 +119,98 @@ class SystemLogger:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
-        file_handler.setFormatter(formatter)
+        file_handler.setFormatter(FormatadorJson() if self.formato == 'json' else formatter)
         console_handler.setFormatter(formatter)
         
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
-    
-    def info(self, message):
+        if not self.assincrono:
+            self.logger.addHandler(file_handler)
+            self.logger.addHandler(console_handler)
+            return
+
+        # Modo assíncrono: o logger só enfileira; a thread do listener formata e grava
+        fila = queue.SimpleQueue()
+        self.logger.addHandler(_HandlerFila(fila))
+        self.listener = _ListenerLote(fila, file_handler, console_handler, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.fechar)
+
+    def fechar(self):
+        """Grava os registros ainda na fila e para a thread de escrita (modo assíncrono)"""
+        if self.listener is not None:
+            listener, self.listener = self.listener, None
+            listener.stop()
+            for handler in listener.handlers:
+                handler.descarregar()
+
+    # Os argumentos só são formatados na mensagem se o nível estiver habilitado (e, no
+    # modo assíncrono, pela thread de escrita): prefira logger.info("... %s", valor) a
+    # f-strings nos caminhos quentes. No modo assíncrono os argumentos devem ser imutáveis.
+
+    def _registrar(self, nivel, message, args, extra=None):
+        # O registro é montado sem logger.findCaller: os formatos não usam o arquivo/linha
+        # de origem (que seria sempre este módulo) e percorrer a pilha era a maior parte do
+        # custo de um registro. Só os registros do SystemLogger mudam, não os de outras
+        # bibliotecas do processo.
+        if self.logger.isEnabledFor(nivel):
+            self.logger.handle(self.logger.makeRecord(
+                self.logger.name, nivel, '(unknown file)', 0, message, args, None, extra=extra))
+
+    def info(self, message, *args):
         """Log de informação"""
-        self.logger.info(message)
+        self._registrar(logging.INFO, message, args)
     
-    def warning(self, message):
+    def warning(self, message, *args):
         """Log de aviso"""
-        self.logger.warning(message)
+        self._registrar(logging.WARNING, message, args)
     
-    def error(self, message):
+    def error(self, message, *args):
         """Log de erro"""
-        self.logger.error(message)
+        self._registrar(logging.ERROR, message, args)
     
-    def debug(self, message):
+    def debug(self, message, *args):
         """Log de debug"""
-        self.logger.debug(message)
+        self._registrar(logging.DEBUG, message, args)
     
-    def critical(self, message):
+    def critical(self, message, *args):
         """Log crítico"""
-        self.logger.critical(message)
+        self._registrar(logging.CRITICAL, message, args)
+
+    def _evento(self, nivel, evento, message, **campos):
+        # Mensagem formatada sob demanda; os campos também vão para as linhas JSON
+        self._registrar(nivel, message, tuple(campos.values()),
+                        extra={'evento': evento, 'campos': campos})
     
     def log_leilao_iniciado(self, leilao_id, descricao, data_inicio, data_fim):
         """Log específico para início de leilão"""
-        self.info(f"LEILÃO INICIADO - ID: {leilao_id}, Descrição: {descricao}, Início: {data_inicio}, Fim: {data_fim}")
+        self._evento(logging.INFO, 'leilao_iniciado',
+                     "LEILÃO INICIADO - ID: %s, Descrição: %s, Início: %s, Fim: %s",
+                     id_leilao=leilao_id, descricao=descricao, data_inicio=data_inicio, data_fim=data_fim)
     
     def log_lance_recebido(self, leilao_id, usuario, valor):
         """Log específico para lance recebido"""
-        self.info(f"LANCE RECEBIDO - Leilão: {leilao_id}, Usuário: {usuario}, Valor: R${valor}")
+        self._evento(logging.INFO, 'lance_recebido', "LANCE RECEBIDO - Leilão: %s, Usuário: %s, Valor: R$%s",
+                     id_leilao=leilao_id, id_usuario=usuario, valor=valor)
     
     def log_lance_validado(self, leilao_id, usuario, valor):
         """Log específico para lance validado"""
-        self.info(f"LANCE VALIDADO - Leilão: {leilao_id}, Usuário: {usuario}, Valor: R${valor}")
+        self._evento(logging.INFO, 'lance_validado', "LANCE VALIDADO - Leilão: %s, Usuário: %s, Valor: R$%s",
+                     id_leilao=leilao_id, id_usuario=usuario, valor=valor)
     
     def log_lance_rejeitado(self, leilao_id, usuario, valor, motivo):
         """Log específico para lance rejeitado"""
-        self.warning(f"LANCE REJEITADO - Leilão: {leilao_id}, Usuário: {usuario}, Valor: R${valor}, Motivo: {motivo}")
+        self._evento(logging.WARNING, 'lance_rejeitado',
+                     "LANCE REJEITADO - Leilão: %s, Usuário: %s, Valor: R$%s, Motivo: %s",
+                     id_leilao=leilao_id, id_usuario=usuario, valor=valor, motivo=motivo)
     
     def log_leilao_finalizado(self, leilao_id, vencedor, valor_final):
         """Log específico para finalização de leilão"""
-        self.info(f"LEILÃO FINALIZADO - ID: {leilao_id}, Vencedor: {vencedor}, Valor Final: R${valor_final}")
+        self._evento(logging.INFO, 'leilao_finalizado', "LEILÃO FINALIZADO - ID: %s, Vencedor: %s, Valor Final: R$%s",
+                     id_leilao=leilao_id, vencedor=vencedor, valor_final=valor_final)
+    
+    def log_rastro(self, trace_id, etapa, instante):
+        """Log da passagem de um lance rastreado por uma etapa (lido por rastreamento.py)"""
+        self._evento(logging.INFO, 'rastro', "RASTRO - Id: %s, Etapa: %s, Instante: %.6f",
+                     trace_id=trace_id, etapa=etapa, instante=instante)
     
     def log_conexao_rabbitmq(self, status):
         """Log específico para conexão RabbitMQ"""
@@ -94,13 +223,14 @@ class SystemLogger:
     
     def log_erro_assinatura(self, usuario, motivo):
         """Log específico para erros de assinatura"""
-        self.error(f"ERRO ASSINATURA - Usuário: {usuario}, Motivo: {motivo}")
+        self._evento(logging.ERROR, 'erro_assinatura', "ERRO ASSINATURA - Usuário: %s, Motivo: %s",
+                     id_usuario=usuario, motivo=motivo)
     
     def log_cliente_acao(self, acao, detalhes=""):
         """Log específico para ações do cliente"""
-        self.info(f"AÇÃO CLIENTE - {acao} {detalhes}")
+        self._evento(logging.INFO, 'acao_cliente', "AÇÃO CLIENTE - %s %s", acao=acao, detalhes=detalhes)
 
 # Função de conveniência para criar loggers
-def create_logger(service_name, log_level=logging.INFO):
+def create_logger(service_name, log_level=logging.INFO, assincrono=None, formato=None):
     """Cria um logger para um serviço específico"""
-    return SystemLogger(service_name, log_level)
\ No newline at end of file
+    return SystemLogger(service_name, log_level, assincrono, formato)
\ No newline at end of file
@@ -0,0 +1,204 @@
+import os
+import threading
+import collections
+import pika
+from pika.adapters.select_connection import IOLoop
+
+# Modo confiável: publicação com confirmação do broker e ack só depois dela. Os serviços
+# (runtime.RuntimeServicos) sempre fazem ack manual com prefetch; o modo só acrescenta as
+# confirmações. No cliente, desligado, o CanalServico consome com auto_ack.
+MODO_CONFIAVEL = os.environ.get('LEILAO_CONFIAVEL', '0') == '1'
+PREFETCH = int(os.environ.get('LEILAO_PREFETCH', '100'))
+
+# Tentativas de republicação de uma mensagem recusada (nack) pelo broker
+TENTATIVAS_PUBLICACAO = 3
+
+
+class BufferCheio(Exception):
+    """O publicador já tem o máximo de mensagens aguardando envio ou confirmação"""
+
+
+#*****************************************************************************#
+
+class PublicadorConfirmado:
+    """Publicador com conexão própria e confirmações assíncronas do broker
+
+    Um SelectConnection roda numa thread de fundo com o canal em modo confirm.
+    publicar() pode ser chamado de qualquer thread: a mensagem entra num buffer e
+    é enviada pela thread do publicador, sem esperar a confirmação. O broker
+    confirma em lote (ack com multiple) e o callback de cada mensagem é chamado
+    quando a confirmação chega.
+
+    Se a conexão cair, o publicador reconecta e reenvia as mensagens ainda sem
+    confirmação. No máximo `capacidade` mensagens ficam em memória; acima disso
+    publicar() levanta BufferCheio.
+    """
+
+    def __init__(self, host='localhost', logger=None, capacidade=1000, intervalo_reconexao=2.0):
+        self.host = host
+        self.logger = logger
+        self.capacidade = capacidade
+        self.intervalo_reconexao = intervalo_reconexao
+        self._ioloop = IOLoop()
+        self._conexao = None
+        self._canal = None
+        self._buffer = collections.deque()              # aguardando envio
+        self._pendentes = collections.OrderedDict()     # delivery_tag -> mensagem sem confirmação
+        self._proxima_tag = 1
+        self._filas = set()                             # filas declaradas a cada (re)conexão
+        self._em_memoria = 0
+        self._lock = threading.Lock()
+        self._encerrando = False
+
+        self._thread = threading.Thread(target=self._executar, daemon=True, name='publicador')
+        self._thread.start()
+
+    def publicar(self, exchange, routing_key, body, properties=None, ao_confirmar=None):
+        """Publica sem bloquear; ao_confirmar(sucesso) é chamado na thread do publicador"""
+        with self._lock:
+            if self._em_memoria >= self.capacidade:
+                raise BufferCheio(f"{self._em_memoria} mensagens aguardando o broker")
+            self._em_memoria += 1
+        mensagem = [exchange, routing_key, body, properties, ao_confirmar, 0]
+        self._ioloop.add_callback_threadsafe(lambda: self._enfileirar(mensagem))
+
+    def declarar_fila(self, fila):
+        """Declara a fila agora e novamente a cada reconexão"""
+        if fila in self._filas:
+            return
+        self._filas.add(fila)
+        self._ioloop.add_callback_threadsafe(lambda: self._declarar(fila))
+
+    def fechar(self, timeout=5):
+        self._ioloop.add_callback_threadsafe(self._fechar)
+        self._thread.join(timeout)
+
+    def _executar(self):
+        self._conectar()
+        self._ioloop.start()
+
+    def _conectar(self):
+        self._conexao = pika.SelectConnection(
+            pika.ConnectionParameters(host=self.host),
+            on_open_callback=self._ao_abrir_conexao,
+            on_open_error_callback=self._ao_falhar_conexao,
+            on_close_callback=self._ao_fechar_conexao,
+            custom_ioloop=self._ioloop)
+
+    def _ao_abrir_conexao(self, conexao):
+        conexao.channel(on_open_callback=self._ao_abrir_canal)
+
+    def _ao_abrir_canal(self, canal):
+        self._canal = canal
+        self._proxima_tag = 1
+        canal.confirm_delivery(self._ao_confirmar)
+        for fila in list(self._filas):
+            canal.queue_declare(queue=fila)
+        self._enviar_buffer()
+
+    def _ao_falhar_conexao(self, conexao, erro):
+        if self.logger:
+            self.logger.error(f"Publicador não conseguiu conectar ao RabbitMQ: {erro}")
+        self._reconectar()
+
+    def _ao_fechar_conexao(self, conexao, motivo):
+        self._canal = None
+        if not self._encerrando and self.logger:
+            self.logger.log_conexao_rabbitmq('perdida')
+        self._reconectar()
+
+    def _reconectar(self):
+        if self._encerrando:
+            self._ioloop.stop()
+            return
+        # Mensagens sem confirmação voltam para o início do buffer, na ordem original
+        self._buffer.extendleft(reversed(list(self._pendentes.values())))
+        self._pendentes.clear()
+        if self.logger:
+            self.logger.log_conexao_rabbitmq('reconectando')
+        self._ioloop.call_later(self.intervalo_reconexao, self._conectar)
+
+    def _declarar(self, fila):
+        if self._canal is not None and self._canal.is_open:
+            self._canal.queue_declare(queue=fila)
+
+    def _enfileirar(self, mensagem):
+        self._buffer.append(mensagem)
+        if self._canal is not None:
+            self._enviar_buffer()
+
+    def _enviar_buffer(self):
+        while self._buffer and self._canal is not None and self._canal.is_open:
+            mensagem = self._buffer.popleft()
+            exchange, routing_key, body, properties = mensagem[:4]
+            self._canal.basic_publish(exchange=exchange, routing_key=routing_key,
+                                      body=body, properties=properties)
+            self._pendentes[self._proxima_tag] = mensagem
+            self._proxima_tag += 1
+
+    def _ao_confirmar(self, frame):
+        metodo = frame.method
+        sucesso = isinstance(metodo, pika.spec.Basic.Ack)
+
+        if metodo.multiple:
+            confirmadas = []
+            while self._pendentes and next(iter(self._pendentes)) <= metodo.delivery_tag:
+                confirmadas.append(self._pendentes.popitem(last=False)[1])
+        else:
+            mensagem = self._pendentes.pop(metodo.delivery_tag, None)
+            confirmadas = [mensagem] if mensagem else []
+
+        for mensagem in confirmadas:
+            if not sucesso and mensagem[5] < TENTATIVAS_PUBLICACAO:
+                # Broker recusou a mensagem: tenta publicar novamente
+                mensagem[5] += 1
+                self._buffer.append(mensagem)
+                continue
+            if not sucesso and self.logger:
+                self.logger.error(f"Mensagem para '{mensagem[1]}' recusada pelo broker")
+            with self._lock:
+                self._em_memoria -= 1
+            if mensagem[4]:
+                mensagem[4](sucesso)
+
+        if not sucesso:
+            self._enviar_buffer()
+
+    def _fechar(self):
+        self._encerrando = True
+        if self._conexao is not None and self._conexao.is_open:
+            self._conexao.close()
+        else:
+            self._ioloop.stop()
+
+#*****************************************************************************#
+
+class CanalServico:
+    """Canal de consumo do cliente de acordo com o modo de entrega
+
+    No modo padrão, consome com auto_ack. No modo confiável (LEILAO_CONFIAVEL=1), aplica
+    o prefetch e faz ack manual depois do processamento; uma mensagem cujo callback
+    falha é descartada (nack sem reenfileirar). Os lances são publicados pelo
+    PublicadorConfirmado do cliente, não por este canal.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+
+        if MODO_CONFIAVEL:
+            channel.basic_qos(prefetch_count=PREFETCH)
+
+    def consumir(self, fila, callback):
+        if not MODO_CONFIAVEL:
+            self.channel.basic_consume(queue=fila, on_message_callback=callback, auto_ack=True)
+            return
+
+        def callback_confiavel(ch, method, properties, body):
+            try:
+                callback(ch, method, properties, body)
+            except Exception:
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                raise
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+
+        self.channel.basic_consume(queue=fila, on_message_callback=callback_confiavel, auto_ack=False)
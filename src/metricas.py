@@ -0,0 +1,256 @@
+import os
+import sys
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from protocolo import com_headers
+
+# Exportação das métricas: porta HTTP do endpoint /metrics (formato texto do Prometheus)
+# e/ou arquivo reescrito periodicamente com o mesmo texto ({servico} vira o nome do serviço)
+PORTA = int(os.environ.get('LEILAO_METRICAS_PORTA', '0'))
+ARQUIVO = os.environ.get('LEILAO_METRICAS_ARQUIVO')
+INTERVALO = float(os.environ.get('LEILAO_METRICAS_INTERVALO', '10'))
+
+# Com a exportação ativa, as mensagens publicadas levam o instante do envio no header
+# ts_envio, de onde os consumidores medem o atraso entre a publicação e o tratamento
+CARIMBO = bool(PORTA or ARQUIVO)
+
+# Limites (segundos) padrão dos histogramas de latência
+FAIXAS_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(texto, aspas=True):
+    # Formato texto do Prometheus: \\, \n e (nos valores de rótulos) \"
+    texto = str(texto).replace('\\', '\\\\').replace('\n', '\\n')
+    return texto.replace('"', '\\"') if aspas else texto
+
+
+def _rotulos(nomes, valores):
+    if not nomes:
+        return ''
+    pares = ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores))
+    return '{' + pares + '}'
+
+
+class Contador:
+    """Contador crescente, opcionalmente dividido por rótulos (ex.: motivo)
+
+    Sem rótulos, inc() soma no próprio contador; com rótulos, rotulos(...) devolve o
+    contador de cada combinação de valores (guarde-o para não buscá-lo a cada amostra).
+    """
+
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.nomes_rotulos = tuple(rotulos)
+        self.valor = 0
+        self._filhos = {}
+
+    def inc(self, quantidade=1):
+        self.valor += quantidade
+
+    def rotulos(self, *valores):
+        filho = self._filhos.get(valores)
+        if filho is None:
+            filho = self._filhos[valores] = type(self).__new__(type(self))
+            filho._copiar(self)
+        return filho
+
+    def _copiar(self, pai):
+        self.nome = pai.nome
+        self.valor = 0
+
+    def _linhas(self):
+        if not self.nomes_rotulos:
+            yield f'{self.nome} {self.valor}'
+        for valores, filho in list(self._filhos.items()):
+            yield f'{self.nome}{_rotulos(self.nomes_rotulos, valores)} {filho.valor}'
+
+
+class Medidor(Contador):
+    """Valor instantâneo: definido com definir() ou lido de `funcao` na exportação
+
+    `funcao` pode devolver um número ou, com rótulos, um dict {valores: número}; assim o
+    caminho quente não paga nada (ex.: Medidor(..., funcao=lambda: len(ultimos_lances))).
+    """
+
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, rotulos=(), funcao=None):
+        super().__init__(nome, ajuda, rotulos)
+        self.funcao = funcao
+
+    def definir(self, valor):
+        self.valor = valor
+
+    def _linhas(self):
+        if self.funcao is None:
+            yield from super()._linhas()
+            return
+        try:
+            valor = self.funcao()
+        except Exception:
+            return
+        if not self.nomes_rotulos:
+            yield f'{self.nome} {valor}'
+            return
+        for valores, numero in list(valor.items()):
+            valores = valores if isinstance(valores, tuple) else (valores,)
+            yield f'{self.nome}{_rotulos(self.nomes_rotulos, valores)} {numero}'
+
+
+class Histograma(Contador):
+    """Distribuição de valores (ex.: latências em segundos) em faixas fixas
+
+    observar() custa uma busca binária nas faixas e três somas, sem alocar memória.
+    """
+
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), faixas=FAIXAS_LATENCIA):
+        super().__init__(nome, ajuda, rotulos)
+        self.faixas = tuple(faixas)
+        self.contagens = [0] * (len(self.faixas) + 1)
+        self.soma = 0.0
+
+    def _copiar(self, pai):
+        super()._copiar(pai)
+        self.faixas = pai.faixas
+        self.contagens = [0] * (len(self.faixas) + 1)
+        self.soma = 0.0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.faixas, valor)] += 1
+        self.soma += valor
+        self.valor += 1
+
+    def _linhas(self):
+        filhos = [((), self)] if not self.nomes_rotulos else list(self._filhos.items())
+        for valores, filho in filhos:
+            rotulos = list(zip(self.nomes_rotulos, valores))
+            acumulado = 0
+            for limite, contagem in zip(self.faixas + ('+Inf',), list(filho.contagens)):
+                acumulado += contagem
+                faixa = _rotulos([n for n, _ in rotulos] + ['le'], [v for _, v in rotulos] + [limite])
+                yield f'{self.nome}_bucket{faixa} {acumulado}'
+            yield f'{self.nome}_sum{_rotulos(self.nomes_rotulos, valores)} {filho.soma}'
+            yield f'{self.nome}_count{_rotulos(self.nomes_rotulos, valores)} {filho.valor}'
+
+
+class Registro:
+    """Conjunto de métricas de um processo; os serviços no mesmo processo compartilham um"""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+
+    def _obter(self, classe, nome, *args, **kwargs):
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(nome, *args, **kwargs)
+            return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._obter(Contador, nome, ajuda, rotulos)
+
+    def medidor(self, nome, ajuda, rotulos=(), funcao=None):
+        return self._obter(Medidor, nome, ajuda, rotulos, funcao)
+
+    def histograma(self, nome, ajuda, rotulos=(), faixas=FAIXAS_LATENCIA):
+        return self._obter(Histograma, nome, ajuda, rotulos, faixas)
+
+    def texto(self):
+        """Todas as métricas no formato texto do Prometheus"""
+        linhas = []
+        for metrica in list(self._metricas.values()):
+            linhas.append(f'# HELP {metrica.nome} {_escapar(metrica.ajuda, aspas=False)}')
+            linhas.append(f'# TYPE {metrica.nome} {metrica.tipo}')
+            linhas.extend(metrica._linhas())
+        return '\n'.join(linhas) + '\n'
+
+
+registro = Registro()
+contador = registro.contador
+medidor = registro.medidor
+histograma = registro.histograma
+
+#*****************************************************************************#
+# Atraso entre a publicação e o tratamento
+
+def carimbar(properties):
+    """Cópia das propriedades com o instante atual no header ts_envio (se CARIMBO)"""
+    if not CARIMBO:
+        return properties
+    return com_headers(properties, ts_envio=time.time())
+
+
+def atraso(properties):
+    """Segundos desde a publicação da mensagem (header ts_envio), ou None se não houver"""
+    headers = properties.headers if properties is not None else None
+    if not headers or 'ts_envio' not in headers:
+        return None
+    return max(0.0, time.time() - float(headers['ts_envio']))
+
+#*****************************************************************************#
+# Exportação
+
+def gravar_snapshot(caminho):
+    """Grava o texto das métricas em `caminho` (substituído atomicamente)"""
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(registro.texto())
+    os.replace(temporario, caminho)
+
+
+class _HandlerMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        corpo = registro.texto().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+_exportando = set()
+
+def iniciar_exportacao(servico, porta=None, arquivo=None, intervalo=None):
+    """Inicia o endpoint HTTP e/ou o snapshot periódico configurados (uma vez por processo)"""
+    porta = PORTA if porta is None else porta
+    arquivo = ARQUIVO if arquivo is None else arquivo
+    intervalo = intervalo or INTERVALO
+
+    if porta and 'http' not in _exportando:
+        _exportando.add('http')
+        try:
+            servidor = ThreadingHTTPServer(('', porta), _HandlerMetricas)
+        except OSError as e:
+            sys.stderr.write(f"Métricas: não foi possível abrir a porta {porta}: {e}\n")
+        else:
+            servidor.daemon_threads = True
+            threading.Thread(target=servidor.serve_forever, name='metricas-http', daemon=True).start()
+
+    if arquivo and 'arquivo' not in _exportando:
+        _exportando.add('arquivo')
+        caminho = arquivo.format(servico=servico)
+
+        def gravar_periodicamente():
+            while True:
+                time.sleep(intervalo)
+                try:
+                    gravar_snapshot(caminho)
+                except OSError as e:
+                    sys.stderr.write(f"Métricas: erro ao gravar {caminho}: {e}\n")
+
+        threading.Thread(target=gravar_periodicamente, name='metricas-arquivo', daemon=True).start()
@@ -0,0 +1,234 @@
+import os
+import copy
+import json
+import math
+import base64
+import struct
+import binascii
+import pika
+
+# Formato das mensagens publicadas: 'json' (entendido por todas as versões) ou 'binario'.
+# Os consumidores aceitam os dois formatos, identificados pelo content_type da mensagem.
+FORMATO = os.environ.get('LEILAO_FORMATO', 'json')
+
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_BINARIO = 'application/x-leilao'
+
+# Campos de cada tipo de mensagem: 's' texto, 'd' número (float64), 'b' bytes (base64 no JSON)
+# e 'L' lista de lances {id_usuario, valor_do_lance}
+ESQUEMAS = {
+    'lance': (1, (('id_leilao', 's'), ('id_usuario', 's'), ('valor_do_lance', 'd'), ('assinatura', 'b'))),
+    'lance_validado': (2, (('id_leilao', 's'), ('id_usuario', 's'), ('valor_do_lance', 'd'))),
+    'vencedor': (3, (('id_leilao', 's'), ('id_usuario', 's'), ('valor_do_lance', 'd'))),
+    'fim': (4, (('id_leilao', 's'), ('id_vencedor', 's'), ('valor_negociado', 'd'))),
+    # Último lance de uma janela do ms_notificacao com todos os lances dela, em ordem
+    'lote_lances': (5, (('id_leilao', 's'), ('id_usuario', 's'), ('valor_do_lance', 'd'), ('lances', 'L'))),
+    # Leilão de várias unidades: o maior lance e a lista de vencedores, do maior ao menor
+    'vencedores': (6, (('id_leilao', 's'), ('id_usuario', 's'), ('valor_do_lance', 'd'), ('vencedores', 'L'))),
+    'fim_vencedores': (7, (('id_leilao', 's'), ('id_vencedor', 's'), ('valor_negociado', 'd'),
+                           ('vencedores', 'L'))),
+}
+
+# Layout binário: versão e código do tipo, seguidos dos campos na ordem do esquema.
+# Textos e bytes são prefixados pelo tamanho (uint16); números são float64; listas são a
+# quantidade de itens (uint16) seguida de cada item com os campos de um lance. Uma
+# mensagem com um campo ou lista acima de TAMANHO_MAXIMO é publicada em JSON.
+VERSAO = 1
+_CABECALHO = struct.Struct('<BB')
+_TAMANHO = struct.Struct('<H')
+_NUMERO = struct.Struct('<d')
+TAMANHO_MAXIMO = 0xFFFF
+
+_TIPOS_POR_CODIGO = {codigo: tipo for tipo, (codigo, _) in ESQUEMAS.items()}
+
+_PROPRIEDADES = {
+    'json': pika.BasicProperties(content_type=CONTENT_TYPE_JSON),
+    'binario': pika.BasicProperties(content_type=CONTENT_TYPE_BINARIO),
+}
+if FORMATO not in _PROPRIEDADES:
+    raise ValueError(f"LEILAO_FORMATO deve ser 'json' ou 'binario', não {FORMATO!r}")
+
+
+class ErroFormato(ValueError):
+    """Mensagem que não pôde ser decodificada (ou codificada) no tipo esperado"""
+
+
+class _ForaDoLimite(ErroFormato):
+    # Campo ou lista que não cabe no prefixo uint16 do formato binário
+    pass
+
+
+def com_headers(properties, **headers):
+    """Cópia das propriedades (todos os campos) com `headers` mesclados aos existentes
+
+    As propriedades originais não mudam: as de codificar() são compartilhadas.
+    """
+    if properties is None:
+        return pika.BasicProperties(headers=headers)
+    copia = copy.copy(properties)
+    copia.headers = {**(properties.headers or {}), **headers}
+    return copia
+
+
+def codificar(tipo, mensagem, formato=None):
+    """Codifica a mensagem e retorna (body, properties) para publicar"""
+    formato = formato or FORMATO
+    _, campos = ESQUEMAS[tipo]
+    if formato == 'binario':
+        try:
+            return _codificar_binario(tipo, mensagem), _PROPRIEDADES['binario']
+        except _ForaDoLimite:
+            # Ex.: vencedores de um leilão com mais de 65535 unidades; o JSON não tem limite
+            pass
+
+    dados = dict(mensagem)
+    for nome, tipo_campo in campos:
+        if tipo_campo == 'b' and isinstance(dados.get(nome), (bytes, bytearray)):
+            dados[nome] = base64.b64encode(dados[nome]).decode('ascii')
+    return json.dumps(dados).encode('utf-8'), _PROPRIEDADES['json']
+
+
+def decodificar(tipo, properties, body):
+    """Decodifica uma mensagem JSON ou binária; os campos 'b' sempre voltam como bytes
+
+    `tipo` pode ser uma tupla com os tipos aceitos (ex.: lance_validado ou lote_lances).
+    """
+    tipos = tipo if isinstance(tipo, tuple) else (tipo,)
+    if properties is not None and properties.content_type == CONTENT_TYPE_BINARIO:
+        return _decodificar_binario(tipos, body)
+
+    try:
+        dados = json.loads(body)
+    except ValueError as e:
+        raise ErroFormato(f"JSON inválido: {e}")
+    if not isinstance(dados, dict):
+        raise ErroFormato("A mensagem deve ser um objeto JSON")
+
+    campos = [campo for tipo in tipos for campo in ESQUEMAS[tipo][1]]
+    for nome, tipo_campo in campos:
+        if tipo_campo == 'b' and isinstance(dados.get(nome), str):
+            try:
+                dados[nome] = base64.b64decode(dados[nome])
+            except (binascii.Error, ValueError) as e:
+                raise ErroFormato(f"{nome} não está em base64: {e}")
+    return dados
+
+
+def _tamanho(quantidade, nome):
+    if quantidade > TAMANHO_MAXIMO:
+        raise _ForaDoLimite(f"{nome} com {quantidade} itens ou bytes não cabe no formato binário")
+    return _TAMANHO.pack(quantidade)
+
+
+def _codificar_binario(tipo, mensagem):
+    codigo, campos = ESQUEMAS[tipo]
+    partes = [_CABECALHO.pack(VERSAO, codigo)]
+    try:
+        for nome, tipo_campo in campos:
+            valor = mensagem[nome]
+            if tipo_campo == 'd':
+                partes.append(_NUMERO.pack(valor))
+                continue
+            if tipo_campo == 'L':
+                partes.append(_tamanho(len(valor), nome))
+                for lance in valor:
+                    dados = lance['id_usuario'].encode('utf-8')
+                    partes.append(_tamanho(len(dados), nome))
+                    partes.append(dados)
+                    partes.append(_NUMERO.pack(lance['valor_do_lance']))
+                continue
+            if tipo_campo == 's':
+                dados = valor.encode('utf-8')
+            elif isinstance(valor, (bytes, bytearray)):
+                dados = valor
+            else:
+                raise TypeError(f"{nome} deve ser bytes, não {type(valor).__name__}")
+            partes.append(_tamanho(len(dados), nome))
+            partes.append(dados)
+    except (KeyError, TypeError, AttributeError, struct.error) as e:
+        raise ErroFormato(f"Mensagem '{tipo}' com campo inválido: {e!r}")
+    return b''.join(partes)
+
+
+def _ler_bytes(body, pos, tipo, nome):
+    tamanho = _TAMANHO.unpack_from(body, pos)[0]
+    pos += _TAMANHO.size
+    valor = bytes(body[pos:pos + tamanho])
+    if len(valor) != tamanho:
+        raise ErroFormato(f"Mensagem '{tipo}' truncada no campo {nome}")
+    return valor, pos + tamanho
+
+
+def _decodificar_binario(tipos, body):
+    tipo = tipos[0]
+    try:
+        versao, codigo = _CABECALHO.unpack_from(body)
+        if versao != VERSAO:
+            raise ErroFormato(f"Versão do formato binário não suportada: {versao}")
+        tipo = _TIPOS_POR_CODIGO.get(codigo)
+        if tipo not in tipos:
+            raise ErroFormato(f"Esperava uma mensagem {' ou '.join(tipos)}, recebeu o código {codigo}")
+
+        dados = {}
+        pos = _CABECALHO.size
+        for nome, tipo_campo in ESQUEMAS[tipo][1]:
+            if tipo_campo == 'd':
+                dados[nome] = _NUMERO.unpack_from(body, pos)[0]
+                pos += _NUMERO.size
+            elif tipo_campo == 'L':
+                quantidade = _TAMANHO.unpack_from(body, pos)[0]
+                pos += _TAMANHO.size
+                lances = []
+                for _ in range(quantidade):
+                    id_usuario, pos = _ler_bytes(body, pos, tipo, nome)
+                    lances.append({'id_usuario': id_usuario.decode('utf-8'),
+                                   'valor_do_lance': _NUMERO.unpack_from(body, pos)[0]})
+                    pos += _NUMERO.size
+                dados[nome] = lances
+            else:
+                valor, pos = _ler_bytes(body, pos, tipo, nome)
+                dados[nome] = valor.decode('utf-8') if tipo_campo == 's' else valor
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ErroFormato(f"Mensagem '{tipo}' binária inválida: {e}")
+    return dados
+
+
+class ModeloLance:
+    """Lance pré-serializado de um usuário num leilão: a cada envio só o valor é codificado
+
+    Os campos fixos (ids e assinatura, já em base64 no JSON) são serializados uma vez, e
+    montar() apenas junta o prefixo, o valor e o sufixo, no mesmo formato de codificar().
+    """
+
+    __slots__ = ('binario', 'prefixo', 'sufixo', 'properties')
+
+    def __init__(self, id_leilao, id_usuario, assinatura, formato=None):
+        formato = formato or FORMATO
+        self.binario = formato == 'binario'
+        self.properties = _PROPRIEDADES[formato]
+        if self.binario:
+            # Layout de 'lance': id_leilao, id_usuario | valor | assinatura
+            corpo = _codificar_binario('lance', {
+                'id_leilao': id_leilao, 'id_usuario': id_usuario,
+                'valor_do_lance': 0.0, 'assinatura': assinatura})
+            inicio_valor = len(corpo) - _TAMANHO.size - len(assinatura) - _NUMERO.size
+            self.prefixo = corpo[:inicio_valor]
+            self.sufixo = corpo[inicio_valor + _NUMERO.size:]
+        else:
+            fixos = json.dumps({
+                "id_usuario": id_usuario,
+                "id_leilao": id_leilao,
+                "assinatura": base64.b64encode(assinatura).decode('ascii')
+            }).encode('utf-8')
+            self.prefixo = fixos[:-1] + b', "valor_do_lance": '
+            self.sufixo = b'}'
+
+    def montar(self, valor):
+        """Retorna o body do lance com o valor informado"""
+        valor = float(valor)
+        if not math.isfinite(valor):
+            raise ValueError(f"Valor de lance inválido: {valor}")
+        if self.binario:
+            return self.prefixo + _NUMERO.pack(valor) + self.sufixo
+        # repr de um float finito é a mesma representação usada pelo json.dumps
+        return self.prefixo + repr(valor).encode('ascii') + self.sufixo
@@ -0,0 +1,142 @@
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import itertools
+import collections
+from protocolo import com_headers
+
+# Com LEILAO_RASTREAMENTO=1 (em todos os processos) cada lance recebe um id de rastreamento
+# no cliente, propagado nos headers das mensagens até a notificação, e cada etapa registra
+# no log o instante em que o lance passou por ela
+ATIVO = os.environ.get('LEILAO_RASTREAMENTO', '0') == '1'
+
+# Etapas de um lance, na ordem do caminho
+ETAPAS = (
+    'cliente.envio',             # EmissorLances publica em lance_realizado
+    'ms_lance.recebido',         # callback_lance começa a tratar o lance
+    'ms_lance.validado',         # lance aceito publicado em lance_validado
+    'ms_notificacao.recebido',   # callback_lance_validado recebe o lance
+    'ms_notificacao.publicado',  # notificação .lance publicada (ao fechar a janela, se houver)
+    'cliente.notificado',        # primeiro cliente a receber a notificação
+)
+
+_prefixo = os.urandom(4).hex()
+_sequencia = itertools.count(1)
+
+
+def novo_id():
+    """Id de rastreamento único entre processos: prefixo aleatório do processo + contador"""
+    return f"{_prefixo}-{next(_sequencia)}"
+
+
+def extrair(properties):
+    """(trace_id, saltos) dos headers da mensagem, ou None se ela não for rastreada"""
+    headers = properties.headers if properties is not None else None
+    if not headers or 'trace_id' not in headers:
+        return None
+    return headers['trace_id'], dict(headers.get('saltos') or {})
+
+
+def propagar(properties, rastro, salto, **headers):
+    """Cópia das propriedades com o rastro e o instante atual do salto nos headers
+
+    `salto` é o nome de quem publica (cliente, ms_lance, ms_notificacao); os instantes de
+    todos os saltos anteriores continuam no header saltos.
+    """
+    trace_id, saltos = rastro
+    saltos = dict(saltos)
+    saltos[salto] = time.time()
+    return com_headers(properties, **{**headers, 'trace_id': trace_id, 'saltos': saltos})
+
+#*****************************************************************************#
+# Análise dos logs
+
+_LINHA_TEXTO = re.compile(rb'RASTRO - Id: (\S+), Etapa: (\S+), Instante: ([\d.]+)')
+
+
+def _linhas(diretorio):
+    for nome in sorted(os.listdir(diretorio)):
+        caminho = os.path.join(diretorio, nome)
+        if nome.endswith('.log'):
+            with open(caminho, 'rb') as arquivo:
+                yield from arquivo
+        elif nome.endswith('.log.gz'):
+            with gzip.open(caminho, 'rb') as arquivo:
+                yield from arquivo
+
+
+def ler_rastros(diretorio):
+    """{trace_id: {etapa: instante}} a partir dos logs (texto ou JSON) de todos os processos
+
+    Quando uma etapa aparece mais de uma vez (vários clientes recebendo a mesma
+    notificação), vale o primeiro instante.
+    """
+    rastros = collections.defaultdict(dict)
+    for linha in _linhas(diretorio):
+        if b'RASTRO' not in linha:
+            continue
+        if linha.startswith(b'{'):
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                continue
+            if registro.get('evento') != 'rastro':
+                continue
+            trace_id, etapa, instante = registro['trace_id'], registro['etapa'], registro['instante']
+        else:
+            m = _LINHA_TEXTO.search(linha)
+            if not m:
+                continue
+            trace_id, etapa, instante = m.group(1).decode(), m.group(2).decode(), float(m.group(3))
+        etapas = rastros[trace_id]
+        if etapa not in etapas or instante < etapas[etapa]:
+            etapas[etapa] = instante
+    return rastros
+
+
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def analisar(rastros):
+    """Latências (ms) de cada trecho entre etapas consecutivas e do caminho completo
+
+    Retorna [(trecho, [latências ordenadas])]. Um trecho só conta os lances que passaram
+    pelas duas etapas (lances recusados param em ms_lance.recebido).
+    """
+    trechos = collections.OrderedDict(
+        (f"{origem} -> {destino}", []) for origem, destino in zip(ETAPAS, ETAPAS[1:]))
+    total = []
+    for etapas in rastros.values():
+        for origem, destino in zip(ETAPAS, ETAPAS[1:]):
+            if origem in etapas and destino in etapas:
+                trechos[f"{origem} -> {destino}"].append((etapas[destino] - etapas[origem]) * 1000)
+        if ETAPAS[0] in etapas and ETAPAS[-1] in etapas:
+            total.append((etapas[ETAPAS[-1]] - etapas[ETAPAS[0]]) * 1000)
+    trechos['total'] = total
+    return [(trecho, sorted(latencias)) for trecho, latencias in trechos.items()]
+
+
+def relatorio(resultado):
+    linhas = [f"{'trecho':<52} {'n':>8} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"]
+    for trecho, latencias in resultado:
+        if not latencias:
+            linhas.append(f"{trecho:<52} {0:>8}")
+            continue
+        linhas.append(f"{trecho:<52} {len(latencias):>8} " + ' '.join(
+            f"{valor:>9.2f}" for valor in (_percentil(latencias, 0.5), _percentil(latencias, 0.9),
+                                           _percentil(latencias, 0.99), latencias[-1])))
+    return '\n'.join(linhas)
+
+
+# Latência de cada etapa dos lances rastreados (LEILAO_RASTREAMENTO=1), em ms:
+#   python rastreamento.py [diretorio_dos_logs]
+if __name__ == '__main__':
+    diretorio_logs = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'logs')
+    rastros = ler_rastros(diretorio_logs)
+    print(f"{len(rastros)} lance(s) rastreado(s) em {diretorio_logs}\n")
+    print(relatorio(analisar(rastros)))
@@ -0,0 +1,457 @@
+import re
+import time
+import signal
+import itertools
+import asyncio
+import inspect
+import collections
+import contextvars
+import pika
+from pika.adapters.asyncio_connection import AsyncioConnection
+from mensageria import MODO_CONFIAVEL, PREFETCH
+import metricas
+
+# Confirmações do broker das mensagens publicadas durante o tratamento atual
+_confirmacoes = contextvars.ContextVar('confirmacoes', default=None)
+
+_MENSAGENS = metricas.contador(
+    'leilao_mensagens_total', 'Mensagens tratadas pelos serviços', ('fila', 'resultado'))
+_TEMPO_TRATAMENTO = metricas.histograma(
+    'leilao_tratamento_segundos', 'Tempo de execução do callback de cada mensagem', ('fila',))
+_ATRASO = metricas.histograma(
+    'leilao_atraso_fila_segundos', 'Tempo entre a publicação (header ts_envio) e a entrega ao serviço', ('fila',))
+
+
+class ErroCanal(Exception):
+    """O canal ou a conexão com o RabbitMQ foi fechado durante uma operação"""
+
+
+class RuntimeServicos:
+    """Runtime asyncio que hospeda os consumidores e as tarefas dos microserviços
+
+    Todos os serviços registrados no processo compartilham uma AsyncioConnection e
+    um canal. Cada mensagem recebida é tratada numa task própria, então os handlers
+    podem rodar em paralelo; o prefetch do canal limita quantas mensagens ficam em
+    andamento (backpressure) e o ack é enviado quando o handler termina. No modo
+    confiável (LEILAO_CONFIAVEL=1) o canal também usa publisher confirms e o ack
+    espera o broker confirmar as mensagens publicadas pelo handler.
+
+    Os serviços se registram com ao_iniciar() (declarações e consumidores),
+    tarefa() (laços em segundo plano) e ao_encerrar() (limpeza). SIGINT e SIGTERM
+    iniciam o encerramento: os consumidores são cancelados, os handlers em
+    andamento terminam e as confirmações pendentes são aguardadas.
+    """
+
+    def __init__(self, logger, host='localhost', prefetch=PREFETCH, tempo_encerramento=10.0):
+        self.logger = logger
+        self.host = host
+        self.prefetch = prefetch
+        self.tempo_encerramento = tempo_encerramento
+        self.loop = None
+        self.canal = None
+        self._conexao = None
+        self._conexao_fechada = None
+        self._encerrar = None
+        self._encerrando = False
+
+        self._preparacoes = []
+        self._tarefas = []
+        self._finalizacoes = []
+
+        self._consumidores = []
+        self._handlers = set()
+        self._tarefas_fundo = []
+        self._rpcs = set()
+        self._confirmacoes = collections.OrderedDict()  # delivery_tag -> futuro
+        self._proxima_tag = 1
+
+    #*************************************************************************#
+    # Registro dos serviços
+
+    def ao_iniciar(self, preparar):
+        """Registra uma corrotina preparar(runtime) executada com o canal aberto"""
+        self._preparacoes.append(preparar)
+        return preparar
+
+    def tarefa(self, executar):
+        """Registra uma corrotina executar(runtime) que roda em segundo plano"""
+        self._tarefas.append(executar)
+        return executar
+
+    def ao_encerrar(self, finalizar):
+        """Registra uma função (ou corrotina) chamada no encerramento"""
+        self._finalizacoes.append(finalizar)
+        return finalizar
+
+    def executar(self):
+        """Conecta ao RabbitMQ e executa os serviços até receber SIGINT/SIGTERM"""
+        # Endpoint/arquivo de métricas, se configurados (LEILAO_METRICAS_PORTA/ARQUIVO)
+        metricas.iniciar_exportacao(getattr(self.logger, 'service_name', 'servicos'))
+        try:
+            asyncio.run(self._principal())
+        except KeyboardInterrupt:
+            pass
+
+    def encerrar(self):
+        """Inicia o encerramento gracioso (pode ser chamado de outras threads)"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._encerrar.set)
+
+    #*************************************************************************#
+    # Operações no canal
+
+    async def declarar_fila(self, fila='', **opcoes):
+        """Declara uma fila e retorna o seu nome (útil para filas temporárias)"""
+        frame = await self._rpc(self.canal.queue_declare, queue=fila, **opcoes)
+        return frame.method.queue
+
+    async def declarar_exchange(self, exchange, tipo):
+        await self._rpc(self.canal.exchange_declare, exchange=exchange, exchange_type=tipo)
+
+    async def vincular(self, fila, exchange, routing_key=''):
+        await self._rpc(self.canal.queue_bind, queue=fila, exchange=exchange, routing_key=routing_key)
+
+    async def desvincular(self, fila, exchange, routing_key=''):
+        await self._rpc(self.canal.queue_unbind, queue=fila, exchange=exchange, routing_key=routing_key)
+
+    async def consumir(self, fila, callback):
+        """Consome a fila; callback(canal, method, properties, body) pode ser uma corrotina"""
+        futuro = self.loop.create_future()
+        consumer_tag = self.canal.basic_consume(
+            queue=fila, on_message_callback=self._receptor(fila, callback), auto_ack=False,
+            callback=lambda frame: futuro.done() or futuro.set_result(frame))
+        self._consumidores.append(consumer_tag)
+        await self._aguardar_rpc(futuro)
+        return consumer_tag
+
+    def publicar(self, exchange, routing_key, body, properties=None):
+        """Publica sem bloquear; no modo confiável retorna o futuro da confirmação do broker"""
+        properties = metricas.carimbar(properties)
+        self.canal.basic_publish(exchange=exchange, routing_key=routing_key,
+                                 body=body, properties=properties)
+        if not MODO_CONFIAVEL:
+            return None
+
+        futuro = self.loop.create_future()
+        self._confirmacoes[self._proxima_tag] = futuro
+        self._proxima_tag += 1
+
+        # O ack da mensagem em tratamento espera esta confirmação
+        pendentes = _confirmacoes.get()
+        if pendentes is not None:
+            pendentes.append(futuro)
+        return futuro
+
+    def acompanhar(self, confirmacao):
+        """Faz o ack da mensagem em tratamento esperar uma confirmação publicada fora dela"""
+        pendentes = _confirmacoes.get()
+        if confirmacao is not None and pendentes is not None:
+            pendentes.append(confirmacao)
+
+    #*************************************************************************#
+    # Funcionamento interno
+
+    async def _principal(self):
+        self.loop = asyncio.get_running_loop()
+        self._encerrar = asyncio.Event()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sinal, self._encerrar.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows: o KeyboardInterrupt encerra o asyncio.run
+                pass
+
+        await self._conectar()
+        try:
+            for preparar in self._preparacoes:
+                await preparar(self)
+            for executar in self._tarefas:
+                self._tarefas_fundo.append(self.loop.create_task(self._executar_tarefa(executar)))
+
+            await self._encerrar.wait()
+        finally:
+            await self._finalizar()
+
+    async def _conectar(self):
+        aberta = self.loop.create_future()
+        self._conexao_fechada = self.loop.create_future()
+        self._conexao = AsyncioConnection(
+            pika.ConnectionParameters(host=self.host),
+            on_open_callback=lambda conexao: aberta.set_result(conexao),
+            on_open_error_callback=lambda conexao, erro: aberta.set_exception(ErroCanal(erro)),
+            on_close_callback=self._ao_fechar_conexao,
+            custom_ioloop=self.loop)
+        await aberta
+        self.logger.log_conexao_rabbitmq('conectado')
+
+        canal_aberto = self.loop.create_future()
+        self._conexao.channel(on_open_callback=canal_aberto.set_result)
+        self.canal = await canal_aberto
+        self.canal.add_on_close_callback(self._ao_fechar_canal)
+
+        await self._rpc(self.canal.basic_qos, prefetch_count=self.prefetch)
+        if MODO_CONFIAVEL:
+            await self._rpc(self.canal.confirm_delivery, self._ao_confirmar)
+
+    def _receptor(self, fila, callback):
+        # Cada mensagem recebida é tratada numa task própria
+        medicoes = (_TEMPO_TRATAMENTO.rotulos(fila), _MENSAGENS.rotulos(fila, 'ok'),
+                    _MENSAGENS.rotulos(fila, 'erro'))
+        atrasos = _ATRASO.rotulos(fila)
+
+        def ao_receber(canal, method, properties, body):
+            if self._encerrando:
+                canal.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                return
+            atraso = metricas.atraso(properties)
+            if atraso is not None:
+                atrasos.observar(atraso)
+            task = self.loop.create_task(self._tratar(callback, canal, method, properties, body, medicoes))
+            self._handlers.add(task)
+            task.add_done_callback(self._handlers.discard)
+        return ao_receber
+
+    async def _rpc(self, metodo, *args, **kwargs):
+        # Converte uma operação de callback do pika num await
+        futuro = self.loop.create_future()
+        metodo(*args, callback=lambda frame: futuro.done() or futuro.set_result(frame), **kwargs)
+        return await self._aguardar_rpc(futuro)
+
+    async def _aguardar_rpc(self, futuro):
+        self._rpcs.add(futuro)
+        try:
+            return await futuro
+        finally:
+            self._rpcs.discard(futuro)
+
+    async def _tratar(self, callback, canal, method, properties, body, medicoes):
+        tempo, ok, erro = medicoes
+        pendentes = []
+        _confirmacoes.set(pendentes)
+        inicio = time.perf_counter()
+        try:
+            resultado = callback(canal, method, properties, body)
+            if inspect.isawaitable(resultado):
+                await resultado
+            tempo.observar(time.perf_counter() - inicio)
+            confirmadas = await asyncio.gather(*pendentes) if pendentes else []
+            ok.inc()
+        except Exception as e:
+            erro.inc()
+            self.logger.error(f"Erro ao processar mensagem de '{method.routing_key}': {e}")
+            if canal.is_open:
+                canal.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+
+        if not canal.is_open:
+            return
+        if all(confirmadas):
+            canal.basic_ack(delivery_tag=method.delivery_tag)
+        else:
+            # Alguma publicação derivada foi recusada: a mensagem volta para a fila
+            canal.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+
+    async def _executar_tarefa(self, executar):
+        try:
+            await executar(self)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.logger.error(f"Erro na tarefa {executar.__name__}: {e}")
+            self._encerrar.set()
+
+    def _ao_confirmar(self, frame):
+        metodo = frame.method
+        sucesso = isinstance(metodo, pika.spec.Basic.Ack)
+        if metodo.multiple:
+            while self._confirmacoes and next(iter(self._confirmacoes)) <= metodo.delivery_tag:
+                _, futuro = self._confirmacoes.popitem(last=False)
+                futuro.done() or futuro.set_result(sucesso)
+        else:
+            futuro = self._confirmacoes.pop(metodo.delivery_tag, None)
+            if futuro is not None and not futuro.done():
+                futuro.set_result(sucesso)
+
+    def _ao_fechar_canal(self, canal, motivo):
+        self._falhar_pendentes(motivo)
+        if not self._encerrando:
+            self.logger.error(f"Canal com o RabbitMQ fechado: {motivo}")
+            self._encerrar.set()
+
+    def _ao_fechar_conexao(self, conexao, motivo):
+        self._falhar_pendentes(motivo)
+        if not self._conexao_fechada.done():
+            self._conexao_fechada.set_result(motivo)
+        if not self._encerrando:
+            self.logger.log_conexao_rabbitmq('perdida')
+            self._encerrar.set()
+
+    def _falhar_pendentes(self, motivo):
+        for futuro in list(self._rpcs):
+            if not futuro.done():
+                futuro.set_exception(ErroCanal(motivo))
+        for futuro in self._confirmacoes.values():
+            if not futuro.done():
+                futuro.set_result(False)
+        self._confirmacoes.clear()
+
+    async def _finalizar(self):
+        self._encerrando = True
+        self.logger.info("Encerrando serviços...")
+        canal_aberto = self.canal is not None and self.canal.is_open
+
+        # Para de receber mensagens novas
+        if canal_aberto:
+            for consumer_tag in self._consumidores:
+                try:
+                    await self._rpc(self.canal.basic_cancel, consumer_tag)
+                except ErroCanal:
+                    break
+
+        for task in self._tarefas_fundo:
+            task.cancel()
+        await asyncio.gather(*self._tarefas_fundo, return_exceptions=True)
+
+        # Espera os handlers em andamento e as confirmações pendentes
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=self.tempo_encerramento)
+        if self._confirmacoes:
+            await asyncio.wait(list(self._confirmacoes.values()), timeout=self.tempo_encerramento)
+
+        for finalizar in self._finalizacoes:
+            try:
+                resultado = finalizar()
+                if inspect.isawaitable(resultado):
+                    await resultado
+            except Exception as e:
+                self.logger.error(f"Erro ao encerrar serviço: {e}")
+
+        if self._conexao is not None and self._conexao.is_open:
+            self._conexao.close()
+        if self._conexao_fechada is not None:
+            await asyncio.wait([self._conexao_fechada], timeout=self.tempo_encerramento)
+
+
+#*****************************************************************************#
+
+class _CanalLocal:
+    """Canal falso do RuntimeLocal: não há o que confirmar sem um broker"""
+
+    is_open = True
+
+    def basic_ack(self, delivery_tag):
+        pass
+
+    def basic_nack(self, delivery_tag, requeue=False):
+        pass
+
+
+class _MetodoLocal:
+    __slots__ = ('exchange', 'routing_key', 'delivery_tag')
+
+    def __init__(self, exchange, routing_key, delivery_tag):
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.delivery_tag = delivery_tag
+
+
+class RuntimeLocal(RuntimeServicos):
+    """Runtime com um broker em memória no lugar do RabbitMQ, para testes e benchmarks
+
+    Hospeda os mesmos serviços (registrar(runtime)) num único processo, sem conexão:
+    filas, exchanges direct/fanout/topic e vínculos ficam em memória, e cada mensagem
+    publicada é entregue no próximo ciclo do event loop aos consumidores da fila, em
+    rodízio. Não há persistência, prefetch nem confirmações do broker.
+    """
+
+    def __init__(self, logger, tempo_encerramento=10.0):
+        super().__init__(logger, host=None, tempo_encerramento=tempo_encerramento)
+        self._filas = {}        # nome -> [consumidores, mensagens sem consumidor]
+        self._exchanges = {}    # nome -> tipo
+        self._vinculos = collections.defaultdict(list)  # exchange -> [(routing_key, fila)]
+        self._padroes = {}
+        self._nomes = itertools.count(1)
+        self._tags = itertools.count(1)
+
+    async def declarar_fila(self, fila='', **opcoes):
+        if not fila:
+            fila = f"amq.gen-local-{next(self._nomes)}"
+        self._filas.setdefault(fila, [[], collections.deque()])
+        return fila
+
+    async def declarar_exchange(self, exchange, tipo):
+        self._exchanges.setdefault(exchange, tipo)
+
+    async def vincular(self, fila, exchange, routing_key=''):
+        if (routing_key, fila) not in self._vinculos[exchange]:
+            self._vinculos[exchange].append((routing_key, fila))
+
+    async def desvincular(self, fila, exchange, routing_key=''):
+        if (routing_key, fila) in self._vinculos[exchange]:
+            self._vinculos[exchange].remove((routing_key, fila))
+
+    async def consumir(self, fila, callback):
+        consumidores, pendentes = self._filas.setdefault(fila, [[], collections.deque()])
+        consumidores.append(self._receptor(fila, callback))
+        while pendentes:
+            self._entregar(fila, *pendentes.popleft())
+        return f"local-{fila}-{len(consumidores)}"
+
+    def publicar(self, exchange, routing_key, body, properties=None):
+        properties = metricas.carimbar(properties)
+        if exchange == '':
+            destinos = [routing_key]
+        else:
+            tipo = self._exchanges.get(exchange)
+            vinculos = self._vinculos.get(exchange, ())
+            if tipo == 'fanout':
+                destinos = [fila for _, fila in vinculos]
+            elif tipo == 'topic':
+                destinos = [fila for chave, fila in vinculos if self._casa(chave, routing_key)]
+            else:
+                destinos = [fila for chave, fila in vinculos if chave == routing_key]
+
+        # Uma mesma fila recebe a mensagem uma única vez, mesmo com vários vínculos
+        for fila in dict.fromkeys(destinos):
+            self._entregar(fila, exchange, routing_key, body, properties)
+        return None
+
+    def _entregar(self, fila, exchange, routing_key, body, properties):
+        consumidores, pendentes = self._filas.setdefault(fila, [[], collections.deque()])
+        if not consumidores:
+            pendentes.append((exchange, routing_key, body, properties))
+            return
+        # Rodízio entre os consumidores da fila
+        consumidores.append(consumidores.pop(0))
+        metodo = _MetodoLocal(exchange, routing_key, next(self._tags))
+        self.loop.call_soon(consumidores[-1], self.canal, metodo, properties, body)
+
+    def _casa(self, chave, routing_key):
+        padrao = self._padroes.get(chave)
+        if padrao is None:
+            partes = ['[^.]+' if parte == '*' else '.*' if parte == '#' else re.escape(parte)
+                      for parte in chave.split('.')]
+            padrao = self._padroes[chave] = re.compile(r'\.'.join(partes) + '$')
+        return padrao.match(routing_key) is not None
+
+    async def _conectar(self):
+        self.canal = _CanalLocal()
+        self.logger.info("Runtime local iniciado (broker em memória)")
+
+    async def _finalizar(self):
+        self._encerrando = True
+        self.logger.info("Encerrando serviços...")
+
+        for task in self._tarefas_fundo:
+            task.cancel()
+        await asyncio.gather(*self._tarefas_fundo, return_exceptions=True)
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=self.tempo_encerramento)
+
+        for finalizar in self._finalizacoes:
+            try:
+                resultado = finalizar()
+                if inspect.isawaitable(resultado):
+                    await resultado
+            except Exception as e:
+                self.logger.error(f"Erro ao encerrar serviço: {e}")
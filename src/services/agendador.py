@@ -0,0 +1,107 @@
+import time
+import heapq
+import asyncio
+import itertools
+
+
+class EventoAgendado:
+    """Ação agendada para um instante (timestamp em segundos)"""
+
+    __slots__ = ('instante', 'seq', 'acao', 'args', 'cancelado')
+
+    def __init__(self, instante, seq, acao, args):
+        self.instante = instante
+        self.seq = seq
+        self.acao = acao
+        self.args = args
+        self.cancelado = False
+
+    def __lt__(self, outro):
+        return (self.instante, self.seq) < (outro.instante, outro.seq)
+
+
+class Agendador:
+    """Agendador de eventos baseado num heap, para o início e o fim dos leilões
+
+    Agendar custa O(log N) e cancelar O(1): o evento é apenas marcado e descartado
+    quando chega ao topo do heap (o heap é compactado se os cancelados passarem da
+    metade). O laço executar() dorme até o próximo prazo, em vez de varrer todos os
+    leilões a cada segundo, e acorda antes se um evento mais próximo for agendado.
+    Uma ação que falha é registrada em `logger` e não impede as demais.
+    """
+
+    def __init__(self, relogio=time.time, logger=None):
+        self.relogio = relogio
+        self.logger = logger
+        self._heap = []
+        self._seq = itertools.count()
+        self._cancelados = 0
+        self._mudou = asyncio.Event()
+
+    def __len__(self):
+        return len(self._heap) - self._cancelados
+
+    def agendar(self, instante, acao, *args):
+        """Agenda acao(*args) para o timestamp `instante` e retorna o evento"""
+        evento = EventoAgendado(instante, next(self._seq), acao, args)
+        heapq.heappush(self._heap, evento)
+        # Só é preciso acordar o laço se o novo evento for o próximo a vencer
+        if self._heap[0] is evento:
+            self._mudou.set()
+        return evento
+
+    def cancelar(self, evento):
+        if evento.cancelado:
+            return
+        evento.cancelado = True
+        self._cancelados += 1
+        if self._cancelados > len(self._heap) // 2:
+            self._heap = [e for e in self._heap if not e.cancelado]
+            heapq.heapify(self._heap)
+            self._cancelados = 0
+
+    def reagendar(self, evento, instante):
+        """Cancela o evento e agenda a mesma ação para outro instante"""
+        self.cancelar(evento)
+        return self.agendar(instante, evento.acao, *evento.args)
+
+    def proximo(self):
+        """Instante do próximo evento, ou None se não houver nenhum"""
+        self._descartar_cancelados()
+        return self._heap[0].instante if self._heap else None
+
+    def executar_vencidos(self):
+        """Executa todos os eventos com prazo até agora e retorna quantos foram executados"""
+        executados = 0
+        agora = self.relogio()
+        while True:
+            self._descartar_cancelados()
+            if not self._heap or self._heap[0].instante > agora:
+                return executados
+            evento = heapq.heappop(self._heap)
+            try:
+                evento.acao(*evento.args)
+            except Exception as e:
+                # Um evento com erro não pode atrasar os outros vencidos nem parar o laço
+                if self.logger is not None:
+                    self.logger.error("Erro ao executar evento agendado %s: %r",
+                                      getattr(evento.acao, '__name__', evento.acao), e)
+            executados += 1
+
+    async def executar(self):
+        """Laço que dispara os eventos no prazo até ser cancelado"""
+        while True:
+            self.executar_vencidos()
+            self._mudou.clear()
+
+            proximo = self.proximo()
+            espera = None if proximo is None else max(0.0, proximo - self.relogio())
+            try:
+                await asyncio.wait_for(self._mudou.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+
+    def _descartar_cancelados(self):
+        while self._heap and self._heap[0].cancelado:
+            heapq.heappop(self._heap)
+            self._cancelados -= 1
@@ -0,0 +1,142 @@
+import os
+import time
+import hashlib
+from collections import OrderedDict
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import pkcs1_15
+
+
+class CacheChavesPublicas:
+    """Cache LRU das chaves públicas dos usuários e dos verificadores pkcs1_15
+
+    Cada entrada guarda o inode, o mtime e o tamanho do arquivo .pem, de modo que
+    um cliente que reinicia e gera um novo par de chaves invalida a entrada antiga.
+    """
+
+    def __init__(self, diretorio='../keys', capacidade=1024):
+        self.diretorio = diretorio
+        self.capacidade = capacidade
+        self._entradas = OrderedDict()
+
+        # Contadores para dimensionar o cache
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidacoes = 0
+
+    def _caminho(self, id_usuario):
+        return os.path.join(self.diretorio, f'public_{id_usuario}.pem')
+
+    def obter(self, id_usuario):
+        """Retorna (chave, verificador, impressão digital) do usuário, lendo o arquivo apenas se ele mudou"""
+        caminho = self._caminho(id_usuario)
+        # FileNotFoundError é propagado para quem chamou
+        st = os.stat(caminho)
+        versao = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        entrada = self._entradas.get(id_usuario)
+        if entrada is not None:
+            if entrada[0] == versao:
+                self._entradas.move_to_end(id_usuario)
+                self.hits += 1
+                return entrada[1], entrada[2], entrada[3]
+            # Arquivo da chave foi regravado desde a última leitura
+            del self._entradas[id_usuario]
+            self.invalidacoes += 1
+
+        self.misses += 1
+        with open(caminho, 'rb') as f:
+            chave = RSA.import_key(f.read())
+        verificador = pkcs1_15.new(chave)
+        impressao = SHA256.new(chave.export_key(format='DER')).digest()
+
+        self._entradas[id_usuario] = (versao, chave, verificador, impressao)
+        while len(self._entradas) > self.capacidade:
+            self._entradas.popitem(last=False)
+            self.evictions += 1
+
+        return chave, verificador, impressao
+
+    def invalidar(self, id_usuario=None):
+        """Remove a entrada de um usuário, ou todas se nenhum for informado"""
+        if id_usuario is None:
+            self._entradas.clear()
+        else:
+            self._entradas.pop(id_usuario, None)
+
+    def estatisticas(self):
+        """Contadores de uso do cache"""
+        return {
+            'tamanho': len(self._entradas),
+            'capacidade': self.capacidade,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidacoes': self.invalidacoes,
+        }
+
+
+class CacheVerificacoes:
+    """Cache LRU com TTL dos resultados de verificação de assinatura
+
+    Todos os clientes assinam o mesmo desafio, então o resultado da verificação
+    depende apenas da chave pública e dos bytes da assinatura. A chave do cache é
+    a impressão digital da chave pública mais um resumo da assinatura.
+    """
+
+    def __init__(self, capacidade=65536, ttl=300.0):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expiracoes = 0
+
+    @staticmethod
+    def _chave(impressao, assinatura):
+        return impressao + hashlib.blake2b(assinatura, digest_size=16).digest()
+
+    def consultar(self, impressao, assinatura):
+        """Retorna True/False se o resultado estiver em cache, ou None caso contrário"""
+        chave = self._chave(impressao, assinatura)
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            self.misses += 1
+            return None
+
+        expira_em, valida = entrada
+        if time.monotonic() >= expira_em:
+            del self._entradas[chave]
+            self.expiracoes += 1
+            self.misses += 1
+            return None
+
+        self._entradas.move_to_end(chave)
+        self.hits += 1
+        return valida
+
+    def registrar(self, impressao, assinatura, valida):
+        """Guarda o resultado de uma verificação"""
+        if self.capacidade <= 0:
+            return
+        chave = self._chave(impressao, assinatura)
+        self._entradas[chave] = (time.monotonic() + self.ttl, valida)
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.capacidade:
+            self._entradas.popitem(last=False)
+            self.evictions += 1
+
+    def estatisticas(self):
+        """Contadores de uso do cache"""
+        return {
+            'tamanho': len(self._entradas),
+            'capacidade': self.capacidade,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expiracoes': self.expiracoes,
+        }
@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import mmap
+import random
+import struct
+import bisect
+import hashlib
+from array import array
+
+# Cabeçalho do índice: assinatura, quantidade de produtos, tamanho e mtime do catálogo
+_CABECALHO = struct.Struct('<8sQQQ')
+_ASSINATURA = b'CATIDX01'
+
+# Bytes lidos por vez ao percorrer um catálogo JSON
+_TAMANHO_BLOCO = 1 << 16
+
+
+def _hash_id(id_produto):
+    digest = hashlib.blake2b(str(id_produto).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def _iterar_json(arquivo):
+    """Percorre os objetos do primeiro array de um arquivo JSON sem carregá-lo inteiro
+
+    Serve para o formato de dictionary/leiloes_data.json ({"leiloes": [...]}) e para um
+    array no topo do arquivo.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while '[' not in buffer:
+        bloco = arquivo.read(_TAMANHO_BLOCO)
+        if not bloco:
+            return
+        buffer += bloco
+    pos = buffer.index('[') + 1
+    fim_arquivo = False
+
+    while True:
+        # Pula espaços e vírgulas entre os itens
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            if pos >= len(buffer):
+                raise ValueError
+            item, pos = decoder.raw_decode(buffer, pos)
+        except ValueError:
+            # Item incompleto no fim do buffer: lê mais um bloco
+            if fim_arquivo:
+                raise ValueError(f"JSON inválido ou truncado perto de: {buffer[pos:pos + 40]!r}")
+            bloco = arquivo.read(_TAMANHO_BLOCO)
+            fim_arquivo = not bloco
+            buffer = buffer[pos:] + bloco
+            pos = 0
+            continue
+        yield item
+        if pos > _TAMANHO_BLOCO:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def construir_indice(caminho, caminho_indice=None):
+    """Gera o índice binário de um catálogo JSON Lines e retorna o caminho do índice
+
+    O índice guarda o offset de cada linha, na ordem do arquivo (para sortear produtos),
+    e os pares (hash do id, offset) ordenados pelo hash (para buscar por id).
+    """
+    caminho_indice = caminho_indice or caminho + '.idx'
+    offsets = array('Q')
+    pares = []
+    with open(caminho, 'rb') as arquivo:
+        offset = 0
+        for linha in arquivo:
+            if linha.strip():
+                offsets.append(offset)
+                pares.append((_hash_id(json.loads(linha)['id']), offset))
+            offset += len(linha)
+        estado = os.fstat(arquivo.fileno())
+
+    pares.sort()
+    hashes = array('Q', (h for h, _ in pares))
+    offsets_por_hash = array('Q', (o for _, o in pares))
+    del pares
+
+    temporario = caminho_indice + '.tmp'
+    with open(temporario, 'wb') as saida:
+        saida.write(_CABECALHO.pack(_ASSINATURA, len(offsets), estado.st_size, estado.st_mtime_ns))
+        offsets.tofile(saida)
+        hashes.tofile(saida)
+        offsets_por_hash.tofile(saida)
+    os.replace(temporario, caminho_indice)
+    return caminho_indice
+
+
+def converter_para_jsonl(origem, destino):
+    """Converte um catálogo JSON (como leiloes_data.json) para JSON Lines, em streaming"""
+    quantidade = 0
+    with open(origem, 'r', encoding='utf-8') as entrada, open(destino, 'w', encoding='utf-8') as saida:
+        for item in _iterar_json(entrada):
+            saida.write(json.dumps(item, ensure_ascii=False))
+            saida.write('\n')
+            quantidade += 1
+    return quantidade
+
+
+class CatalogoProdutos:
+    """Catálogo de produtos leiloáveis lido sob demanda, sem carregar o arquivo inteiro
+
+    Um catálogo JSON Lines (.jsonl, um produto por linha) é acessado por mmap junto com
+    um índice binário (<catalogo>.idx, também mapeado em memória), gerado na primeira
+    abertura e refeito quando o catálogo muda. Com ele, amostra() e obter() leem só as
+    linhas necessárias: o custo de abrir o catálogo e a memória usada não dependem da
+    quantidade de produtos.
+
+    Um catálogo JSON comum ({"leiloes": [...]}) também é aceito, percorrido em
+    streaming: amostra() usa reservoir sampling e obter() uma busca linear.
+    """
+
+    def __init__(self, caminho, indexar=True):
+        self.caminho = caminho
+        self.jsonl = caminho.endswith('.jsonl')
+        self._dados = None
+        self._indice = None
+        self._offsets = None
+        self._hashes = None
+        self._offsets_por_hash = None
+        self._quantidade = None
+
+        if self.jsonl and indexar:
+            self._abrir_indice()
+
+    def __len__(self):
+        if self._quantidade is None:
+            self._quantidade = sum(1 for _ in self)
+        return self._quantidade
+
+    def __iter__(self):
+        """Percorre todos os produtos em streaming"""
+        with open(self.caminho, 'r', encoding='utf-8') as arquivo:
+            if self.jsonl:
+                for linha in arquivo:
+                    if linha.strip():
+                        yield json.loads(linha)
+            else:
+                yield from _iterar_json(arquivo)
+
+    def amostra(self, k, rng=random):
+        """Sorteia até k produtos distintos"""
+        if self._offsets is not None:
+            posicoes = rng.sample(range(len(self._offsets)), min(k, len(self._offsets)))
+            return [self._ler(self._offsets[i]) for i in posicoes]
+
+        # Sem índice: reservoir sampling numa única passada, guardando só k produtos
+        selecionados = []
+        for i, item in enumerate(self):
+            if i < k:
+                selecionados.append(item)
+            else:
+                j = rng.randrange(i + 1)
+                if j < k:
+                    selecionados[j] = item
+        rng.shuffle(selecionados)
+        return selecionados
+
+    def obter(self, id_produto):
+        """Produto com o id informado, ou None se não existir"""
+        if self._hashes is None:
+            chave = str(id_produto)
+            return next((item for item in self if str(item.get('id')) == chave), None)
+
+        h = _hash_id(id_produto)
+        i = bisect.bisect_left(self._hashes, h)
+        # Verifica todos os produtos com o mesmo hash (colisões)
+        while i < len(self._hashes) and self._hashes[i] == h:
+            item = self._ler(self._offsets_por_hash[i])
+            if str(item.get('id')) == str(id_produto):
+                return item
+            i += 1
+        return None
+
+    def fechar(self):
+        for visao in (self._offsets, self._hashes, self._offsets_por_hash):
+            if visao is not None:
+                visao.release()
+        self._offsets = self._hashes = self._offsets_por_hash = None
+        for mapa in (self._indice, self._dados):
+            if mapa is not None:
+                mapa.close()
+        self._indice = self._dados = None
+
+    def _ler(self, offset):
+        fim = self._dados.find(b'\n', offset)
+        return json.loads(self._dados[offset:fim if fim >= 0 else len(self._dados)])
+
+    def _abrir_indice(self):
+        caminho_indice = self.caminho + '.idx'
+        estado = os.stat(self.caminho)
+        if not self._indice_valido(caminho_indice, estado):
+            construir_indice(self.caminho, caminho_indice)
+
+        if estado.st_size == 0:
+            self._quantidade = 0
+            return
+
+        with open(self.caminho, 'rb') as arquivo:
+            self._dados = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(caminho_indice, 'rb') as arquivo:
+            self._indice = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _, quantidade, _, _ = _CABECALHO.unpack_from(self._indice)
+        self._quantidade = quantidade
+        valores = memoryview(self._indice)[_CABECALHO.size:].cast('Q')
+        self._offsets = valores[:quantidade]
+        self._hashes = valores[quantidade:2 * quantidade]
+        self._offsets_por_hash = valores[2 * quantidade:3 * quantidade]
+        valores.release()
+
+    @staticmethod
+    def _indice_valido(caminho_indice, estado):
+        try:
+            with open(caminho_indice, 'rb') as arquivo:
+                cabecalho = arquivo.read(_CABECALHO.size)
+        except FileNotFoundError:
+            return False
+        if len(cabecalho) < _CABECALHO.size:
+            return False
+        assinatura, _, tamanho, mtime_ns = _CABECALHO.unpack(cabecalho)
+        return (assinatura == _ASSINATURA and tamanho == estado.st_size
+                and mtime_ns == estado.st_mtime_ns)
+
+
+# Prepara um catálogo grande para o ms_leilao:
+#   python catalogo.py converter ../dictionary/leiloes_data.json produtos.jsonl
+#   python catalogo.py indexar produtos.jsonl
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'converter':
+        print(f"{converter_para_jsonl(sys.argv[2], sys.argv[3])} produtos gravados em {sys.argv[3]}")
+    elif len(sys.argv) == 3 and sys.argv[1] == 'indexar':
+        print(f"Índice gravado em {construir_indice(sys.argv[2])}")
+    else:
+        print("Uso: python catalogo.py converter <origem.json> <destino.jsonl>")
+        print("     python catalogo.py indexar <catalogo.jsonl>")
+        sys.exit(1)
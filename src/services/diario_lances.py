@@ -0,0 +1,179 @@
+import os
+import json
+import glob
+import threading
+
+
+class DiarioLances:
+    """Diário append-only dos lances aceitos, com fsync em lote e snapshots periódicos
+
+    O estado é gravado em duas partes: snapshot.json, com o último lance de cada
+    leilão aberto no momento do snapshot e o número da sua geração, e diario.<geração>.log,
+    com um lance aceito por linha desde então. A recuperação carrega o snapshot e
+    reaplica apenas o diário da mesma geração, então o tempo de reinício depende do
+    tamanho do estado e da cauda do diário, não de todo o histórico.
+
+    Além dos lances, o diário guarda a configuração dos leilões que não usam o motor
+    padrão (registrar_leilao), o encerramento de cada leilão (registrar_encerramento),
+    que tira o leilão do estado, e a reabertura de um ID já encerrado
+    (registrar_reabertura); com os callbacks de recuperar(), quem usa o diário
+    interpreta cada registro.
+    """
+
+    def __init__(self, diretorio, intervalo_fsync=0.05, lote_fsync=256, lances_por_snapshot=10000):
+        self.diretorio = diretorio
+        self.intervalo_fsync = intervalo_fsync
+        self.lote_fsync = lote_fsync
+        self.lances_por_snapshot = lances_por_snapshot
+        os.makedirs(diretorio, exist_ok=True)
+
+        self.caminho_snapshot = os.path.join(diretorio, 'snapshot.json')
+        self.geracao = 0
+        self._arquivo = None
+        self._pendentes = 0
+        self._lances_desde_snapshot = 0
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def _caminho_diario(self, geracao):
+        return os.path.join(self.diretorio, f'diario.{geracao}.log')
+
+    def recuperar(self, restaurar=None, reaplicar=None):
+        """Reconstrói o estado {id_leilao: {'valor_do_lance', 'id_usuario'}} e abre o diário
+
+        Com `restaurar`, as seções do snapshot ({'lances': ..., **secoes} de snapshot())
+        são passadas a ele; com `reaplicar`, cada registro do diário (dict) é passado a
+        ele, em ordem, em vez de sobrescrever o último lance do leilão no estado.
+        """
+        estado = {}
+        if os.path.exists(self.caminho_snapshot):
+            with open(self.caminho_snapshot, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self.geracao = snapshot.pop('geracao')
+            estado = snapshot['lances']
+            if restaurar is not None:
+                restaurar(snapshot)
+
+        lances_reaplicados = 0
+        caminho = self._caminho_diario(self.geracao)
+        if os.path.exists(caminho):
+            tamanho_valido = 0
+            with open(caminho, 'rb') as f:
+                for linha in f:
+                    try:
+                        registro = json.loads(linha)
+                    except ValueError:
+                        # Última linha incompleta de uma queda durante a escrita
+                        break
+                    if reaplicar is not None:
+                        reaplicar(registro)
+                    else:
+                        estado[registro['id_leilao']] = {
+                            'valor_do_lance': registro['valor_do_lance'],
+                            'id_usuario': registro['id_usuario']
+                        }
+                    lances_reaplicados += 1
+                    tamanho_valido += len(linha)
+            # Descarta a cauda corrompida para que os próximos registros não se misturem a ela
+            if tamanho_valido < os.path.getsize(caminho):
+                os.truncate(caminho, tamanho_valido)
+
+        # Diários de gerações anteriores já estão contidos no snapshot
+        for antigo in glob.glob(os.path.join(self.diretorio, 'diario.*.log')):
+            if antigo != caminho:
+                os.remove(antigo)
+
+        self._arquivo = open(caminho, 'a', encoding='utf-8')
+        self._lances_desde_snapshot = lances_reaplicados
+        self._iniciar_sincronizador()
+        return estado
+
+    def registrar_lance(self, id_leilao, id_usuario, valor_do_lance):
+        """Acrescenta um lance aceito ao diário; o fsync acontece em lote"""
+        linha = json.dumps({
+            'id_leilao': id_leilao,
+            'id_usuario': id_usuario,
+            'valor_do_lance': valor_do_lance
+        }) + '\n'
+        self._gravar(linha)
+
+    def registrar_leilao(self, id_leilao, tipo, unidades):
+        """Acrescenta a configuração de um leilão (motor e unidades) ao diário"""
+        self._gravar(json.dumps({'id_leilao': id_leilao, 'tipo': tipo, 'unidades': unidades}) + '\n')
+
+    def registrar_encerramento(self, id_leilao):
+        """Acrescenta o encerramento de um leilão ao diário"""
+        self._gravar(json.dumps({'id_leilao': id_leilao, 'encerrado': True}) + '\n')
+
+    def registrar_reabertura(self, id_leilao):
+        """Acrescenta ao diário um novo leilão que reutiliza o ID de um encerrado"""
+        self._gravar(json.dumps({'id_leilao': id_leilao, 'reaberto': True}) + '\n')
+
+    def _gravar(self, linha):
+        with self._lock:
+            self._arquivo.write(linha)
+            self._pendentes += 1
+            self._lances_desde_snapshot += 1
+            if self._pendentes >= self.lote_fsync:
+                self._sincronizar()
+
+    def precisa_snapshot(self):
+        return self._lances_desde_snapshot >= self.lances_por_snapshot
+
+    def snapshot(self, estado, **secoes):
+        """Grava o estado completo (e outras seções, ex.: motores) e inicia uma nova geração"""
+        with self._lock:
+            nova_geracao = self.geracao + 1
+            temporario = self.caminho_snapshot + '.tmp'
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump({'geracao': nova_geracao, 'lances': estado, **secoes}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporario, self.caminho_snapshot)
+            self._sincronizar_diretorio()
+
+            # A partir daqui o diário antigo não é mais necessário para recuperar
+            self._arquivo.close()
+            antigo = self._caminho_diario(self.geracao)
+            self.geracao = nova_geracao
+            self._arquivo = open(self._caminho_diario(self.geracao), 'a', encoding='utf-8')
+            self._pendentes = 0
+            self._lances_desde_snapshot = 0
+            os.remove(antigo)
+
+    def sincronizar(self):
+        """Força o fsync dos lances pendentes"""
+        with self._lock:
+            self._sincronizar()
+
+    def _sincronizar(self):
+        if self._pendentes:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._pendentes = 0
+
+    def _sincronizar_diretorio(self):
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self.diretorio, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _iniciar_sincronizador(self):
+        # Thread que faz o fsync periódico dos lances que não completaram um lote
+        def sincronizador():
+            while not self._parar.wait(self.intervalo_fsync):
+                self.sincronizar()
+
+        self._thread = threading.Thread(target=sincronizador, daemon=True)
+        self._thread.start()
+
+    def fechar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+        with self._lock:
+            self._sincronizar()
+            self._arquivo.close()
@@ -0,0 +1,125 @@
+import heapq
+import itertools
+
+
+class MotorAscendente:
+    """Leilão inglês (padrão): cada lance precisa superar o último e o maior lance vence
+
+    Guarda um único lance por leilão em `lances` ({id_leilao: {'valor_do_lance',
+    'id_usuario'}}), o ultimos_lances do ms_lance. Os lances aceitos são públicos.
+    """
+
+    tipo = 'ascendente'
+    publico = True
+
+    def __init__(self, lances=None):
+        self.lances = {} if lances is None else lances
+
+    def abrir(self, id_leilao, unidades=1):
+        if unidades != 1:
+            raise ValueError("O leilão ascendente tem uma única unidade")
+
+    def oferecer(self, id_leilao, id_usuario, valor_do_lance):
+        """Registra o lance e retorna None, ou o motivo da recusa"""
+        ultimo = self.lances.get(id_leilao)
+        minimo = ultimo['valor_do_lance'] if ultimo is not None else 0
+        if valor_do_lance <= minimo:
+            return "Valor insuficiente"
+        self.lances[id_leilao] = {'valor_do_lance': valor_do_lance, 'id_usuario': id_usuario}
+        return None
+
+    def reaplicar(self, id_leilao, id_usuario, valor_do_lance):
+        # Lances do diário já foram aceitos na ordem em que aparecem
+        self.lances[id_leilao] = {'valor_do_lance': valor_do_lance, 'id_usuario': id_usuario}
+
+    def cotacao(self, id_leilao):
+        ultimo = self.lances.get(id_leilao)
+        return ultimo['valor_do_lance'] if ultimo is not None else 0
+
+    def encerrar(self, id_leilao):
+        """Vencedores [(id_usuario, valor)] do leilão, que deixa de ser guardado"""
+        ultimo = self.lances.pop(id_leilao, None)
+        return [] if ultimo is None else [(ultimo['id_usuario'], ultimo['valor_do_lance'])]
+
+    def estado(self):
+        return self.lances
+
+    def restaurar(self, estado):
+        self.lances.update(estado)
+
+
+class MotorFechado:
+    """Lances fechados com `unidades` itens idênticos (1 = leilão de primeiro preço)
+
+    Cada usuário dá um único lance, que não é divulgado aos demais. Os lances só são
+    acrescentados a uma lista (O(1), para suportar a rajada perto de data_fim); no fim,
+    a lista vira um heap em O(N) e os K maiores saem em O(K log N). Cada vencedor paga o
+    próprio lance; no empate vence o lance que chegou antes.
+    """
+
+    tipo = 'fechado'
+    publico = False
+
+    def __init__(self):
+        self.leiloes = {}  # id_leilao -> [unidades, [(-valor, ordem, id_usuario)], {usuarios}]
+        self._ordem = itertools.count()
+
+    def __len__(self):
+        """Quantidade de lances guardados em leilões ainda abertos"""
+        return sum(len(leilao[1]) for leilao in self.leiloes.values())
+
+    def abrir(self, id_leilao, unidades=1):
+        if not isinstance(unidades, int) or unidades < 1:
+            raise ValueError("unidades deve ser um inteiro maior ou igual a 1")
+        self.leiloes.setdefault(id_leilao, [unidades, [], set()])
+
+    def oferecer(self, id_leilao, id_usuario, valor_do_lance):
+        """Registra o lance e retorna None, ou o motivo da recusa"""
+        leilao = self.leiloes.get(id_leilao)
+        if leilao is None:
+            return "Leilão encerrado"
+        if valor_do_lance <= 0:
+            return "Valor insuficiente"
+        if id_usuario in leilao[2]:
+            return "Usuário já deu lance"
+        leilao[1].append((-valor_do_lance, next(self._ordem), id_usuario))
+        leilao[2].add(id_usuario)
+        return None
+
+    def reaplicar(self, id_leilao, id_usuario, valor_do_lance):
+        self.oferecer(id_leilao, id_usuario, valor_do_lance)
+
+    def cotacao(self, id_leilao):
+        return None
+
+    def encerrar(self, id_leilao):
+        """Vencedores [(id_usuario, valor)] do leilão, do maior para o menor lance"""
+        leilao = self.leiloes.pop(id_leilao, None)
+        if leilao is None:
+            return []
+        unidades, lances, _ = leilao
+        heapq.heapify(lances)
+        vencedores = []
+        for _ in range(min(unidades, len(lances))):
+            valor, _, id_usuario = heapq.heappop(lances)
+            vencedores.append((id_usuario, -valor))
+        return vencedores
+
+    def estado(self):
+        # Lances na ordem de chegada, para manter o desempate ao restaurar
+        estado = {}
+        for id_leilao, (unidades, lances, _) in self.leiloes.items():
+            em_ordem = sorted(lances, key=lambda lance: lance[1])
+            estado[id_leilao] = {'unidades': unidades,
+                                 'lances': [[id_usuario, -valor] for valor, _, id_usuario in em_ordem]}
+        return estado
+
+    def restaurar(self, estado):
+        for id_leilao, leilao in estado.items():
+            self.abrir(id_leilao, leilao['unidades'])
+            for id_usuario, valor_do_lance in leilao['lances']:
+                self.oferecer(id_leilao, id_usuario, valor_do_lance)
+
+
+# Tipos de leilão aceitos na criação (ms_leilao) e na mensagem de início
+TIPOS = (MotorAscendente.tipo, MotorFechado.tipo)
@@ -1,137 +1,320 @@
 import json
-import pika
-import base64
 import sys
 import os
-from Crypto.Signature import pkcs1_15
-from Crypto.Hash import SHA256
-from Crypto.PublicKey import RSA
+import time
+import collections
 
 # importa o logger
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from logger import create_logger
+from shards import TOTAL_SHARDS, fila_do_shard
+from runtime import RuntimeServicos
+from protocolo import codificar, decodificar, ErroFormato
+from verificacao import VerificadorAssinaturas, PoolVerificacao
+from diario_lances import DiarioLances
+from motores import MotorAscendente, MotorFechado
+import metricas
+import rastreamento
+
+# Shard atendido por esta instância (apenas com LEILAO_SHARDS > 1)
+SHARD = int(os.environ.get('MS_LANCE_SHARD', '0'))
+if not 0 <= SHARD < TOTAL_SHARDS:
+    print(f"ERRO: MS_LANCE_SHARD deve estar entre 0 e {TOTAL_SHARDS - 1}")
+    sys.exit(1)
+
+FILA_LANCE_REALIZADO = fila_do_shard('lance_realizado', SHARD)
+FILA_LEILAO_FINALIZADO = fila_do_shard('leilao_finalizado', SHARD)
 
 # Criar logger para este microserviço
-logger = create_logger('ms_lance')
-
-# Configurar conexão com RabbitMQ
-connection = pika.BlockingConnection(
-    pika.ConnectionParameters(host='localhost'))
-channel = connection.channel()
+logger = create_logger('ms_lance' if TOTAL_SHARDS <= 1 else f'ms_lance_{SHARD}')
 
+# Runtime que hospeda este serviço (definido em registrar)
+runtime = None
 
 ultimos_lances = {}
 
-#*****************************************************************************#
-
-# Declarar filas 
-channel.queue_declare(queue='lance_realizado')
-channel.queue_declare(queue='lance_validado')
-channel.queue_declare(queue='leilao_finalizado')
-channel.queue_declare(queue='leilao_vencedor')
-
-# Verifica o lance e publica na fila lance_validado
-def callback_lance(ch, method, properties, body):
-    msg = body.decode('utf-8')
-    data = json.loads(msg)
-    id_leilao = data.get('id_leilao')
-    id_usuario = data.get('id_usuario')
-    valor_do_lance = data.get('valor_do_lance')
-    assinatura_base64 = data.get('assinatura')
-
-    if not all([id_leilao, id_usuario, valor_do_lance, assinatura_base64]):
-        logger.error("Mensagem de lance incompleta recebida")
-        return
+# Motores de leilão: o ascendente (padrão) guarda o último lance em ultimos_lances; os
+# leilões de outro tipo entram em `motores` ao chegar a mensagem de início do leilão
+motor_ascendente = MotorAscendente(ultimos_lances)
+motor_fechado = MotorFechado()
+MOTORES = {motor.tipo: motor for motor in (motor_ascendente, motor_fechado)}
+motores = {}
+
+# Leilões encerrados recentemente e os seus vencedores. O estado de um leilão sai dos
+# motores no encerramento (o snapshot acompanha os leilões abertos, não o histórico);
+# aqui fica só o resultado, para recusar lances atrasados e repetir o mesmo resultado se
+# leilao_finalizado for entregue de novo. Limitado aos ENCERRADOS_RECENTES mais novos.
+# O ms_leilao reutiliza os IDs a cada execução: a mensagem de início de um leilão com
+# um ID encerrado descarta o resultado anterior (reabrir_leilao).
+ENCERRADOS_RECENTES = 10000
+encerrados = collections.OrderedDict()
+
+# Métricas
+lances_recebidos = metricas.contador('leilao_lances_recebidos_total', 'Lances recebidos pelo ms_lance')
+lances_validados = metricas.contador('leilao_lances_validados_total', 'Lances aceitos pelo ms_lance')
+lances_rejeitados = metricas.contador(
+    'leilao_lances_rejeitados_total', 'Lances recusados pelo ms_lance', ('motivo',))
+rejeitados_assinatura = lances_rejeitados.rotulos('assinatura_invalida')
+rejeitados_chave = lances_rejeitados.rotulos('chave_nao_encontrada')
+rejeitados_valor = lances_rejeitados.rotulos('valor_insuficiente')
+rejeitados_formato = lances_rejeitados.rotulos('mensagem_invalida')
+rejeitados_erro = lances_rejeitados.rotulos('erro')
+# Recusas da regra do motor do leilão, pelo motivo devolvido por oferecer()
+rejeitados_motor = {
+    "Valor insuficiente": rejeitados_valor,
+    "Usuário já deu lance": lances_rejeitados.rotulos('lance_repetido'),
+    "Leilão encerrado": lances_rejeitados.rotulos('leilao_encerrado'),
+}
+tempo_verificacao = metricas.histograma(
+    'leilao_verificacao_assinatura_segundos', 'Tempo de verificação da assinatura de um lance')
+metricas.medidor('leilao_ultimos_lances', 'Leilões com lance aceito em ultimos_lances',
+                 funcao=lambda: len(ultimos_lances))
+metricas.medidor('leilao_lances_fechados', 'Lances guardados em leilões fechados ainda abertos',
+                 funcao=lambda: len(motor_fechado))
+
+# Diário de lances para recuperar ultimos_lances após um reinício (opcional)
+diretorio_diario = os.environ.get('MS_LANCE_DIARIO')
+if diretorio_diario:
+    if TOTAL_SHARDS > 1:
+        diretorio_diario = os.path.join(diretorio_diario, f'shard_{SHARD}')
+    diario = DiarioLances(
+        diretorio_diario,
+        intervalo_fsync=float(os.environ.get('MS_LANCE_DIARIO_FSYNC_MS', '50')) / 1000,
+        lances_por_snapshot=int(os.environ.get('MS_LANCE_DIARIO_SNAPSHOT', '10000')))
+else:
+    diario = None
+
+# Verificador de assinaturas com cache das chaves públicas já importadas e dos
+# resultados de verificação (todos os clientes assinam o mesmo desafio)
+verificador = VerificadorAssinaturas(
+    '../keys',
+    capacidade_chaves=int(os.environ.get('MS_LANCE_CACHE_CHAVES', '1024')),
+    capacidade_verificacoes=int(os.environ.get('MS_LANCE_CACHE_VERIFICACOES', '65536')),
+    ttl_verificacoes=float(os.environ.get('MS_LANCE_CACHE_VERIFICACOES_TTL', '300')))
+
+# Pool de verificação paralela (desativado com MS_LANCE_WORKERS=0)
+workers_verificacao = int(os.environ.get('MS_LANCE_WORKERS', '0'))
+if workers_verificacao > 0:
+    pool_verificacao = PoolVerificacao(
+        verificador,
+        workers=workers_verificacao,
+        janela=int(os.environ.get('MS_LANCE_JANELA', '64')),
+        tipo=os.environ.get('MS_LANCE_POOL', 'thread'),
+        tempo_verificacao=tempo_verificacao)
+else:
+    pool_verificacao = None
 
-    try:
-        # Verifica assinatura com a chave pública do usuário
-        with open(f'../keys/public_{id_usuario}.pem', 'rb') as f:
-            key = RSA.import_key(f.read())
+#*****************************************************************************#
 
-        msg_original = b'AplicacaoLeilao.2025.2'
-        h = SHA256.new(msg_original)
+def motor_do_leilao(id_leilao):
+    return motores.get(id_leilao, motor_ascendente)
+
+def configurar_leilao(id_leilao, tipo, unidades):
+    """Abre o leilão no motor do seu tipo (ValueError se as unidades não servirem)"""
+    motor = MOTORES[tipo]
+    motor.abrir(id_leilao, unidades)
+    if motor is not motor_ascendente:
+        motores[id_leilao] = motor
+
+def encerrar_leilao(id_leilao):
+    """Vencedores [(id_usuario, valor)] do leilão; o estado dele sai do motor"""
+    if id_leilao in encerrados:
+        return encerrados[id_leilao]
+    vencedores = motores.pop(id_leilao, motor_ascendente).encerrar(id_leilao)
+    encerrados[id_leilao] = vencedores
+    if len(encerrados) > ENCERRADOS_RECENTES:
+        encerrados.popitem(last=False)
+    return vencedores
+
+def reabrir_leilao(id_leilao):
+    """Descarta o resultado de um ID encerrado usado num novo leilão; True se havia um"""
+    return encerrados.pop(id_leilao, None) is not None
+
+def salvar_snapshot():
+    diario.snapshot(ultimos_lances, fechados=motor_fechado.estado(),
+                    tipos={id_leilao: motor.tipo for id_leilao, motor in motores.items()},
+                    encerrados=list(encerrados.items()))
+
+def restaurar_snapshot(secoes):
+    ultimos_lances.update(secoes['lances'])
+    for id_leilao, tipo in secoes.get('tipos', {}).items():
+        motores[id_leilao] = MOTORES[tipo]
+    motor_fechado.restaurar(secoes.get('fechados', {}))
+    # Lista de [id_leilao, [[id_usuario, valor], ...]], do encerramento mais antigo ao mais novo
+    for id_leilao, vencedores in secoes.get('encerrados', []):
+        encerrados[id_leilao] = [tuple(vencedor) for vencedor in vencedores]
+
+def reaplicar_registro(registro):
+    id_leilao = registro['id_leilao']
+    if 'tipo' in registro:
+        configurar_leilao(id_leilao, registro['tipo'], registro['unidades'])
+    elif registro.get('encerrado'):
+        encerrar_leilao(id_leilao)
+    elif registro.get('reaberto'):
+        reabrir_leilao(id_leilao)
+    else:
+        motor_do_leilao(id_leilao).reaplicar(id_leilao, registro['id_usuario'], registro['valor_do_lance'])
 
-        assinatura_bytes = base64.b64decode(assinatura_base64)
+#*****************************************************************************#
 
-        pkcs1_15.new(key).verify(h, assinatura_bytes)
-        
-        logger.info(f"Assinatura do usuário {id_usuario} VÁLIDA")
+# Aplica o resultado da verificação de assinatura e a regra do motor do leilão
+def aplicar_lance(id_leilao, id_usuario, valor_do_lance, erro, rastro=None):
+    if erro is None:
+        logger.info("Assinatura do usuário %s VÁLIDA", id_usuario)
         logger.log_lance_recebido(id_leilao, id_usuario, valor_do_lance)
-
-    except (ValueError, TypeError):
+    elif isinstance(erro, (ValueError, TypeError)):
+        rejeitados_assinatura.inc()
         logger.log_erro_assinatura(id_usuario, "Assinatura inválida")
         logger.log_lance_rejeitado(id_leilao, id_usuario, valor_do_lance, "Assinatura inválida")
         return
-    except FileNotFoundError:
-        logger.log_erro_assinatura(id_usuario, f"Chave pública não encontrada")
+    elif isinstance(erro, FileNotFoundError):
+        rejeitados_chave.inc()
+        logger.log_erro_assinatura(id_usuario, "Chave pública não encontrada")
         logger.log_lance_rejeitado(id_leilao, id_usuario, valor_do_lance, "Chave pública não encontrada")
         return
-    except Exception as e:
-        logger.error(f"Erro inesperado ao processar lance: {e}")
+    else:
+        rejeitados_erro.inc()
+        logger.error("Erro inesperado ao processar lance: %s", str(erro))
         return
 
-    # Verifica se o lance é maior que o último lance
-    ultimo_lance_valor = (ultimos_lances.get(id_leilao, {})).get('valor_do_lance', 0)
-    if valor_do_lance <= ultimo_lance_valor:
-        logger.info(f"Valor Insuficiente... Cotação atual do leilão: R${ultimo_lance_valor:.2f}")
-        logger.log_lance_rejeitado(id_leilao, id_usuario, valor_do_lance, "Valor insuficiente")
+    # Ascendente: o lance precisa ser maior que o último; fechado: um lance por usuário
+    motor = motor_do_leilao(id_leilao)
+    if id_leilao in encerrados:
+        motivo = "Leilão encerrado"
+    else:
+        motivo = motor.oferecer(id_leilao, id_usuario, valor_do_lance)
+    if motivo is not None:
+        (rejeitados_motor.get(motivo) or lances_rejeitados.rotulos(motivo)).inc()
+        if motivo == "Valor insuficiente" and motor.publico:
+            logger.info("Valor Insuficiente... Cotação atual do leilão: R$%.2f", motor.cotacao(id_leilao))
+        logger.log_lance_rejeitado(id_leilao, id_usuario, valor_do_lance, motivo)
         return
 
-    ultimos_lances[id_leilao] = {
-        'valor_do_lance': valor_do_lance,
-        'id_usuario': id_usuario
-    }
+    # Registra o lance aceito no diário antes de notificar
+    if diario is not None:
+        diario.registrar_lance(id_leilao, id_usuario, valor_do_lance)
+        if diario.precisa_snapshot():
+            salvar_snapshot()
 
+    lances_validados.inc()
     logger.log_lance_validado(id_leilao, id_usuario, valor_do_lance)
 
+    # Lances fechados não são divulgados: só o resultado, no fim do leilão
+    if not motor.publico:
+        return
+
     mensagem = {
         "id_leilao": id_leilao,
         "id_usuario": id_usuario,
         "valor_do_lance": valor_do_lance
     }
 
-    body_e = json.dumps(mensagem).encode('utf-8')
+    body_e, propriedades = codificar('lance_validado', mensagem)
+    if rastro is not None:
+        propriedades = rastreamento.propagar(propriedades, rastro, 'ms_lance')
+        logger.log_rastro(rastro[0], 'ms_lance.validado', propriedades.headers['saltos']['ms_lance'])
 
     # Publica na fila lance_validado após o lance ser validado
-    channel.basic_publish(exchange='', routing_key='lance_validado', body=body_e)
+    runtime.publicar('', 'lance_validado', body_e, propriedades)
+
+# Verifica o lance e publica na fila lance_validado
+async def callback_lance(ch, method, properties, body):
+    lances_recebidos.inc()
+    rastro = rastreamento.extrair(properties) if rastreamento.ATIVO else None
+    if rastro is not None:
+        logger.log_rastro(rastro[0], 'ms_lance.recebido', time.time())
+    # Lance em JSON (assinatura em base64) ou binário, conforme o content_type
+    try:
+        data = decodificar('lance', properties, body)
+    except ErroFormato as e:
+        rejeitados_formato.inc()
+        logger.error("Mensagem de lance inválida recebida: %s", str(e))
+        return
+    id_leilao = data.get('id_leilao')
+    id_usuario = data.get('id_usuario')
+    valor_do_lance = data.get('valor_do_lance')
+    assinatura_bytes = data.get('assinatura')
 
+    if not all([id_leilao, id_usuario, valor_do_lance, assinatura_bytes]):
+        rejeitados_formato.inc()
+        logger.error("Mensagem de lance incompleta recebida")
+        return
 
-# Consumir mensagens da fila lance_realizado
-channel.basic_consume(queue='lance_realizado', on_message_callback=callback_lance, auto_ack=True)
+    # Verifica assinatura com a chave pública do usuário
+    if pool_verificacao is not None:
+        # Verificação em paralelo; a aplicação respeita a ordem de chegada do leilão
+        async with pool_verificacao.na_ordem(id_leilao, id_usuario, assinatura_bytes) as erro:
+            aplicar_lance(id_leilao, id_usuario, valor_do_lance, erro, rastro)
+        return
 
-#*****************************************************************************#
+    inicio = time.perf_counter()
+    try:
+        verificador.verificar(id_usuario, assinatura_bytes)
+        erro = None
+    except Exception as e:
+        erro = e
+    tempo_verificacao.observar(time.perf_counter() - inicio)
+    aplicar_lance(id_leilao, id_usuario, valor_do_lance, erro, rastro)
 
-# Declara exchange leiloes
-channel.exchange_declare(exchange='leiloes', exchange_type='fanout')
-result = channel.queue_declare(queue='', exclusive=True) # Declara uma fila temporária
-queue_name = result.method.queue
-channel.queue_bind(exchange='leiloes', queue=queue_name)
+#*****************************************************************************#
 
 def callback_inicio_leilao(ch, method, properties, body):
     logger.info(f"Novo leilão detectado: {body.decode()}")
+    try:
+        data = json.loads(body)
+        id_leilao = data['id_leilao']
+        tipo = data.get('tipo', 'ascendente')
+        unidades = data.get('unidades', 1)
+    except (ValueError, KeyError, TypeError) as e:
+        logger.error("Mensagem de início de leilão inválida: %s", str(e))
+        return
 
+    # Novo leilão com o ID de um já encerrado: os lances voltam a ser aceitos
+    if reabrir_leilao(id_leilao):
+        logger.info("Leilão %s reaberto com um ID já encerrado", id_leilao)
+        if diario is not None:
+            diario.registrar_reabertura(id_leilao)
 
-# Consumir mensagens da fila temporária provida pela exchange 'leiloes'
-channel.basic_consume(queue=queue_name, on_message_callback=callback_inicio_leilao, auto_ack=True)
+    if tipo not in MOTORES:
+        # O ms_leilao recusa tipos desconhecidos na criação: só chega aqui com versões diferentes
+        logger.error("Leilão %s com tipo desconhecido %r: lances seguem a regra ascendente", id_leilao, tipo)
+        return
+    if tipo == motor_ascendente.tipo or id_leilao in motores:
+        return
+    try:
+        configurar_leilao(id_leilao, tipo, unidades)
+    except (ValueError, TypeError) as e:
+        logger.error("Leilão %s com unidades inválidas (%r): %s", id_leilao, unidades, str(e))
+        return
+    if diario is not None:
+        diario.registrar_leilao(id_leilao, tipo, unidades)
+    logger.info("Leilão %s usa o motor %s com %d unidade(s)", id_leilao, tipo, unidades)
 
 #*****************************************************************************#
 
-# Declaração de filas leilao_finalizado e leilao vencedor
-channel.queue_declare(queue='leilao_finalizado')
-channel.queue_declare(queue='leilao_vencedor')
-
-def callback_leilao_finalizado(ch, method, properties, body):
+async def callback_leilao_finalizado(ch, method, properties, body):
     msg = body.decode('utf-8')
     data = json.loads(msg)
     id_leilao = data.get('id_leilao')
     logger.info(f"Processando finalização do leilão {id_leilao}")
+    logger.info(f"Caches de verificação: {verificador.estatisticas()}")
 
     if not id_leilao:
         logger.error("ID do leilão não encontrado na mensagem de finalização")
         return
+
+    # Espera os lances já recebidos para o leilão terminarem de ser verificados
+    if pool_verificacao is not None:
+        await pool_verificacao.aguardar(id_leilao)
     
+    # Vencedores pela regra do motor (ascendente: o último lance; fechado: os K maiores)
+    # O encerramento vai para o diário: o leilão não volta ao estado num reinício
+    vencedores = encerrar_leilao(id_leilao)
+    if diario is not None:
+        diario.registrar_encerramento(id_leilao)
+
     # Verifica se houve lances válidos
-    if id_leilao not in ultimos_lances:
+    if not vencedores:
         logger.warning(f"Leilão {id_leilao} finalizado sem lances válidos")
         mensagem = {
             "id_leilao": id_leilao,
@@ -141,18 +324,68 @@ def callback_leilao_finalizado(ch, method, properties, body):
     else:
         mensagem = {
             "id_leilao": id_leilao,
-            "id_usuario": ultimos_lances[id_leilao]['id_usuario'],
-            "valor_do_lance": ultimos_lances[id_leilao]['valor_do_lance']
+            "id_usuario": vencedores[0][0],
+            "valor_do_lance": vencedores[0][1]
         }
-    
-    body_vencedor = json.dumps(mensagem).encode('utf-8')
+
+    if len(vencedores) > 1:
+        logger.info(f"Leilão {id_leilao} com {len(vencedores)} vencedores")
+        mensagem["vencedores"] = [{"id_usuario": id_usuario, "valor_do_lance": valor}
+                                  for id_usuario, valor in vencedores]
+        body_vencedor, propriedades = codificar('vencedores', mensagem)
+    else:
+        body_vencedor, propriedades = codificar('vencedor', mensagem)
 
     # Publica na fila leilao_vencedor
-    channel.basic_publish(exchange='', routing_key='leilao_vencedor', body=body_vencedor)  
-    
-# Consumir mensagens da fila leilao_finalizado
-channel.basic_consume(queue='leilao_finalizado', on_message_callback=callback_leilao_finalizado, auto_ack=True)
+    runtime.publicar('', 'leilao_vencedor', body_vencedor, propriedades)
+
+#*****************************************************************************#
+
+async def preparar(rt):
+    # Declarar filas 
+    await rt.declarar_fila(FILA_LANCE_REALIZADO)
+    await rt.declarar_fila('lance_validado')
+    await rt.declarar_fila(FILA_LEILAO_FINALIZADO)
+    await rt.declarar_fila('leilao_vencedor')
+
+    # Consumir mensagens da fila lance_realizado (do shard desta instância)
+    await rt.consumir(FILA_LANCE_REALIZADO, callback_lance)
+
+    # Declara exchange leiloes e uma fila temporária ligada a ela
+    await rt.declarar_exchange('leiloes', 'fanout')
+    queue_name = await rt.declarar_fila('', exclusive=True)
+    await rt.vincular(queue_name, 'leiloes')
+
+    # Consumir mensagens da fila temporária provida pela exchange 'leiloes'
+    await rt.consumir(queue_name, callback_inicio_leilao)
+
+    # Consumir mensagens da fila leilao_finalizado (do shard desta instância)
+    await rt.consumir(FILA_LEILAO_FINALIZADO, callback_leilao_finalizado)
+
+def encerrar():
+    if pool_verificacao is not None:
+        pool_verificacao.encerrar()
+    if diario is not None:
+        diario.fechar()
+
+def registrar(rt):
+    """Registra o ms_lance no runtime"""
+    global runtime
+    runtime = rt
+
+    # Reconstrói ultimos_lances e os leilões fechados a partir do diário antes de consumir lances
+    if diario is not None:
+        inicio_recuperacao = time.perf_counter()
+        diario.recuperar(restaurar_snapshot, reaplicar_registro)
+        logger.info(f"Estado recuperado do diário em {(time.perf_counter() - inicio_recuperacao) * 1000:.1f} ms "
+                    f"({len(ultimos_lances)} leilões, {len(motor_fechado)} lances fechados)")
+
+    rt.ao_iniciar(preparar)
+    rt.ao_encerrar(encerrar)
 
 #*****************************************************************************#
 
-channel.start_consuming()
\ No newline at end of file
+if __name__ == '__main__':
+    runtime_lance = RuntimeServicos(logger)
+    registrar(runtime_lance)
+    runtime_lance.executar()
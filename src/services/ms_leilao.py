@@ -1,108 +1,439 @@
 import datetime
 import json
-import time
-import pika
 import sys
 import os
-import random
+import asyncio
+import itertools
+import collections
+import pika
 
 #importa o logger
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from logger import create_logger
+from shards import fila_do_leilao, filas_dos_shards
+from runtime import RuntimeServicos
+from agendador import Agendador
+from catalogo import CatalogoProdutos
+from motores import TIPOS
+import metricas
 
 # Criar logger para este microserviço
 logger = create_logger('ms_leilao')
 
-# Configurar conexão com RabbitMQ
-connection = pika.BlockingConnection(
-    pika.ConnectionParameters(host='localhost'))
-channel = connection.channel()
+# Runtime que hospeda este serviço (definido em registrar)
+runtime = None
+
+# Catálogo de produtos leiloáveis: o dicionário padrão ou um JSON Lines indexado
+CAMINHO_CATALOGO = os.environ.get('MS_LEILAO_CATALOGO') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'dictionary', 'leiloes_data.json')
 
-def carregar_leiloes_dicionario():
+def abrir_catalogo():
     try:
-        # Caminho baseado na localização do script
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        arquivo_path = os.path.join(script_dir, '..', 'dictionary', 'leiloes_data.json')
-        with open(arquivo_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data['leiloes']
+        return CatalogoProdutos(CAMINHO_CATALOGO)
     except FileNotFoundError:
-        logger.error(f"Arquivo de dicionário de leilões não encontrado em: {arquivo_path}")
-        return []
+        logger.error(f"Arquivo de dicionário de leilões não encontrado em: {CAMINHO_CATALOGO}")
     except Exception as e:
         logger.error(f"Erro ao carregar dicionário de leilões: {e}")
+    return None
+
+catalogo = None
+
+# Quantidade de leilões sorteados do dicionário ao iniciar (0 = catálogo vazio)
+LEILOES_INICIAIS = int(os.environ.get('MS_LEILAO_INICIAIS', '2'))
+
+# Leilões criados por vez antes de devolver o event loop em criar_lote
+LOTE_CRIACAO = 500
+
+def gerar_leiloes(quantidade=LEILOES_INICIAIS):
+    if catalogo is None:
         return []
 
-def gerar_leiloes():
-    leiloes_dict = carregar_leiloes_dicionario()
-    
-    # Selecionar 2 leilões aleatórios do dicionário
-    leiloes_selecionados = random.sample(leiloes_dict, min(2, len(leiloes_dict)))
+    # Selecionar leilões aleatórios do dicionário, sem carregá-lo inteiro
+    try:
+        leiloes_selecionados = catalogo.amostra(quantidade)
+    except Exception as e:
+        logger.error(f"Erro ao carregar dicionário de leilões: {e}")
+        return []
     
-    leiloes = []
+    agora = datetime.datetime.now()
+    leiloes_gerados = []
     for i, leilao_data in enumerate(leiloes_selecionados, 1):
-        # Define os dados do leilão
-        leiloes.append({
-            "id": f"leilao_{i:02d}",
+        # Define os dados do leilão (o primeiro começa em 4s, os demais a cada 55s)
+        leiloes_gerados.append({
+            "id": novo_id(),
             "descricao": leilao_data['descricao'],
             "valor_minimo": leilao_data.get('valor_minimo', 100.0),  # Valor padrão se não existir
-            "data_inicio": datetime.datetime.now() + datetime.timedelta(seconds=4 if i == 1 else 59),
-            "data_fim": datetime.datetime.now() + datetime.timedelta(minutes=2 if i == 1 else 3),
+            "data_inicio": agora + datetime.timedelta(seconds=4 + 55 * (i - 1)),
+            "data_fim": agora + datetime.timedelta(minutes=i + 1),
+            "tipo": "ascendente",
+            "unidades": 1,
             "status": "pendente"
         })
     
-    return leiloes
+    return leiloes_gerados
+
+# Catálogo de leilões por id e índice por status (pendente, ativo, encerrado, cancelado)
+leiloes = {}
+leiloes_por_status = collections.defaultdict(dict)
+
+_contador_ids = itertools.count(1)
+
+def novo_id():
+    """Gera um id de leilão ainda não usado no catálogo"""
+    while True:
+        id_leilao = f"leilao_{next(_contador_ids):02d}"
+        if id_leilao not in leiloes:
+            return id_leilao
+
+def mudar_status(leilao, status):
+    leiloes_por_status[leilao['status']].pop(leilao['id'], None)
+    leilao['status'] = status
+    leiloes_por_status[status][leilao['id']] = leilao
+
+# Agendador dos inícios e fins dos leilões
+agendador = Agendador(logger=logger)
+
+# Métricas
+metricas.medidor('leilao_leiloes', 'Leilões por status', ('status',),
+                 funcao=lambda: {status: len(ids) for status, ids in leiloes_por_status.items()})
+metricas.medidor('leilao_eventos_agendados', 'Inícios e fins de leilão agendados', funcao=lambda: len(agendador))
+comandos_recebidos = metricas.contador(
+    'leilao_comandos_total', 'Comandos recebidos na fila leilao_comandos', ('comando', 'resultado'))
+
+#*****************************************************************************#
+
+async def preparar(rt):
+    # Configurar fila leilao_iniciado e leilao_finalizado e exchange fanout
+    await rt.declarar_fila('leilao_iniciado')
+    await rt.declarar_exchange('leiloes', 'fanout')
+    for fila in filas_dos_shards('leilao_finalizado'):
+        await rt.declarar_fila(fila)
+
+    # Fila de comandos do catálogo de leilões
+    await rt.declarar_fila('leilao_comandos')
+    await rt.consumir('leilao_comandos', callback_comando)
+
+    logger.info("MS Leilão iniciado - monitorando leilões...")
+    logger.info("Leilões configurados:")
+    for leilao in leiloes.values():
+        logger.info(f"  {leilao['id']}: {leilao['descricao']} - Início: {leilao['data_inicio']} - Fim: {leilao['data_fim']}")
+
+def iniciar_leilao(leilao):
+    horario_atual = datetime.datetime.now()
+    leilao.pop('evento_inicio', None)
+
+    if leilao['status'] == 'pendente' and not horario_atual >= leilao['data_fim']:
+        # Para leilões pendentes tornarem ativos
+        mudar_status(leilao, 'ativo')
+        logger.log_leilao_iniciado(leilao['id'], leilao['descricao'], leilao['data_inicio'], leilao['data_fim'])
+        
+        mensagem = {
+            "id_leilao": leilao['id'],
+            "descricao": leilao['descricao'],
+            "valor_minimo": leilao['valor_minimo'],
+            "data_inicio": leilao['data_inicio'].isoformat(),
+            "data_fim": leilao['data_fim'].isoformat(),
+            "tipo": leilao['tipo'],
+            "unidades": leilao['unidades']
+        }
+
+        body = json.dumps(mensagem).encode('utf-8')
+
+        # Publicar mensagem na fila leilao_iniciado
+        runtime.publicar('', 'leilao_iniciado', body)
+        # Publicar mensagem via exchange leiloes
+        runtime.publicar('leiloes', '', body)
+    elif leilao['status'] == 'pendente':
+        # O início só foi processado depois do fim (loop atrasado): o leilão não acontece
+        mudar_status(leilao, 'cancelado')
+        logger.warning(f"LEILÃO CANCELADO - ID: {leilao['id']} - início processado após o fim")
+
+def finalizar_leilao(leilao):
+    leilao.pop('evento_fim', None)
+
+    if leilao['status'] == 'ativo':
+        # Para leilões ativos tornarem encerrados
+        mudar_status(leilao, 'encerrado')
+        logger.info(f"LEILÃO FINALIZADO - ID: {leilao['id']}")
+
+        mensagem = {
+            "id_leilao": leilao['id'],
+        }
+        
+        body = json.dumps(mensagem).encode('utf-8')
+        
+        # Publicar mensagem na fila leilao_finalizado do shard dono do leilão
+        runtime.publicar('', fila_do_leilao('leilao_finalizado', leilao['id']), body)
+
+def agendar_leilao(leilao):
+    """Agenda as transições de status do leilão nos horários de início e fim"""
+    leilao['evento_inicio'] = agendador.agendar(leilao['data_inicio'].timestamp(), iniciar_leilao, leilao)
+    leilao['evento_fim'] = agendador.agendar(leilao['data_fim'].timestamp(), finalizar_leilao, leilao)
+
+def adicionar_leilao(leilao):
+    """Inclui o leilão no catálogo e agenda o seu início e fim"""
+    leiloes[leilao['id']] = leilao
+    leiloes_por_status[leilao['status']][leilao['id']] = leilao
+    agendar_leilao(leilao)
+
+async def monitorar_leiloes(rt):
+    # Dorme até o próximo início/fim de leilão em vez de verificar todos a cada segundo
+    await agendador.executar()
+
+#*****************************************************************************#
+# Comandos do catálogo recebidos na fila leilao_comandos
+#
+# Cada mensagem é um JSON com o campo "comando"; se a mensagem tiver reply_to, a
+# resposta {"ok": ..., ...} é publicada nessa fila com o mesmo correlation_id.
+
+class ErroComando(Exception):
+    """Comando inválido ou que não se aplica ao estado atual do leilão"""
+
+def _instante(dados, campo, campo_relativo, base, padrao=None):
+    # Aceita um horário ISO em `campo` ou um deslocamento em segundos em `campo_relativo`
+    if dados.get(campo) is not None:
+        try:
+            instante = datetime.datetime.fromisoformat(dados[campo])
+        except (TypeError, ValueError):
+            raise ErroComando(f"{campo} inválido: {dados[campo]!r}")
+        # Os horários dos leilões são locais e sem fuso, como datetime.now(): um horário
+        # com fuso é convertido para não ser comparado com eles (TypeError)
+        if instante.tzinfo is not None:
+            instante = instante.astimezone().replace(tzinfo=None)
+        return instante
+    segundos = dados.get(campo_relativo, padrao)
+    if segundos is None:
+        raise ErroComando(f"Informe {campo} ou {campo_relativo}")
+    try:
+        return base + datetime.timedelta(seconds=float(segundos))
+    except (TypeError, ValueError):
+        raise ErroComando(f"{campo_relativo} inválido: {segundos!r}")
+
+def _buscar_leilao(dados, *status):
+    leilao = leiloes.get(dados.get('id_leilao'))
+    if leilao is None:
+        raise ErroComando(f"Leilão não encontrado: {dados.get('id_leilao')}")
+    if leilao['status'] not in status:
+        raise ErroComando(f"Leilão {leilao['id']} está {leilao['status']}")
+    return leilao
+
+def montar_leilao(dados, agora):
+    """Valida os dados de criação e monta o leilão (ainda fora do catálogo)"""
+    if dados.get('id_produto') is not None:
+        # Descrição e valor mínimo vêm do catálogo de produtos, se não forem informados
+        produto = catalogo.obter(dados['id_produto']) if catalogo is not None else None
+        if produto is None:
+            raise ErroComando(f"Produto não encontrado no catálogo: {dados['id_produto']!r}")
+        dados = {**produto, **dados}
+
+    descricao = dados.get('descricao')
+    if not isinstance(descricao, str) or not descricao:
+        raise ErroComando("descricao é obrigatória")
+    try:
+        valor_minimo = float(dados.get('valor_minimo', 100.0))
+    except (TypeError, ValueError):
+        raise ErroComando(f"valor_minimo inválido: {dados.get('valor_minimo')!r}")
+    if valor_minimo <= 0:
+        raise ErroComando("valor_minimo deve ser positivo")
+
+    data_inicio = _instante(dados, 'data_inicio', 'inicio_em', agora, padrao=0)
+    data_fim = _instante(dados, 'data_fim', 'duracao', data_inicio, padrao=120)
+    if data_fim <= data_inicio:
+        raise ErroComando("data_fim deve ser posterior a data_inicio")
+
+    # Tipo de leilão (motor do ms_lance) e quantidade de unidades idênticas leiloadas
+    tipo = dados.get('tipo', 'ascendente')
+    if tipo not in TIPOS:
+        raise ErroComando(f"tipo inválido: {tipo!r} (use {', '.join(TIPOS)})")
+    unidades = dados.get('unidades', 1)
+    if not isinstance(unidades, int) or isinstance(unidades, bool) or unidades < 1:
+        raise ErroComando(f"unidades inválido: {unidades!r}")
+    if tipo == 'ascendente' and unidades != 1:
+        raise ErroComando("O leilão ascendente tem uma única unidade")
+
+    id_leilao = dados.get('id_leilao')
+    if id_leilao is not None and (not isinstance(id_leilao, str) or id_leilao in leiloes):
+        raise ErroComando(f"id_leilao inválido ou já existente: {id_leilao!r}")
+
+    return {
+        "id": id_leilao,
+        "descricao": descricao,
+        "valor_minimo": valor_minimo,
+        "data_inicio": data_inicio,
+        "data_fim": data_fim,
+        "tipo": tipo,
+        "unidades": unidades,
+        "status": "pendente"
+    }
+
+def descrever_leilao(leilao):
+    return {
+        "id_leilao": leilao['id'],
+        "descricao": leilao['descricao'],
+        "valor_minimo": leilao['valor_minimo'],
+        "status": leilao['status'],
+        "data_inicio": leilao['data_inicio'].isoformat(),
+        "data_fim": leilao['data_fim'].isoformat(),
+        "tipo": leilao['tipo'],
+        "unidades": leilao['unidades']
+    }
+
+async def comando_criar_lote(dados):
+    itens = dados.get('leiloes')
+    if not isinstance(itens, list) or not itens:
+        raise ErroComando("leiloes deve ser uma lista não vazia")
+
+    # Valida o lote inteiro antes de incluir qualquer leilão
+    agora = datetime.datetime.now()
+    novos = []
+    ids_informados = set()
+    for i, item in enumerate(itens):
+        if not isinstance(item, dict):
+            raise ErroComando(f"leiloes[{i}] deve ser um objeto")
+        try:
+            leilao = montar_leilao(item, agora)
+        except ErroComando as e:
+            raise ErroComando(f"leiloes[{i}]: {e}")
+        if leilao['id'] is not None:
+            if leilao['id'] in ids_informados:
+                raise ErroComando(f"leiloes[{i}]: id_leilao repetido no lote: {leilao['id']}")
+            ids_informados.add(leilao['id'])
+        novos.append(leilao)
+
+    ids = []
+    for i, leilao in enumerate(novos, 1):
+        if leilao['id'] is None:
+            leilao['id'] = novo_id()
+        adicionar_leilao(leilao)
+        ids.append(leilao['id'])
+        # Lotes grandes não seguram o event loop (e os eventos do agendador)
+        if i % LOTE_CRIACAO == 0:
+            await asyncio.sleep(0)
+
+    logger.info(f"{len(ids)} leilão(ões) criado(s) - total no catálogo: {len(leiloes)}")
+    return {"ids": ids}
+
+async def comando_criar(dados):
+    return await comando_criar_lote({"leiloes": [dados]})
+
+async def comando_agendar(dados):
+    leilao = _buscar_leilao(dados, 'pendente')
+    data_inicio = _instante(dados, 'data_inicio', 'inicio_em', datetime.datetime.now(), padrao=0)
+    duracao = (leilao['data_fim'] - leilao['data_inicio']).total_seconds()
+    data_fim = _instante(dados, 'data_fim', 'duracao', data_inicio, padrao=duracao)
+    if data_fim <= data_inicio:
+        raise ErroComando("data_fim deve ser posterior a data_inicio")
+
+    leilao['data_inicio'] = data_inicio
+    leilao['data_fim'] = data_fim
+    for campo in ('evento_inicio', 'evento_fim'):
+        evento = leilao.pop(campo, None)
+        if evento is not None:
+            agendador.cancelar(evento)
+    agendar_leilao(leilao)
+    logger.info(f"LEILÃO REAGENDADO - ID: {leilao['id']} - Início: {data_inicio} - Fim: {data_fim}")
+    return descrever_leilao(leilao)
+
+async def comando_estender(dados):
+    leilao = _buscar_leilao(dados, 'pendente', 'ativo')
+    data_fim = _instante(dados, 'data_fim', 'segundos', leilao['data_fim'])
+    if data_fim <= leilao['data_fim']:
+        raise ErroComando("A nova data_fim deve ser posterior à atual")
+
+    leilao['data_fim'] = data_fim
+    evento = leilao.get('evento_fim')
+    if evento is not None:
+        leilao['evento_fim'] = agendador.reagendar(evento, data_fim.timestamp())
+    else:
+        leilao['evento_fim'] = agendador.agendar(data_fim.timestamp(), finalizar_leilao, leilao)
+    logger.info(f"LEILÃO ESTENDIDO - ID: {leilao['id']} - Fim: {data_fim}")
+    return descrever_leilao(leilao)
+
+async def comando_cancelar(dados):
+    # Apenas leilões que ainda não começaram: os ativos já têm lances e participantes
+    leilao = _buscar_leilao(dados, 'pendente')
+    for campo in ('evento_inicio', 'evento_fim'):
+        evento = leilao.pop(campo, None)
+        if evento is not None:
+            agendador.cancelar(evento)
+    mudar_status(leilao, 'cancelado')
+    logger.info(f"LEILÃO CANCELADO - ID: {leilao['id']}")
+    return descrever_leilao(leilao)
+
+async def comando_listar(dados):
+    status = dados.get('status')
+    if status is None:
+        selecionados = leiloes.values()
+    elif status in ('pendente', 'ativo', 'encerrado', 'cancelado'):
+        selecionados = leiloes_por_status[status].values()
+    else:
+        raise ErroComando(f"status inválido: {status!r}")
+    limite = dados.get('limite', 100)
+    if not isinstance(limite, int) or limite <= 0:
+        raise ErroComando(f"limite inválido: {limite!r}")
+
+    # Os que terminam primeiro vêm primeiro
+    ordenados = sorted(selecionados, key=lambda leilao: leilao['data_fim'])[:limite]
+    return {
+        "total": len(selecionados),
+        "leiloes": [descrever_leilao(leilao) for leilao in ordenados]
+    }
+
+COMANDOS = {
+    'criar': comando_criar,
+    'criar_lote': comando_criar_lote,
+    'agendar': comando_agendar,
+    'estender': comando_estender,
+    'cancelar': comando_cancelar,
+    'listar': comando_listar,
+}
+
+async def callback_comando(ch, method, properties, body):
+    # Nome do comando nas métricas: 'invalido' enquanto não for um comando conhecido
+    nome = 'invalido'
+    try:
+        dados = json.loads(body.decode('utf-8'))
+        if not isinstance(dados, dict):
+            raise ErroComando("O comando deve ser um objeto JSON")
+        comando = dados.get('comando')
+        if not isinstance(comando, str) or comando not in COMANDOS:
+            raise ErroComando(f"Comando desconhecido: {comando!r}")
+        nome = comando
+        resposta = {"ok": True, **await COMANDOS[comando](dados)}
+        comandos_recebidos.rotulos(nome, 'ok').inc()
+    except (ErroComando, ValueError) as e:
+        logger.warning(f"Comando rejeitado: {e}")
+        resposta = {"ok": False, "erro": str(e)}
+        comandos_recebidos.rotulos(nome, 'erro').inc()
+    except Exception as e:
+        # Falha inesperada no tratamento: o erro fica no log e quem pediu recebe a resposta
+        logger.error(f"Erro ao executar o comando {nome}: {e!r}")
+        resposta = {"ok": False, "erro": f"Erro interno ao executar o comando: {e}"}
+        comandos_recebidos.rotulos(nome, 'erro').inc()
+
+    if properties.reply_to:
+        runtime.publicar('', properties.reply_to, json.dumps(resposta).encode('utf-8'),
+                         pika.BasicProperties(correlation_id=properties.correlation_id,
+                                              content_type='application/json'))
+
+def encerrar():
+    if catalogo is not None:
+        catalogo.fechar()
 
-leiloes = gerar_leiloes()
+def registrar(rt):
+    """Registra o ms_leilao no runtime"""
+    global runtime, catalogo
+    runtime = rt
+    catalogo = abrir_catalogo()
+    for leilao in gerar_leiloes():
+        adicionar_leilao(leilao)
+    rt.ao_iniciar(preparar)
+    rt.tarefa(monitorar_leiloes)
+    rt.ao_encerrar(encerrar)
 
 #*****************************************************************************#
 
-# Configurar fila leilao_iniciado e leilao_finalizado e exchange fsnout
-channel.queue_declare(queue='leilao_iniciado')
-channel.exchange_declare(exchange='leiloes', exchange_type='fanout')
-channel.queue_declare(queue='leilao_finalizado')
-
-logger.info("MS Leilão iniciado - monitorando leilões...")
-logger.info("Leilões configurados:")
-for leilao in leiloes:
-    logger.info(f"  {leilao['id']}: {leilao['descricao']} - Início: {leilao['data_inicio']} - Fim: {leilao['data_fim']}")
-
-while True:
-    for leilao in leiloes:
-        horario_atual = datetime.datetime.now()
-
-        if leilao['status'] == 'pendente' and horario_atual >= leilao['data_inicio'] and not horario_atual >= leilao['data_fim']:
-            # Para leilões pendentes tornarem ativos
-            leilao['status'] = 'ativo'
-            logger.log_leilao_iniciado(leilao['id'], leilao['descricao'], leilao['data_inicio'], leilao['data_fim'])
-            
-            mensagem = {
-                "id_leilao": leilao['id'],
-                "descricao": leilao['descricao'],
-                "valor_minimo": leilao['valor_minimo'],
-                "data_inicio": leilao['data_inicio'].isoformat(),
-                "data_fim": leilao['data_fim'].isoformat()
-            }
-
-            body = json.dumps(mensagem).encode('utf-8')
-
-            # Publicar mensagem na fila leilao_iniciado
-            channel.basic_publish(exchange='', routing_key='leilao_iniciado', body=body)
-            # Publicar mensagem via exchange leiloes
-            channel.basic_publish(exchange='leiloes', routing_key='', body=body)
-
-        elif leilao['status'] == 'ativo' and horario_atual >= leilao['data_fim']: 
-            # Para leilões ativos tornarem encerrados
-            leilao['status'] = 'encerrado'
-            logger.info(f"LEILÃO FINALIZADO - ID: {leilao['id']}")
-
-            mensagem = {
-                "id_leilao": leilao['id'],
-            }
-            
-            body = json.dumps(mensagem).encode('utf-8')
-            
-            # Publicar mensagem na fila leilao_finalizado
-            channel.basic_publish(exchange='', routing_key='leilao_finalizado', body=body)
-
-    time.sleep(1)
\ No newline at end of file
+if __name__ == '__main__':
+    runtime_leilao = RuntimeServicos(logger)
+    registrar(runtime_leilao)
+    runtime_leilao.executar()
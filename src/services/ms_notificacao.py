@@ -1,35 +1,116 @@
-import json
-import pika
 import sys
+import time
+import asyncio
+import contextvars
 import os
 
 # importa o logger
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from logger import create_logger
+from runtime import RuntimeServicos
+from protocolo import codificar, decodificar
+import metricas
+import rastreamento
 
 # Criar logger para este microserviço
 logger = create_logger('ms_notificacao')
 
-# Conexão com o RabbitMQ
-connection = pika.BlockingConnection(pika.ConnectionParameters(host='localhost'))
-channel = connection.channel()
+# Runtime que hospeda este serviço (definido em registrar)
+runtime = None
+
+# Janela, em milissegundos, em que os lances de um leilão são agrupados numa única
+# notificação com o último lance (0 = uma notificação por lance)
+JANELA_MS = float(os.environ.get('NOTIFICACAO_JANELA_MS', '0'))
+# Inclui na notificação agrupada todos os lances da janela, não só o último
+INTERMEDIARIOS = os.environ.get('NOTIFICACAO_INTERMEDIARIOS', '0') == '1'
+
+# Declaração da fila de cada leilão (tarefa compartilhada pelos lances que chegam antes
+# de ela terminar, para que sejam publicados na ordem de chegada)
+filas_declaradas = {}
+# Lances de cada leilão aguardando o fim da janela (com os seus rastros) e o futuro da publicação
+janelas = {}
+
+# Métricas
+notificacoes = metricas.contador('leilao_notificacoes_total', 'Notificações publicadas na exchange leilao',
+                                 ('evento',))
+notificacoes_lance = notificacoes.rotulos('lance')
+notificacoes_fim = notificacoes.rotulos('fim')
+lances_por_notificacao = metricas.histograma(
+    'leilao_lances_por_notificacao', 'Lances validados agrupados em cada notificação .lance',
+    faixas=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+metricas.medidor('leilao_janelas_abertas', 'Leilões com janela de agrupamento aberta', funcao=lambda: len(janelas))
 
 #*****************************************************************************#
-# Declara exchange leilao
-channel.exchange_declare(exchange='leilao', exchange_type='topic')
+
+def notificar_lances(id_leilao, lances, rastros=()):
+    """Publica o último lance (e os intermediários, se configurado) na exchange leilao .lance
+
+    `rastros` traz o rastro (ou None) de cada lance; a notificação leva o do último lance
+    e, se agrupar vários, os ids de todos no header trace_ids.
+    """
+    msg = dict(lances[-1])
+    if INTERMEDIARIOS and len(lances) > 1:
+        msg['lances'] = [{"id_usuario": lance['id_usuario'], "valor_do_lance": lance['valor_do_lance']}
+                         for lance in lances]
+        body_envio, propriedades = codificar('lote_lances', msg)
+    else:
+        body_envio, propriedades = codificar('lance_validado', msg)
+    notificacoes_lance.inc()
+    lances_por_notificacao.observar(len(lances))
+    rastreados = [rastro for rastro in rastros if rastro is not None]
+    if rastreados:
+        extras = {'trace_ids': [trace_id for trace_id, _ in rastreados]} if len(rastreados) > 1 else {}
+        propriedades = rastreamento.propagar(propriedades, rastreados[-1], 'ms_notificacao', **extras)
+        instante = propriedades.headers['saltos']['ms_notificacao']
+        for trace_id, _ in rastreados:
+            logger.log_rastro(trace_id, 'ms_notificacao.publicado', instante)
+    # Publica o leilão na exchange .lance
+    return runtime.publicar('leilao', f"{id_leilao}.lance", body_envio, propriedades)
+
+async def declarar_fila_do_leilao(id_leilao):
+    """Declara a fila do leilão uma única vez
+
+    Os handlers rodam como tarefas concorrentes: todos os lances que chegam enquanto a
+    declaração está em andamento esperam a mesma tarefa e retomam na ordem de chegada;
+    se cada um declarasse por conta própria, um lance posterior que encontrasse a fila
+    já declarada seria publicado antes dos anteriores.
+    """
+    declaracao = filas_declaradas.get(id_leilao)
+    if declaracao is None:
+        declaracao = filas_declaradas[id_leilao] = asyncio.ensure_future(runtime.declarar_fila(id_leilao))
+    try:
+        await declaracao
+    except Exception:
+        # A próxima mensagem do leilão tenta declarar de novo
+        if filas_declaradas.get(id_leilao) is declaracao:
+            del filas_declaradas[id_leilao]
+        raise
+
+def fechar_janela(id_leilao):
+    janela = janelas.pop(id_leilao, None)
+    if janela is None:
+        return
+    lances, rastros, publicado, temporizador = janela
+    temporizador.cancel()
+    try:
+        publicado.set_result(notificar_lances(id_leilao, lances, rastros))
+    except Exception as e:
+        publicado.set_exception(e)
 
 # Função para notificar lances validados publicando na exchange leilao .lance
-def callback_lance_validado(ch, method, properties, body):
+async def callback_lance_validado(ch, method, properties, body):
     logger.info("Lance validado recebido para notificação")
+    rastro = rastreamento.extrair(properties) if rastreamento.ATIVO else None
+    if rastro is not None:
+        logger.log_rastro(rastro[0], 'ms_notificacao.recebido', time.time())
 
-    msg = body.decode('utf-8')
-    data = json.loads(msg)
+    data = decodificar('lance_validado', properties, body)
     id_leilao = data.get('id_leilao')
     id_usuario = data.get('id_usuario')
     valor_do_lance = data.get('valor_do_lance')
 
-    # Declara a fila para o leilão
-    channel.queue_declare(queue=id_leilao)
+    # Declara a fila para o leilão apenas no primeiro lance
+    await declarar_fila_do_leilao(id_leilao)
 
     msg = {
         "id_leilao": id_leilao,
@@ -37,48 +118,81 @@ def callback_lance_validado(ch, method, properties, body):
         "valor_do_lance": valor_do_lance
     }
 
-    body_envio = json.dumps(msg).encode('utf-8')
-    # Publica o leilão na exchange .lance
-    channel.basic_publish( exchange='leilao', routing_key=f"{id_leilao}.lance", body=body_envio)
+    if JANELA_MS <= 0:
+        notificar_lances(id_leilao, [msg], [rastro])
+        return
+
+    # O primeiro lance abre a janela do leilão; os seguintes entram nela
+    janela = janelas.get(id_leilao)
+    if janela is None:
+        temporizador = runtime.loop.call_later(JANELA_MS / 1000, fechar_janela, id_leilao,
+                                               context=contextvars.Context())
+        janela = janelas[id_leilao] = ([], [], runtime.loop.create_future(), temporizador)
+    janela[0].append(msg)
+    janela[1].append(rastro)
 
-# Declara a fila lance_validado
-channel.queue_declare(queue='lance_validado')
-# Consumir mensagens da fila lance_validado
-channel.basic_consume(queue='lance_validado', on_message_callback=callback_lance_validado, auto_ack=True)
+    # O ack deste lance espera a publicação da janela (e a confirmação, no modo confiável)
+    runtime.acompanhar(await janela[2])
 
 #*****************************************************************************#
 
 # Função para notificar leilao vencedor publicando na exchange leilao .fim
-def callback_leilao_vencedor(ch, method, properties, body):
+async def callback_leilao_vencedor(ch, method, properties, body):
     logger.info("Processando resultado do leilão")
 
-    msg = body.decode('utf-8')
-    data = json.loads(msg)
+    data = decodificar(('vencedor', 'vencedores'), properties, body)
     id_leilao = data.get('id_leilao')
     id_usuario = data.get('id_usuario')
     valor_do_lance = data.get('valor_do_lance')
 
     logger.log_leilao_finalizado(id_leilao, id_usuario, f"{valor_do_lance:.2f}")
 
+    # Os lances ainda na janela são notificados antes do fim
+    fechar_janela(id_leilao)
+
     # Declara a fila para o leilão
-    channel.queue_declare(queue=id_leilao)
+    await declarar_fila_do_leilao(id_leilao)
     msg = {
         "id_leilao": id_leilao,
         "id_vencedor": id_usuario, 
         "valor_negociado": valor_do_lance
     }
 
-    body_envio = json.dumps(msg).encode('utf-8')
+    # Leilão de várias unidades: todos os vencedores, do maior ao menor lance
+    if data.get('vencedores'):
+        msg["vencedores"] = data['vencedores']
+        body_envio, propriedades = codificar('fim_vencedores', msg)
+    else:
+        body_envio, propriedades = codificar('fim', msg)
+    notificacoes_fim.inc()
     # Publica o leilão na exchange leilao .fim
-    channel.basic_publish( exchange='leilao', routing_key=f"{id_leilao}.fim", body=body_envio)
+    runtime.publicar('leilao', f"{id_leilao}.fim", body_envio, propriedades)
+
+#*****************************************************************************#
+
+async def preparar(rt):
+    # Declara exchange leilao
+    await rt.declarar_exchange('leilao', 'topic')
 
-# Declara a fila leilao_vencedor
-channel.queue_declare(queue='leilao_vencedor')
-# Consumir mensagens da fila leilao_vencedor
-channel.basic_consume(queue='leilao_vencedor', on_message_callback=callback_leilao_vencedor, auto_ack=True)
+    # Declara a fila lance_validado
+    await rt.declarar_fila('lance_validado')
+    # Consumir mensagens da fila lance_validado
+    await rt.consumir('lance_validado', callback_lance_validado)
 
+    # Declara a fila leilao_vencedor
+    await rt.declarar_fila('leilao_vencedor')
+    # Consumir mensagens da fila leilao_vencedor
+    await rt.consumir('leilao_vencedor', callback_leilao_vencedor)
 
+def registrar(rt):
+    """Registra o ms_notificacao no runtime"""
+    global runtime
+    runtime = rt
+    rt.ao_iniciar(preparar)
 
 #*****************************************************************************#
 
-channel.start_consuming()
\ No newline at end of file
+if __name__ == '__main__':
+    runtime_notificacao = RuntimeServicos(logger)
+    registrar(runtime_notificacao)
+    runtime_notificacao.executar()
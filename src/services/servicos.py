@@ -0,0 +1,65 @@
+import sys
+import os
+import importlib
+import importlib.util
+
+# importa o logger
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from logger import create_logger
+from runtime import RuntimeServicos
+from shards import TOTAL_SHARDS
+
+# Serviços que podem ser hospedados no mesmo processo
+SERVICOS = ('ms_leilao', 'ms_lance', 'ms_notificacao')
+
+
+def carregar_ms_lance(shard):
+    """Instância própria do módulo ms_lance atendendo o shard indicado
+
+    O ms_lance guarda o estado no módulo e lê MS_LANCE_SHARD ao ser importado; para
+    hospedar vários shards no mesmo processo (carga.py --local, testes), cada um é
+    carregado como um módulo separado (ms_lance_<shard>).
+    """
+    anterior = os.environ.get('MS_LANCE_SHARD')
+    os.environ['MS_LANCE_SHARD'] = str(shard)
+    try:
+        spec = importlib.util.spec_from_file_location(
+            f'ms_lance_{shard}', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ms_lance.py'))
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+    finally:
+        if anterior is None:
+            del os.environ['MS_LANCE_SHARD']
+        else:
+            os.environ['MS_LANCE_SHARD'] = anterior
+    return modulo
+
+
+def registrar_todos(runtime):
+    """Registra os três serviços, com um ms_lance por shard (LEILAO_SHARDS), no runtime"""
+    importlib.import_module('ms_leilao').registrar(runtime)
+    if TOTAL_SHARDS <= 1:
+        importlib.import_module('ms_lance').registrar(runtime)
+    else:
+        for shard in range(TOTAL_SHARDS):
+            carregar_ms_lance(shard).registrar(runtime)
+    importlib.import_module('ms_notificacao').registrar(runtime)
+
+# Executa vários microserviços num único event loop:
+#   python servicos.py                      (todos)
+#   python servicos.py ms_lance ms_notificacao
+if __name__ == '__main__':
+    nomes = sys.argv[1:] or list(SERVICOS)
+    desconhecidos = [nome for nome in nomes if nome not in SERVICOS]
+    if desconhecidos:
+        print(f"ERRO: serviço(s) desconhecido(s): {', '.join(desconhecidos)}")
+        print(f"Uso: python servicos.py [{' '.join(SERVICOS)}]")
+        sys.exit(1)
+
+    logger = create_logger('servicos')
+    runtime = RuntimeServicos(logger)
+    for nome in nomes:
+        importlib.import_module(nome).registrar(runtime)
+        logger.info(f"Serviço {nome} registrado")
+
+    runtime.executar()
@@ -0,0 +1,140 @@
+import time
+import asyncio
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from Crypto.Hash import SHA256
+from cache_chaves import CacheChavesPublicas, CacheVerificacoes
+
+# Desafio assinado por todos os clientes
+MENSAGEM_DESAFIO = b'AplicacaoLeilao.2025.2'
+
+
+class VerificadorAssinaturas:
+    """Verifica assinaturas de lances usando os caches de chaves e de resultados
+
+    Pode ser usado por várias threads ao mesmo tempo: os caches são protegidos por
+    um lock, mas a verificação RSA em si roda fora dele.
+    """
+
+    def __init__(self, diretorio='../keys', capacidade_chaves=1024,
+                 capacidade_verificacoes=65536, ttl_verificacoes=300.0):
+        # Parâmetros guardados para recriar o verificador em outros processos
+        self.config = {
+            'diretorio': diretorio,
+            'capacidade_chaves': capacidade_chaves,
+            'capacidade_verificacoes': capacidade_verificacoes,
+            'ttl_verificacoes': ttl_verificacoes,
+        }
+        self.cache_chaves = CacheChavesPublicas(diretorio, capacidade_chaves)
+        self.cache_verificacoes = CacheVerificacoes(capacidade_verificacoes, ttl_verificacoes)
+        self.hash_desafio = SHA256.new(MENSAGEM_DESAFIO)
+        self._lock = threading.Lock()
+
+    def verificar(self, id_usuario, assinatura_bytes):
+        """Levanta ValueError se a assinatura for inválida e FileNotFoundError se não houver chave"""
+        with self._lock:
+            _, verificador, impressao = self.cache_chaves.obter(id_usuario)
+            valida = self.cache_verificacoes.consultar(impressao, assinatura_bytes)
+
+        if valida is None:
+            try:
+                verificador.verify(self.hash_desafio, assinatura_bytes)
+                valida = True
+            except ValueError:
+                valida = False
+            with self._lock:
+                self.cache_verificacoes.registrar(impressao, assinatura_bytes, valida)
+
+        if not valida:
+            raise ValueError("Assinatura inválida")
+
+    def estatisticas(self):
+        """Contadores dos caches de chaves e de verificações"""
+        with self._lock:
+            return {
+                'chaves': self.cache_chaves.estatisticas(),
+                'verificacoes': self.cache_verificacoes.estatisticas(),
+            }
+
+#*****************************************************************************#
+
+# Verificador de cada processo do pool (usado apenas com ProcessPoolExecutor)
+_verificador_processo = None
+
+def _inicializar_processo(config):
+    global _verificador_processo
+    _verificador_processo = VerificadorAssinaturas(**config)
+
+def _verificar_em_processo(id_usuario, assinatura_bytes):
+    _verificador_processo.verificar(id_usuario, assinatura_bytes)
+
+
+class PoolVerificacao:
+    """Verifica lances em paralelo mantendo a ordem de chegada dentro de cada leilão
+
+    Cada lance ocupa sua posição na fila do seu leilão assim que chega. As
+    verificações rodam em paralelo no executor, mas um lance só é liberado para ser
+    aplicado depois que o anterior do mesmo leilão foi aplicado, então a regra
+    "maior lance vence" continua vendo os lances na ordem da fila. No máximo
+    `janela` verificações ficam em andamento ao mesmo tempo.
+    """
+
+    def __init__(self, verificador, workers=4, janela=64, tipo='thread', tempo_verificacao=None):
+        self.verificador = verificador
+        # Histograma (metricas.Histograma) do tempo de cada verificação no executor
+        self.tempo_verificacao = tempo_verificacao
+        if tipo == 'processo':
+            # Cada processo mantém os próprios caches
+            self._executor = ProcessPoolExecutor(workers, initializer=_inicializar_processo,
+                                                 initargs=(verificador.config,))
+            self._funcao = _verificar_em_processo
+        else:
+            # A exponenciação modular do pycryptodome roda em C sem o GIL
+            self._executor = ThreadPoolExecutor(workers, thread_name_prefix='verificacao')
+            self._funcao = verificador.verificar
+
+        self._janela = asyncio.Semaphore(janela)
+        self._ultimos = {}  # id_leilao -> futuro liberado quando o último lance do leilão for aplicado
+
+    @contextlib.asynccontextmanager
+    async def na_ordem(self, id_leilao, id_usuario, assinatura_bytes):
+        """Verifica a assinatura e entrega o erro (ou None) quando for a vez do lance
+
+        Uso: `async with pool.na_ordem(...) as erro: aplicar o lance`. A posição na
+        fila do leilão é reservada antes do primeiro await.
+        """
+        loop = asyncio.get_running_loop()
+        anterior = self._ultimos.get(id_leilao)
+        vez = loop.create_future()
+        self._ultimos[id_leilao] = vez
+        try:
+            async with self._janela:
+                inicio = time.perf_counter()
+                try:
+                    await loop.run_in_executor(self._executor, self._funcao, id_usuario, assinatura_bytes)
+                    erro = None
+                except Exception as e:
+                    erro = e
+                if self.tempo_verificacao is not None:
+                    self.tempo_verificacao.observar(time.perf_counter() - inicio)
+            if anterior is not None:
+                await anterior
+            yield erro
+        finally:
+            vez.set_result(None)
+            if self._ultimos.get(id_leilao) is vez:
+                del self._ultimos[id_leilao]
+
+    def pendentes(self):
+        """Quantidade de leilões com lances aguardando verificação ou aplicação"""
+        return len(self._ultimos)
+
+    async def aguardar(self, id_leilao):
+        """Espera todos os lances já recebidos para o leilão serem aplicados"""
+        ultimo = self._ultimos.get(id_leilao)
+        if ultimo is not None:
+            await asyncio.shield(ultimo)
+
+    def encerrar(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,46 @@
+import os
+import zlib
+
+# Quantidade de instâncias do ms_lance dividindo os leilões (1 = modo sem shards)
+TOTAL_SHARDS = int(os.environ.get('LEILAO_SHARDS', '1'))
+
+
+def shard_do_leilao(id_leilao, total=None):
+    """Retorna o índice do shard dono do leilão
+
+    Usa jump consistent hash sobre o crc32 do id, então ao aumentar a quantidade
+    de shards apenas ~1/N dos leilões mudam de dono.
+    """
+    total = TOTAL_SHARDS if total is None else total
+    if total <= 1:
+        return 0
+
+    chave = zlib.crc32(str(id_leilao).encode('utf-8'))
+    b, j = -1, 0
+    while j < total:
+        b = j
+        chave = (chave * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((chave >> 33) + 1)))
+    return b
+
+
+def fila_do_shard(base, indice, total=None):
+    """Nome da fila de um shard; sem shards o nome original é mantido"""
+    total = TOTAL_SHARDS if total is None else total
+    if total <= 1:
+        return base
+    return f"{base}.{indice}"
+
+
+def fila_do_leilao(base, id_leilao, total=None):
+    """Nome da fila do shard dono do leilão"""
+    total = TOTAL_SHARDS if total is None else total
+    return fila_do_shard(base, shard_do_leilao(id_leilao, total), total)
+
+
+def filas_dos_shards(base, total=None):
+    """Nomes das filas de todos os shards"""
+    total = TOTAL_SHARDS if total is None else total
+    if total <= 1:
+        return [base]
+    return [fila_do_shard(base, i, total) for i in range(total)]
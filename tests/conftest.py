@@ -0,0 +1,16 @@
+import os
+import sys
+import shutil
+import tempfile
+
+# Os módulos são importados como nos scripts: src/, src/services/ e src/client/ no sys.path
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path[:0] = [os.path.join(RAIZ, 'services'), os.path.join(RAIZ, 'client'), RAIZ]
+
+# Os loggers dos serviços são criados na importação: os logs dos testes vão para um
+# diretório temporário, definido antes de qualquer módulo de teste ser importado
+LOG_DIR = os.environ['LEILAO_LOG_DIR'] = tempfile.mkdtemp(prefix='leilao_logs_')
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(LOG_DIR, ignore_errors=True)
@@ -0,0 +1,110 @@
+import asyncio
+
+from agendador import Agendador
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+class LoggerGravador:
+    def __init__(self):
+        self.erros = []
+
+    def error(self, message, *args):
+        self.erros.append(message % args)
+
+
+def test_executa_os_vencidos_em_ordem_de_prazo():
+    relogio = Relogio()
+    agendador = Agendador(relogio)
+    executados = []
+    for instante in (30, 10, 20, 10):
+        agendador.agendar(instante, executados.append, instante)
+    assert len(agendador) == 4
+    assert agendador.proximo() == 10
+
+    relogio.agora = 20
+    assert agendador.executar_vencidos() == 3
+    assert executados == [10, 10, 20]
+    assert agendador.proximo() == 30
+    assert len(agendador) == 1
+
+
+def test_cancelamento_preguicoso():
+    relogio = Relogio()
+    agendador = Agendador(relogio)
+    executados = []
+    primeiro = agendador.agendar(10, executados.append, 'primeiro')
+    agendador.agendar(20, executados.append, 'segundo')
+    agendador.cancelar(primeiro)
+    agendador.cancelar(primeiro)
+    assert len(agendador) == 1
+    # O cancelado ainda está no heap, mas não é o próximo nem é executado
+    assert agendador.proximo() == 20
+    relogio.agora = 100
+    assert agendador.executar_vencidos() == 1
+    assert executados == ['segundo']
+    assert agendador.proximo() is None
+
+
+def test_heap_compactado_com_muitos_cancelados():
+    agendador = Agendador(Relogio())
+    eventos = [agendador.agendar(i, print) for i in range(100)]
+    for evento in eventos[:60]:
+        agendador.cancelar(evento)
+    assert len(agendador) == 40
+    assert len(agendador._heap) < 100
+
+
+def test_reagendar_move_o_evento():
+    relogio = Relogio()
+    agendador = Agendador(relogio)
+    executados = []
+    evento = agendador.agendar(10, executados.append, 'fim')
+    novo = agendador.reagendar(evento, 50)
+    assert evento.cancelado and not novo.cancelado
+    relogio.agora = 10
+    assert agendador.executar_vencidos() == 0
+    relogio.agora = 50
+    assert agendador.executar_vencidos() == 1
+    assert executados == ['fim']
+
+
+def test_acao_com_erro_nao_impede_as_demais():
+    relogio = Relogio()
+    logger = LoggerGravador()
+    agendador = Agendador(relogio, logger)
+    executados = []
+
+    def quebrada():
+        raise RuntimeError('falhou')
+
+    agendador.agendar(1, executados.append, 'antes')
+    agendador.agendar(2, quebrada)
+    agendador.agendar(3, executados.append, 'depois')
+    relogio.agora = 3
+    assert agendador.executar_vencidos() == 3
+    assert executados == ['antes', 'depois']
+    assert len(logger.erros) == 1 and 'quebrada' in logger.erros[0]
+
+
+def test_laco_acorda_para_evento_mais_proximo():
+    executados = []
+
+    async def executar():
+        agendador = Agendador()
+        laco = asyncio.ensure_future(agendador.executar())
+        agendador.agendar(agendador.relogio() + 60, executados.append, 'tarde')
+        await asyncio.sleep(0.01)
+        # O laço está dormindo até o evento de 60s: o novo evento, mais próximo, o acorda
+        agendador.agendar(agendador.relogio() + 0.02, executados.append, 'cedo')
+        await asyncio.sleep(0.2)
+        laco.cancel()
+
+    asyncio.run(executar())
+    assert executados == ['cedo']
@@ -0,0 +1,129 @@
+import gzip
+import logging
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+import arquivos_log
+from arquivos_log import ArquivoRotativo, aplicar_retencao, comprimir, ler_intervalo
+
+# 1000 linhas, uma a cada 3 segundos a partir de 2025-10-01 14:00:00, com uma linha de
+# continuação (sem timestamp) a cada 100
+INICIO = datetime(2025, 10, 1, 14, 0, 0).timestamp()
+
+
+def _linhas(quantidade=1000, inicio=INICIO):
+    linhas = []
+    for i in range(quantidade):
+        data = datetime.fromtimestamp(inicio + 3 * i).strftime('%Y-%m-%d %H:%M:%S')
+        linhas.append(f'{data} - svc - INFO - linha {i}\n'.encode())
+        if i % 100 == 0:
+            linhas.append(f'  continuação {i}\n'.encode())
+    return linhas
+
+
+def _registrar(handler, quantidade, tamanho=100):
+    logger = logging.getLogger(f'teste_arquivos_log_{id(handler)}')
+    logger.propagate = False
+    logger.addHandler(handler)
+    for i in range(quantidade):
+        logger.warning('%d %s', i, 'x' * tamanho)
+    logger.removeHandler(handler)
+
+
+def test_rotacao_por_tamanho_comprime_em_fundo(tmp_path):
+    handler = ArquivoRotativo(str(tmp_path), 'svc', max_bytes=2000)
+    _registrar(handler, 50)
+    handler.aguardar_compressoes()
+    handler.close()
+
+    nomes = sorted(os.listdir(tmp_path))
+    hoje = datetime.now().strftime('%Y%m%d')
+    assert f'svc_{hoje}.log' in nomes
+    comprimidos = [nome for nome in nomes if nome.endswith('.log.gz')]
+    assert len(comprimidos) >= 2
+    assert all(nome + '.idx' in nomes for nome in comprimidos)
+    # Os rotacionados só existem comprimidos
+    assert not [nome for nome in nomes if nome.endswith('.log') and nome != f'svc_{hoje}.log']
+
+    # Todas as linhas, na ordem, entre os comprimidos e o atual
+    conteudo = b''.join(gzip.open(tmp_path / nome).read() for nome in comprimidos)
+    conteudo += (tmp_path / f'svc_{hoje}.log').read_bytes()
+    assert [int(linha.split()[0]) for linha in conteudo.splitlines()] == list(range(50))
+
+
+def test_rotacao_na_virada_do_dia(tmp_path):
+    handler = ArquivoRotativo(str(tmp_path), 'svc')
+    _registrar(handler, 1)
+    # Simula um arquivo aberto ontem com a virada já vencida
+    handler._data = '20200101'
+    handler._proxima_virada = 0
+    _registrar(handler, 1)
+    handler.aguardar_compressoes()
+    handler.close()
+    assert 'svc_20200101.001.log.gz' in os.listdir(tmp_path)
+
+
+def test_comprimir_em_blocos_com_indice(tmp_path, monkeypatch):
+    monkeypatch.setattr(arquivos_log, 'TAMANHO_BLOCO', 4096)
+    caminho = tmp_path / 'svc_20251001.001.log'
+    linhas = _linhas()
+    caminho.write_bytes(b''.join(linhas))
+
+    destino = comprimir(str(caminho))
+    assert destino == str(caminho) + '.gz'
+    assert not caminho.exists()
+    # Vários membros gzip independentes, legíveis como um único arquivo
+    assert gzip.open(destino).read() == b''.join(linhas)
+    quantidade = arquivos_log._CABECALHO.unpack_from(open(destino + '.idx', 'rb').read())[1]
+    assert quantidade > 5
+
+
+def test_ler_intervalo_nos_comprimidos_e_no_atual(tmp_path, monkeypatch):
+    monkeypatch.setattr(arquivos_log, 'TAMANHO_BLOCO', 4096)
+    linhas = _linhas()
+    (tmp_path / 'svc_20251001.001.log').write_bytes(b''.join(linhas[:600]))
+    comprimir(str(tmp_path / 'svc_20251001.001.log'))
+    (tmp_path / 'svc_20251001.log').write_bytes(b''.join(linhas[600:]))
+
+    # Linhas 400 a 700: atravessa a fronteira entre o comprimido e o atual
+    lidas = list(ler_intervalo(str(tmp_path), 'svc', INICIO + 3 * 400, INICIO + 3 * 700))
+    # Do lance 400 ao 700, com as linhas de continuação (sem timestamp) que os acompanham
+    primeira = linhas.index(next(linha for linha in linhas if linha.endswith(b'linha 400\n')))
+    ultima = linhas.index(next(linha for linha in linhas if linha.endswith(b'linha 700\n')))
+    esperadas = linhas[primeira:ultima + 2]
+    assert esperadas[-1] == '  continuação 700\n'.encode()
+    assert lidas == esperadas
+
+    assert list(ler_intervalo(str(tmp_path), 'svc', INICIO - 100, INICIO - 10)) == []
+
+
+def test_retencao_por_idade_e_tamanho(tmp_path):
+    for seq in range(1, 5):
+        caminho = tmp_path / f'svc_20251001.{seq:03d}.log.gz'
+        caminho.write_bytes(b'x' * 100)
+        (tmp_path / f'svc_20251001.{seq:03d}.log.gz.idx').write_bytes(b'')
+    antigo = time.time() - 10 * 86400
+    os.utime(tmp_path / 'svc_20251001.001.log.gz', (antigo, antigo))
+
+    removidos = aplicar_retencao(str(tmp_path), 'svc', dias=5, max_bytes=250)
+    assert [os.path.basename(caminho) for caminho in removidos] == [
+        'svc_20251001.001.log.gz', 'svc_20251001.002.log.gz']
+    assert sorted(os.listdir(tmp_path)) == [
+        'svc_20251001.003.log.gz', 'svc_20251001.003.log.gz.idx',
+        'svc_20251001.004.log.gz', 'svc_20251001.004.log.gz.idx']
+
+
+def test_retencao_ignora_arquivo_removido_durante_a_listagem(tmp_path, monkeypatch):
+    (tmp_path / 'svc_20251001.002.log.gz').write_bytes(b'x' * 100)
+    listar = arquivos_log._arquivos_do_servico
+
+    def listar_com_removido(diretorio, servico):
+        # Outra thread de compressão apagou o .001 depois da listagem
+        return [('20251001', 1, 'svc_20251001.001.log.gz')] + listar(diretorio, servico)
+
+    monkeypatch.setattr(arquivos_log, '_arquivos_do_servico', listar_com_removido)
+    assert aplicar_retencao(str(tmp_path), 'svc', dias=5, max_bytes=50) == [
+        str(tmp_path / 'svc_20251001.002.log.gz')]
@@ -0,0 +1,144 @@
+import os
+import json
+import random
+
+import pytest
+
+import catalogo
+from catalogo import CatalogoProdutos, construir_indice, converter_para_jsonl
+
+PRODUTOS = [{"id": i, "nome": f"Produto {i}", "descricao": "Item leiloado ção" * (i % 4)}
+            for i in range(1, 201)]
+
+
+@pytest.fixture
+def catalogo_jsonl(tmp_path):
+    caminho = tmp_path / 'produtos.jsonl'
+    with open(caminho, 'w', encoding='utf-8') as f:
+        for produto in PRODUTOS:
+            f.write(json.dumps(produto, ensure_ascii=False) + '\n')
+        # Linhas em branco não são produtos
+        f.write('\n')
+    return str(caminho)
+
+
+@pytest.fixture
+def catalogo_json(tmp_path, monkeypatch):
+    # Blocos pequenos: os itens atravessam a fronteira entre as leituras
+    monkeypatch.setattr(catalogo, '_TAMANHO_BLOCO', 64)
+    caminho = tmp_path / 'leiloes_data.json'
+    caminho.write_text(json.dumps({"leiloes": PRODUTOS}, ensure_ascii=False, indent=2), encoding='utf-8')
+    return str(caminho)
+
+
+def test_construir_indice(catalogo_jsonl):
+    caminho_indice = construir_indice(catalogo_jsonl)
+    assert caminho_indice == catalogo_jsonl + '.idx'
+    with open(caminho_indice, 'rb') as f:
+        assinatura, quantidade, tamanho, _ = catalogo._CABECALHO.unpack(f.read(catalogo._CABECALHO.size))
+        resto = f.read()
+    assert assinatura == catalogo._ASSINATURA
+    assert quantidade == len(PRODUTOS)
+    assert tamanho == os.path.getsize(catalogo_jsonl)
+    # Offsets, hashes e offsets por hash, 8 bytes cada
+    assert len(resto) == 3 * 8 * len(PRODUTOS)
+
+
+def test_obter_pelo_indice(catalogo_jsonl):
+    produtos = CatalogoProdutos(catalogo_jsonl)
+    try:
+        assert produtos._hashes is not None
+        assert len(produtos) == len(PRODUTOS)
+        for produto in PRODUTOS:
+            assert produtos.obter(produto['id']) == produto
+        # O id pode chegar como texto (ex.: de um comando JSON)
+        assert produtos.obter('7') == PRODUTOS[6]
+        assert produtos.obter(999) is None
+    finally:
+        produtos.fechar()
+
+
+def test_obter_com_colisao_de_hash(catalogo_jsonl, monkeypatch):
+    # Todos os ids com o mesmo hash: obter() confere o id de cada candidato
+    monkeypatch.setattr(catalogo, '_hash_id', lambda id_produto: 42)
+    produtos = CatalogoProdutos(catalogo_jsonl)
+    try:
+        assert produtos.obter(150) == PRODUTOS[149]
+        assert produtos.obter(999) is None
+    finally:
+        produtos.fechar()
+
+
+def test_amostra_pelo_indice(catalogo_jsonl):
+    produtos = CatalogoProdutos(catalogo_jsonl)
+    try:
+        sorteados = produtos.amostra(10, random.Random(1))
+        assert len(sorteados) == 10
+        assert len({produto['id'] for produto in sorteados}) == 10
+        assert all(produto in PRODUTOS for produto in sorteados)
+        # Mais do que o catálogo tem: todos, sem repetição
+        assert sorted(p['id'] for p in produtos.amostra(500)) == [p['id'] for p in PRODUTOS]
+    finally:
+        produtos.fechar()
+
+
+def test_indice_refeito_quando_o_catalogo_muda(catalogo_jsonl):
+    CatalogoProdutos(catalogo_jsonl).fechar()
+    with open(catalogo_jsonl, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"id": 201, "nome": "Novo"}) + '\n')
+
+    produtos = CatalogoProdutos(catalogo_jsonl)
+    try:
+        assert len(produtos) == len(PRODUTOS) + 1
+        assert produtos.obter(201) == {"id": 201, "nome": "Novo"}
+    finally:
+        produtos.fechar()
+
+
+def test_catalogo_jsonl_vazio(tmp_path):
+    caminho = tmp_path / 'vazio.jsonl'
+    caminho.write_bytes(b'')
+    produtos = CatalogoProdutos(str(caminho))
+    assert len(produtos) == 0
+    assert produtos.amostra(3) == []
+    assert produtos.obter(1) is None
+    produtos.fechar()
+
+
+def test_catalogo_json_em_streaming(catalogo_json):
+    produtos = CatalogoProdutos(catalogo_json)
+    assert produtos._hashes is None
+    assert list(produtos) == PRODUTOS
+    assert len(produtos) == len(PRODUTOS)
+    assert produtos.obter(123) == PRODUTOS[122]
+    assert produtos.obter('123') == PRODUTOS[122]
+    assert produtos.obter(999) is None
+
+    # Reservoir sampling: k produtos distintos do catálogo
+    sorteados = produtos.amostra(10, random.Random(1))
+    assert len({produto['id'] for produto in sorteados}) == 10
+    assert all(produto in PRODUTOS for produto in sorteados)
+    assert len(produtos.amostra(500)) == len(PRODUTOS)
+    produtos.fechar()
+
+
+def test_array_no_topo_e_json_truncado(tmp_path, monkeypatch):
+    monkeypatch.setattr(catalogo, '_TAMANHO_BLOCO', 16)
+    caminho = tmp_path / 'lista.json'
+    caminho.write_text(json.dumps(PRODUTOS[:5]), encoding='utf-8')
+    assert list(CatalogoProdutos(str(caminho))) == PRODUTOS[:5]
+
+    caminho.write_text(json.dumps(PRODUTOS[:5])[:-30], encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(CatalogoProdutos(str(caminho)))
+
+
+def test_converter_para_jsonl(catalogo_json, tmp_path):
+    destino = str(tmp_path / 'convertido.jsonl')
+    assert converter_para_jsonl(catalogo_json, destino) == len(PRODUTOS)
+    produtos = CatalogoProdutos(destino)
+    try:
+        assert list(produtos) == PRODUTOS
+        assert produtos.obter(200) == PRODUTOS[199]
+    finally:
+        produtos.fechar()
@@ -0,0 +1,64 @@
+import pytest
+
+client_window = pytest.importorskip('client_window')
+
+
+@pytest.mark.parametrize('max_linhas_log', [0, -1, 2.5])
+def test_limite_do_log_invalido(max_linhas_log):
+    with pytest.raises(ValueError):
+        client_window.ClienteGUI('cliente_1', None, {}, set(), max_linhas_log=max_linhas_log)
+
+
+class TextoFalso:
+    """Imita os índices 'linha.coluna' do tk.Text usados pelo log de atividades"""
+
+    def __init__(self):
+        self.texto = ''
+
+    def config(self, **opcoes):
+        pass
+
+    def see(self, indice):
+        pass
+
+    def insert(self, indice, texto):
+        assert indice == 'end'
+        self.texto += texto
+
+    def index(self, indice):
+        assert indice == 'end-1c'
+        linhas = self.texto.split('\n')
+        return f'{len(linhas)}.{len(linhas[-1])}'
+
+    def delete(self, inicio, fim):
+        assert inicio == '1.0' and fim.endswith('.0')
+        self.texto = '\n'.join(self.texto.split('\n')[int(fim.split('.')[0]) - 1:])
+
+
+def criar_log(max_linhas_log):
+    # Só a parte do log da janela, sem abrir o Tk
+    janela = client_window.ClienteGUI.__new__(client_window.ClienteGUI)
+    janela.max_linhas_log = max_linhas_log
+    janela.log_pendente = client_window.collections.deque(maxlen=max_linhas_log)
+    janela.log_lock = client_window.threading.Lock()
+    janela.historico_log = None
+    janela.processando = True
+    janela.log_text = TextoFalso()
+    return janela
+
+
+def test_log_limitado_em_linhas_com_mensagens_de_varias_linhas():
+    janela = criar_log(5)
+    for i in range(3):
+        janela.log_message(f'mensagem {i}\ndetalhe {i}')
+    janela.descarregar_log()
+    linhas = janela.log_text.texto.splitlines()
+    assert len(linhas) == 5
+    assert linhas[-1].endswith('detalhe 2')
+    assert linhas[0] == 'detalhe 0'
+
+    janela.log_message('última')
+    janela.descarregar_log()
+    linhas = janela.log_text.texto.splitlines()
+    assert len(linhas) == 5
+    assert linhas[-1].endswith('última')
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import pytest
+
+from protocolo import decodificar
+from servicos import carregar_ms_lance
+
+
+class RuntimeGravador:
+    def __init__(self):
+        self.publicadas = []
+
+    def publicar(self, exchange, routing_key, body, properties=None):
+        self.publicadas.append((routing_key, body, properties))
+
+    def ao_iniciar(self, preparar):
+        pass
+
+    def ao_encerrar(self, finalizar):
+        pass
+
+
+@pytest.fixture
+def iniciar_ms_lance(tmp_path, monkeypatch):
+    """Sobe (ou reinicia) um ms_lance com o diário em tmp_path"""
+    monkeypatch.setenv('MS_LANCE_DIARIO', str(tmp_path))
+    monkeypatch.setenv('MS_LANCE_DIARIO_SNAPSHOT', '3')
+    instancias = []
+
+    def iniciar():
+        if instancias:
+            instancias[-1].encerrar()
+        modulo = carregar_ms_lance(0)
+        modulo.registrar(RuntimeGravador())
+        instancias.append(modulo)
+        return modulo
+
+    yield iniciar
+    instancias[-1].encerrar()
+
+
+def _finalizar(modulo, id_leilao):
+    asyncio.run(modulo.callback_leilao_finalizado(None, None, None, json.dumps({'id_leilao': id_leilao}).encode()))
+    _, body, propriedades = modulo.runtime.publicadas[-1]
+    vencedor = decodificar(('vencedor', 'vencedores'), propriedades, body)
+    return vencedor['id_usuario'], vencedor['valor_do_lance']
+
+
+def test_leiloes_encerrados_saem_do_estado_e_do_snapshot(iniciar_ms_lance, tmp_path):
+    ms_lance = iniciar_ms_lance()
+    for i in range(1, 6):
+        ms_lance.aplicar_lance('encerrado', f'u{i}', 100.0 + i, None)
+    ms_lance.aplicar_lance('aberto', 'u1', 50.0, None)
+    assert _finalizar(ms_lance, 'encerrado') == ('u5', 105.0)
+    assert 'encerrado' not in ms_lance.ultimos_lances
+
+    # Lance atrasado recusado e finalização repetida com o mesmo resultado
+    ms_lance.aplicar_lance('encerrado', 'u9', 500.0, None)
+    assert 'encerrado' not in ms_lance.ultimos_lances
+    assert _finalizar(ms_lance, 'encerrado') == ('u5', 105.0)
+
+    # Snapshot depois do encerramento: só o leilão aberto
+    ms_lance.aplicar_lance('aberto', 'u2', 60.0, None)
+    ms_lance.aplicar_lance('aberto', 'u3', 70.0, None)
+    ms_lance.aplicar_lance('aberto', 'u4', 80.0, None)
+    snapshot = json.loads((tmp_path / 'snapshot.json').read_text())
+    assert set(snapshot['lances']) == {'aberto'}
+
+    reiniciado = iniciar_ms_lance()
+    assert reiniciado.ultimos_lances == {'aberto': {'valor_do_lance': 80.0, 'id_usuario': 'u4'}}
+
+
+def test_encerramento_no_diario_vale_no_reinicio(iniciar_ms_lance):
+    ms_lance = iniciar_ms_lance()
+    ms_lance.aplicar_lance('leilao', 'u1', 100.0, None)
+    _finalizar(ms_lance, 'leilao')
+
+    reiniciado = iniciar_ms_lance()
+    assert reiniciado.ultimos_lances == {}
+    assert reiniciado.encerrados == {'leilao': [('u1', 100.0)]}
+
+
+def _iniciar_leilao(modulo, id_leilao):
+    modulo.callback_inicio_leilao(None, None, None, json.dumps({'id_leilao': id_leilao}).encode())
+
+
+def test_id_reutilizado_por_um_novo_leilao(iniciar_ms_lance):
+    ms_lance = iniciar_ms_lance()
+    ms_lance.aplicar_lance('leilao_01', 'a', 150.0, None)
+    assert _finalizar(ms_lance, 'leilao_01') == ('a', 150.0)
+
+    # O ms_leilao reiniciado volta a criar leilao_01
+    _iniciar_leilao(ms_lance, 'leilao_01')
+    ms_lance.aplicar_lance('leilao_01', 'b', 500.0, None)
+    assert ms_lance.ultimos_lances['leilao_01'] == {'valor_do_lance': 500.0, 'id_usuario': 'b'}
+
+    # A reabertura também vale depois de um reinício do ms_lance
+    reiniciado = iniciar_ms_lance()
+    assert 'leilao_01' not in reiniciado.encerrados
+    assert _finalizar(reiniciado, 'leilao_01') == ('b', 500.0)
+
+
+def test_encerrados_no_snapshot(iniciar_ms_lance, tmp_path):
+    ms_lance = iniciar_ms_lance()
+    ms_lance.aplicar_lance('encerrado', 'u1', 100.0, None)
+    _finalizar(ms_lance, 'encerrado')
+    # Três registros depois do encerramento geram o snapshot e apagam o diário anterior
+    for i in range(3):
+        ms_lance.aplicar_lance('aberto', f'u{i}', 10.0 + i, None)
+    snapshot = json.loads((tmp_path / 'snapshot.json').read_text())
+    assert snapshot['encerrados'] == [['encerrado', [['u1', 100.0]]]]
+
+    reiniciado = iniciar_ms_lance()
+    reiniciado.aplicar_lance('encerrado', 'u2', 900.0, None)
+    assert 'encerrado' not in reiniciado.ultimos_lances
+    assert _finalizar(reiniciado, 'encerrado') == ('u1', 100.0)
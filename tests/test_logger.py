@@ -0,0 +1,23 @@
+import glob
+import logging
+import os
+
+from logger import create_logger
+
+
+def test_modo_assincrono_nao_altera_o_logging_do_processo():
+    antes = (logging._srcfile, logging.logThreads, logging.logProcesses, logging.logMultiprocessing)
+    logger = create_logger('teste_logger_assincrono', assincrono=True)
+    try:
+        logger.log_lance_recebido('leilao_01', 'u1', 150.0)
+    finally:
+        logger.fechar()
+    assert (logging._srcfile, logging.logThreads, logging.logProcesses, logging.logMultiprocessing) == antes
+
+    arquivos = glob.glob(os.path.join(logger.log_dir, 'teste_logger_assincrono_*.log'))
+    try:
+        conteudo = ''.join(open(arquivo, encoding='utf-8').read() for arquivo in arquivos)
+        assert 'LANCE RECEBIDO - Leilão: leilao_01, Usuário: u1, Valor: R$150.0' in conteudo
+    finally:
+        for arquivo in arquivos:
+            os.remove(arquivo)
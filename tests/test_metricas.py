@@ -0,0 +1,53 @@
+import pika
+
+import metricas
+import rastreamento
+from protocolo import codificar
+
+
+def _propriedades():
+    return pika.BasicProperties(
+        content_type='application/json', delivery_mode=2, correlation_id='c1', reply_to='r1',
+        message_id='m1', priority=5, expiration='1000', app_id='leilao', headers={'existente': 1})
+
+
+def _campos(properties):
+    return {campo: getattr(properties, campo) for campo in (
+        'content_type', 'delivery_mode', 'correlation_id', 'reply_to', 'message_id',
+        'priority', 'expiration', 'app_id')}
+
+
+def test_carimbar_preserva_todas_as_propriedades(monkeypatch):
+    monkeypatch.setattr(metricas, 'CARIMBO', True)
+    original = _propriedades()
+    carimbadas = metricas.carimbar(original)
+    assert _campos(carimbadas) == _campos(original)
+    assert carimbadas.headers['existente'] == 1
+    assert 'ts_envio' in carimbadas.headers
+    assert original.headers == {'existente': 1}
+
+
+def test_propagar_preserva_todas_as_propriedades():
+    original = _propriedades()
+    propagadas = rastreamento.propagar(original, ('t1', {'cliente': 1.0}), 'ms_lance', trace_ids=['t1'])
+    assert _campos(propagadas) == _campos(original)
+    assert propagadas.headers['existente'] == 1
+    assert propagadas.headers['trace_id'] == 't1'
+    assert propagadas.headers['trace_ids'] == ['t1']
+    assert set(propagadas.headers['saltos']) == {'cliente', 'ms_lance'}
+
+
+def test_propriedades_compartilhadas_de_codificar_nao_mudam(monkeypatch):
+    monkeypatch.setattr(metricas, 'CARIMBO', True)
+    _, propriedades = codificar('fim', {'id_leilao': 'a', 'id_vencedor': 'u', 'valor_negociado': 1.0})
+    metricas.carimbar(propriedades)
+    assert not propriedades.headers
+
+
+def test_valores_de_rotulos_escapados():
+    registro = metricas.Registro()
+    contador = registro.contador('teste_total', 'Ajuda com \\ e\nquebra', ('motivo',))
+    contador.rotulos('aspas " barra \\ linha\nnova').inc()
+    texto = registro.texto()
+    assert 'teste_total{motivo="aspas \\" barra \\\\ linha\\nnova"} 1' in texto
+    assert '# HELP teste_total Ajuda com \\\\ e\\nquebra' in texto
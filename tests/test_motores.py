@@ -0,0 +1,59 @@
+import pytest
+
+from motores import MotorAscendente, MotorFechado
+
+
+def test_ascendente_recusa_primeiro_lance_nao_positivo():
+    motor = MotorAscendente()
+    assert motor.oferecer('a', 'u1', -5.0) == "Valor insuficiente"
+    assert motor.oferecer('a', 'u1', 0.0) == "Valor insuficiente"
+    assert motor.encerrar('a') == []
+
+
+def test_ascendente_exige_lance_maior_que_o_ultimo():
+    motor = MotorAscendente()
+    assert motor.oferecer('a', 'u1', 10.0) is None
+    assert motor.oferecer('a', 'u2', 10.0) == "Valor insuficiente"
+    assert motor.oferecer('a', 'u2', 12.5) is None
+    assert motor.cotacao('a') == 12.5
+    assert motor.encerrar('a') == [('u2', 12.5)]
+
+
+def test_ascendente_tem_uma_unica_unidade():
+    with pytest.raises(ValueError):
+        MotorAscendente().abrir('a', 2)
+
+
+def test_fechado_recusa_lance_nao_positivo():
+    motor = MotorFechado()
+    motor.abrir('f', 1)
+    assert motor.oferecer('f', 'u1', -5.0) == "Valor insuficiente"
+    assert motor.encerrar('f') == []
+
+
+def test_fechado_um_lance_por_usuario_e_apos_o_fim():
+    motor = MotorFechado()
+    motor.abrir('f', 1)
+    assert motor.oferecer('f', 'u1', 10.0) is None
+    assert motor.oferecer('f', 'u1', 20.0) == "Usuário já deu lance"
+    motor.encerrar('f')
+    assert motor.oferecer('f', 'u2', 30.0) == "Leilão encerrado"
+
+
+def test_fechado_k_maiores_lances_com_desempate_pela_chegada():
+    motor = MotorFechado()
+    motor.abrir('f', 3)
+    for usuario, valor in [('u1', 10.0), ('u2', 50.0), ('u3', 30.0), ('u4', 30.0), ('u5', 20.0)]:
+        assert motor.oferecer('f', usuario, valor) is None
+    assert motor.encerrar('f') == [('u2', 50.0), ('u3', 30.0), ('u4', 30.0)]
+    assert len(motor) == 0
+
+
+def test_fechado_estado_restaura_a_ordem_de_chegada():
+    motor = MotorFechado()
+    motor.abrir('f', 1)
+    motor.oferecer('f', 'u1', 30.0)
+    motor.oferecer('f', 'u2', 30.0)
+    restaurado = MotorFechado()
+    restaurado.restaurar(motor.estado())
+    assert restaurado.encerrar('f') == [('u1', 30.0)]
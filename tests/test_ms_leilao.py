@@ -0,0 +1,104 @@
+import asyncio
+import datetime
+import itertools
+import collections
+import json
+
+import pika
+import pytest
+
+import ms_leilao
+from agendador import Agendador
+
+
+@pytest.fixture(autouse=True)
+def estado_do_ms_leilao(monkeypatch):
+    """Catálogo, ids e agendador vazios em cada teste (são globais do módulo)"""
+    monkeypatch.setattr(ms_leilao, 'leiloes', {})
+    monkeypatch.setattr(ms_leilao, 'leiloes_por_status', collections.defaultdict(dict))
+    monkeypatch.setattr(ms_leilao, '_contador_ids', itertools.count(1))
+    monkeypatch.setattr(ms_leilao, 'agendador', Agendador(logger=ms_leilao.logger))
+
+
+class RuntimeGravador:
+    """Guarda as mensagens publicadas em vez de enviá-las"""
+
+    def __init__(self):
+        self.publicadas = []
+
+    def publicar(self, exchange, routing_key, body, properties=None):
+        self.publicadas.append((exchange, routing_key, body, properties))
+
+
+def _comando(body, monkeypatch):
+    runtime = RuntimeGravador()
+    monkeypatch.setattr(ms_leilao, 'runtime', runtime)
+    propriedades = pika.BasicProperties(reply_to='respostas', correlation_id='42')
+    asyncio.run(ms_leilao.callback_comando(None, None, propriedades, body))
+    assert len(runtime.publicadas) == 1
+    _, fila, corpo, propriedades_resposta = runtime.publicadas[0]
+    assert fila == 'respostas'
+    assert propriedades_resposta.correlation_id == '42'
+    return json.loads(corpo)
+
+
+def test_comando_com_json_invalido_responde_erro(monkeypatch):
+    resposta = _comando(b'{"comando": "listar"', monkeypatch)
+    assert resposta['ok'] is False
+    assert 'erro' in resposta
+
+
+def test_comando_que_nao_e_utf8_responde_erro(monkeypatch):
+    resposta = _comando(b'\xff\xfe', monkeypatch)
+    assert resposta['ok'] is False
+
+
+def test_comando_desconhecido_responde_erro(monkeypatch):
+    resposta = _comando(json.dumps({'comando': 'apagar_tudo'}).encode(), monkeypatch)
+    assert resposta == {'ok': False, 'erro': "Comando desconhecido: 'apagar_tudo'"}
+
+
+def test_criar_recusa_tipo_desconhecido(monkeypatch):
+    resposta = _comando(json.dumps({'comando': 'criar', 'descricao': 'Relógio',
+                                    'tipo': 'holandes'}).encode(), monkeypatch)
+    assert resposta['ok'] is False
+    assert 'tipo inválido' in resposta['erro']
+
+
+def test_criar_leilao_fechado_com_unidades(monkeypatch):
+    resposta = _comando(json.dumps({'comando': 'criar', 'descricao': 'Ingressos', 'inicio_em': 600,
+                                    'tipo': 'fechado', 'unidades': 10}).encode(), monkeypatch)
+    assert resposta['ok'] is True
+    leilao = ms_leilao.leiloes[resposta['ids'][0]]
+    assert (leilao['tipo'], leilao['unidades']) == ('fechado', 10)
+
+
+def test_horario_com_fuso_vira_horario_local(monkeypatch):
+    agora = datetime.datetime.now()
+    inicio = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)).isoformat()
+    fim = (agora + datetime.timedelta(hours=2)).isoformat()
+    resposta = _comando(json.dumps({'comando': 'criar', 'descricao': 'Relógio',
+                                    'data_inicio': inicio, 'data_fim': fim}).encode(), monkeypatch)
+    assert resposta['ok'] is True
+    leilao = ms_leilao.leiloes[resposta['ids'][0]]
+    assert leilao['data_inicio'].tzinfo is None
+    assert abs((leilao['data_inicio'] - agora).total_seconds() - 3600) < 60
+
+    # Comparável com os demais horários do catálogo e com datetime.now()
+    assert _comando(json.dumps({'comando': 'listar'}).encode(), monkeypatch)['ok'] is True
+    ms_leilao.iniciar_leilao(leilao)
+
+
+def test_comando_que_nao_e_texto_responde_erro(monkeypatch):
+    resposta = _comando(json.dumps({'comando': []}).encode(), monkeypatch)
+    assert resposta == {'ok': False, 'erro': "Comando desconhecido: []"}
+
+
+def test_erro_inesperado_no_comando_responde_erro(monkeypatch):
+    async def quebrado(dados):
+        raise KeyError('campo')
+
+    monkeypatch.setitem(ms_leilao.COMANDOS, 'listar', quebrado)
+    resposta = _comando(json.dumps({'comando': 'listar'}).encode(), monkeypatch)
+    assert resposta['ok'] is False
+    assert 'Erro interno' in resposta['erro']
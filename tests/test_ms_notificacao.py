@@ -0,0 +1,41 @@
+import asyncio
+
+import ms_notificacao
+from protocolo import codificar, decodificar
+
+
+class RuntimeLento:
+    """Declara filas com atraso (a primeira declaração é a mais rápida) e guarda as publicações"""
+
+    def __init__(self):
+        self.publicadas = []
+        self.atrasos = [0.01, 0.05]
+
+    async def declarar_fila(self, fila='', **opcoes):
+        await asyncio.sleep(self.atrasos.pop(0) if self.atrasos else 0)
+        return fila
+
+    def publicar(self, exchange, routing_key, body, properties=None):
+        self.publicadas.append(decodificar('lance_validado', properties, body)['valor_do_lance'])
+
+
+def test_lances_publicados_na_ordem_de_chegada_durante_a_declaracao(monkeypatch):
+    runtime = RuntimeLento()
+    monkeypatch.setattr(ms_notificacao, 'runtime', runtime)
+    monkeypatch.setattr(ms_notificacao, 'filas_declaradas', {})
+    monkeypatch.setattr(ms_notificacao, 'JANELA_MS', 0)
+
+    def lance(valor):
+        body, propriedades = codificar('lance_validado', {
+            'id_leilao': 'leilao_01', 'id_usuario': 'u1', 'valor_do_lance': valor})
+        return ms_notificacao.callback_lance_validado(None, None, propriedades, body)
+
+    async def executar():
+        # 100 e 200 chegam durante a declaração; 300 e 400, depois que a primeira terminou
+        tarefas = [asyncio.ensure_future(lance(100.0)), asyncio.ensure_future(lance(200.0))]
+        await asyncio.sleep(0.02)
+        tarefas += [asyncio.ensure_future(lance(300.0)), asyncio.ensure_future(lance(400.0))]
+        await asyncio.gather(*tarefas)
+
+    asyncio.run(executar())
+    assert runtime.publicadas == [100.0, 200.0, 300.0, 400.0]
@@ -0,0 +1,82 @@
+import math
+
+import pytest
+
+from protocolo import (codificar, decodificar, ErroFormato, ModeloLance, ESQUEMAS,
+                       CONTENT_TYPE_BINARIO, CONTENT_TYPE_JSON, TAMANHO_MAXIMO)
+
+LANCES = [{'id_usuario': 'u1', 'valor_do_lance': 300.0}, {'id_usuario': 'ü2', 'valor_do_lance': 250.5}]
+
+MENSAGENS = {
+    'lance': {'id_leilao': 'leilao_01', 'id_usuario': 'u1', 'valor_do_lance': 150.25,
+              'assinatura': bytes(range(256))},
+    'lance_validado': {'id_leilao': 'leilao_01', 'id_usuario': 'u1', 'valor_do_lance': 150.25},
+    'vencedor': {'id_leilao': 'leilao_01', 'id_usuario': 'u1', 'valor_do_lance': 150.25},
+    'fim': {'id_leilao': 'leilao_01', 'id_vencedor': 'u1', 'valor_negociado': 150.25},
+    'lote_lances': {'id_leilao': 'leilao_01', 'id_usuario': 'ü2', 'valor_do_lance': 250.5, 'lances': LANCES},
+    'vencedores': {'id_leilao': 'leilao_01', 'id_usuario': 'u1', 'valor_do_lance': 300.0, 'vencedores': LANCES},
+    'fim_vencedores': {'id_leilao': 'leilao_01', 'id_vencedor': 'u1', 'valor_negociado': 300.0,
+                       'vencedores': LANCES},
+}
+
+
+def test_todos_os_tipos_tem_mensagem_de_exemplo():
+    assert set(MENSAGENS) == set(ESQUEMAS)
+
+
+@pytest.mark.parametrize('formato', ['json', 'binario'])
+@pytest.mark.parametrize('tipo', sorted(MENSAGENS))
+def test_ida_e_volta(tipo, formato):
+    body, propriedades = codificar(tipo, MENSAGENS[tipo], formato)
+    assert propriedades.content_type == (CONTENT_TYPE_BINARIO if formato == 'binario' else CONTENT_TYPE_JSON)
+    assert decodificar(tipo, propriedades, body) == MENSAGENS[tipo]
+
+
+@pytest.mark.parametrize('tipo', sorted(MENSAGENS))
+def test_binario_truncado(tipo):
+    body, propriedades = codificar(tipo, MENSAGENS[tipo], 'binario')
+    for tamanho in (0, 1, 2, len(body) // 2, len(body) - 1):
+        with pytest.raises(ErroFormato):
+            decodificar(tipo, propriedades, body[:tamanho])
+
+
+def test_binario_de_outro_tipo():
+    body, propriedades = codificar('vencedor', MENSAGENS['vencedor'], 'binario')
+    with pytest.raises(ErroFormato, match='Esperava'):
+        decodificar('lance', propriedades, body)
+    assert decodificar(('lance_validado', 'vencedor'), propriedades, body) == MENSAGENS['vencedor']
+
+
+def test_campo_com_tipo_errado():
+    with pytest.raises(ErroFormato):
+        codificar('lance', {**MENSAGENS['lance'], 'valor_do_lance': 'cem'}, 'binario')
+    with pytest.raises(ErroFormato):
+        codificar('lance', {**MENSAGENS['lance'], 'assinatura': 5}, 'binario')
+    with pytest.raises(ErroFormato):
+        codificar('vencedor', {'id_leilao': 'leilao_01'}, 'binario')
+    # JSON válido que não é um objeto, ou assinatura que não está em base64
+    _, propriedades = codificar('lance', MENSAGENS['lance'], 'json')
+    with pytest.raises(ErroFormato):
+        decodificar('lance', propriedades, b'[1, 2]')
+    with pytest.raises(ErroFormato):
+        decodificar('lance', propriedades, b'{"assinatura": "abc"}')
+
+
+def test_lista_acima_do_limite_do_binario_vai_em_json():
+    vencedores = [{'id_usuario': f'u{i}', 'valor_do_lance': float(i)} for i in range(TAMANHO_MAXIMO + 1)]
+    mensagem = {**MENSAGENS['vencedores'], 'vencedores': vencedores}
+    body, propriedades = codificar('vencedores', mensagem, 'binario')
+    assert propriedades.content_type == CONTENT_TYPE_JSON
+    assert decodificar('vencedores', propriedades, body) == mensagem
+
+
+@pytest.mark.parametrize('formato', ['json', 'binario'])
+def test_modelo_lance(formato):
+    modelo = ModeloLance('leilao_01', 'u1', b'\x00assinatura', formato)
+    body = modelo.montar(123.5)
+    esperado, _ = codificar('lance', {'id_leilao': 'leilao_01', 'id_usuario': 'u1', 'valor_do_lance': 123.5,
+                                      'assinatura': b'\x00assinatura'}, formato)
+    assert decodificar('lance', modelo.properties, body) == decodificar('lance', modelo.properties, esperado)
+    for valor in (math.nan, math.inf, -math.inf):
+        with pytest.raises(ValueError):
+            modelo.montar(valor)
@@ -0,0 +1,86 @@
+import asyncio
+import collections
+
+import shards
+from logger import create_logger
+from protocolo import codificar, decodificar
+from runtime import RuntimeLocal
+from servicos import carregar_ms_lance
+
+TOTAL = 3
+LEILOES = [f'leilao_{i:02d}' for i in range(12)]
+LANCES_POR_LEILAO = 20
+
+
+def test_cada_leilao_e_tratado_por_um_unico_shard_na_ordem(monkeypatch):
+    monkeypatch.setattr(shards, 'TOTAL_SHARDS', TOTAL)
+    rt = RuntimeLocal(create_logger('teste_shards'))
+
+    # Um ms_lance por shard, sem verificar assinaturas, anotando quem aplicou cada lance
+    aplicados = collections.defaultdict(list)   # id_leilao -> [(shard, valor)]
+    for shard in range(TOTAL):
+        modulo = carregar_ms_lance(shard)
+        monkeypatch.setattr(modulo.verificador, 'verificar', lambda id_usuario, assinatura: None)
+
+        def aplicar(id_leilao, id_usuario, valor_do_lance, erro, rastro=None,
+                    _shard=shard, _original=modulo.aplicar_lance):
+            aplicados[id_leilao].append((_shard, valor_do_lance))
+            _original(id_leilao, id_usuario, valor_do_lance, erro, rastro)
+
+        monkeypatch.setattr(modulo, 'aplicar_lance', aplicar)
+        modulo.registrar(rt)
+
+    validados = collections.defaultdict(list)
+    vencedores = {}
+    esperados = len(LEILOES) * LANCES_POR_LEILAO
+
+    async def executar(rt):
+        pronto = asyncio.Event()
+
+        def ao_validar(ch, method, properties, body):
+            lance = decodificar('lance_validado', properties, body)
+            validados[lance['id_leilao']].append(lance['valor_do_lance'])
+            if sum(map(len, validados.values())) == esperados:
+                pronto.set()
+
+        def ao_vencer(ch, method, properties, body):
+            vencedor = decodificar('vencedor', properties, body)
+            vencedores[vencedor['id_leilao']] = (vencedor['id_usuario'], vencedor['valor_do_lance'])
+            if len(vencedores) == len(LEILOES):
+                pronto.set()
+
+        await rt.declarar_fila('lance_validado')
+        await rt.declarar_fila('leilao_vencedor')
+        await rt.consumir('lance_validado', ao_validar)
+        await rt.consumir('leilao_vencedor', ao_vencer)
+
+        # Lances crescentes intercalados entre os leilões
+        for n in range(1, LANCES_POR_LEILAO + 1):
+            for id_leilao in LEILOES:
+                body, propriedades = codificar('lance', {
+                    'id_leilao': id_leilao, 'id_usuario': f'u{n}',
+                    'valor_do_lance': 100.0 + n, 'assinatura': b'assinatura'})
+                rt.publicar('', shards.fila_do_leilao('lance_realizado', id_leilao), body, propriedades)
+        await asyncio.wait_for(pronto.wait(), 10)
+
+        pronto.clear()
+        for id_leilao in LEILOES:
+            rt.publicar('', shards.fila_do_leilao('leilao_finalizado', id_leilao),
+                        f'{{"id_leilao": "{id_leilao}"}}'.encode())
+        await asyncio.wait_for(pronto.wait(), 10)
+        rt.encerrar()
+
+    rt.tarefa(executar)
+    rt.executar()
+
+    valores = [100.0 + n for n in range(1, LANCES_POR_LEILAO + 1)]
+    usados = set()
+    for id_leilao in LEILOES:
+        dono = shards.shard_do_leilao(id_leilao)
+        usados.add(dono)
+        # Todos os lances do leilão passam pelo shard dono, na ordem de envio
+        assert aplicados[id_leilao] == [(dono, valor) for valor in valores]
+        assert validados[id_leilao] == valores
+        # A finalização chega ao shard que tem os lances: o vencedor é o último lance
+        assert vencedores[id_leilao] == (f'u{LANCES_POR_LEILAO}', valores[-1])
+    assert len(usados) > 1